@@ -4,26 +4,77 @@ import re
 import json
 import logging
 import traceback
+import threading
 import subprocess
+import time
+from collections import deque
+from itertools import islice
 from logging.handlers import RotatingFileHandler
 import qdarkstyle
 import psutil
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
-                             QPushButton, QLabel, QLineEdit, QListWidget, QFileDialog, 
+                             QPushButton, QLabel, QLineEdit, QTableView, QHeaderView, QFileDialog, 
                              QGroupBox, QGridLayout, QMessageBox, QTextEdit, QProgressBar,
-                             QMenuBar, QAction, QComboBox)
-from PyQt5.QtCore import QProcess, QTimer, QTime, pyqtSignal
+                             QMenuBar, QMenu, QAction, QComboBox, QCheckBox, QAbstractItemView)
+from PyQt5.QtCore import Qt, QProcess, QProcessEnvironment, QTimer, QTime, pyqtSignal
+from PyQt5.QtGui import QIntValidator
 from version import NAME, VERSION, FILE_DESCRIPTION, PRODUCT_NAME, PRODUCT_VERSION, COPYRIGHT, LANGUAGE
+from gpu_topology import GpuTopology, JobPinner, CUDA_ENV
+from media_scan import MediaScanner
+from queue_model import (QueueModel, STATUS_QUEUED, STATUS_PROBING, STATUS_CONVERTING,
+                         STATUS_DONE, STATUS_SKIPPED, STATUS_FAILED, STATUS_STOPPED,
+                         STATUS_DUPLICATE, STATUS_REMUXING, STATUS_COPYING,
+                         STATUS_WAITING_SPACE, STATUS_WAITING_RESOURCES, STATUS_SUSPENDED, STATUS_PAUSED,
+                         PRIORITY_URGENT, PRIORITY_NORMAL, PRIORITY_NAMES, format_size, format_duration)
+from dedup import find_duplicates, link_or_copy, link_or_copy_over
+from output_cache import OutputCache, cache_key, tag_args
+from staging import StagingPipeline
+from prefetch import ReadaheadPrefetcher
+from encode_policy import EncodePolicy, ACTION_ENCODE, ACTION_SKIP, ACTION_REMUX, video_stream, parse_bitrate
+from media_probe import probe_files
+from disk_space import DiskReservations, estimate_encode_bytes, check_batch_space, format_gb
+from failures import (classify_failure, RetryPolicy, FailureLog, FAILURE_CORRUPT_INPUT,
+                      FAILURE_ENCODER_UNSUPPORTED, STALL_MARKER)
+from jobs import Job, HOLD_USER, HOLD_QUEUE, HOLD_THERMAL, HOLD_PREEMPT
+from nvenc_caps import CapabilityProber, NvencCapabilities
+from ladder import parse_ladder, ladder_filter, rendition_label
+from encoders import ENCODERS, DEFAULT_ENCODER, get_encoder, available_encoders, encoder_args
+from concurrency import ConcurrencyController
+from admission import AdmissionController, estimate_footprint, parse_gpu_memory
+from stall_watchdog import StallWatchdog
+from spill import SpillPlanner, cpu_equivalent, BACKEND_GPU, BACKEND_CPU
+from decode_routing import route_for, pixel_layout, ROUTE_GPU, ROUTE_CPU_DECODE, ROUTE_CPU
+from decode_balance import DecodeBalancer, BALANCE_CODECS
+from thread_budget import stage_budget
+from keyframe_index import KeyframeIndexStore
+from thermal import (ThermalPolicy, parse_gpu_readings, THERMAL_NORMAL, THERMAL_REDUCE, THERMAL_SUSPEND,
+                     THERMAL_LEVEL_NAMES)
+
+# How often a job held for disk space re-checks the destination
+SPACE_RETRY_MS = 30000
+# Clips up to this long may be packed several to one ffmpeg process
+SHORT_CLIP_SECONDS = 60
+CLIPS_PER_PROCESS = 8
+BATCH_SCAN_DEPTH = 50
+# Ceiling for the automatic job count when the GPU reports no session limit
+MAX_AUTO_JOBS = 8
 
 class FFastGPU(QMainWindow):
 
     # Add these signals
     gpu_stats_updated = pyqtSignal(float, float, float, float)
+    files_discovered = pyqtSignal(list)
+    scan_finished = pyqtSignal(int, int)
+    duplicates_found = pyqtSignal(int, object)
+    output_committed = pyqtSignal(str, str, bool, str)
+    preflight_done = pyqtSignal(int, object)
+    caps_detected = pyqtSignal(object)
+    late_probe_done = pyqtSignal(int, object, object)
     
     def __init__(self):
         super().__init__()
         self.setWindowTitle(f"{NAME} v{VERSION}")
-        self.setGeometry(100, 100, 500, 800)  # Increased height for system monitoring
+        self.setGeometry(100, 100, 900, 800)  # Wider for the queue table columns
         
         # ENABLE DRAG AND DROP ON THE MAIN WINDOW
         self.setAcceptDrops(True)
@@ -40,12 +91,25 @@ class FFastGPU(QMainWindow):
         # Setup logging
         self.setup_logging()
         
-        # Initialize process
-        self.process = None
-        self.probe_process = None
+        # Running jobs, keyed by input path
+        self.active_jobs = {}
+        self.priorities = {}  # input -> PRIORITY_*; unlisted files are normal
+        self.queue_paused = False
+        self.staging = None
+        self.readahead = ReadaheadPrefetcher()
         
         # Connect the signal
         self.gpu_stats_updated.connect(self.update_gpu_labels)
+        self.files_discovered.connect(self.on_files_discovered)
+        self.scan_finished.connect(self.on_scan_finished)
+        self.duplicates_found.connect(self.begin_batch)
+        self.output_committed.connect(self.on_output_committed)
+        self.preflight_done.connect(self.on_preflight_done)
+        self.late_probe_done.connect(self.on_late_probe_done)
+        self.caps_detected.connect(self.on_caps_detected)
+        
+        # Background scanner for dropped/added files and folders
+        self.media_scanner = MediaScanner(self.files_discovered.emit, self.scan_finished.emit)
         
         # Add these attributes for GPU monitoring
         self.gpu_enc_util = 0
@@ -62,10 +126,58 @@ class FFastGPU(QMainWindow):
         self.is_stopping = False
         
         # Store conversion data
-        self.current_file_index = -1
         self.total_files = 0
         self.files_to_process = []
         self.file_durations = {}  # Store duration for each file
+        self.file_probes = {}  # probe JSON (ffprobe-shaped) for each file, used by the encode policy
+        self.output_estimates = {}  # estimated output bytes for each file
+        self.disk_reservations = DiskReservations()
+        self.duplicate_inputs = {}  # canonical input -> identical inputs sharing its encode
+        self.batch_generation = 0  # bumped on start/stop so stale background results are dropped
+        self.pending_files = deque()  # inputs waiting for a job slot
+        self.retry_waiting = set()  # failed inputs waiting out a retry backoff
+        self.retry_state = {}  # input -> (failed attempts, software decode)
+        self.finished_count = 0  # inputs done, skipped or failed for good
+        self.job_limit = 1  # concurrent jobs; lowered when the GPU runs out of sessions or memory
+        self.space_hold = False  # a job is waiting for destination space
+        self.session_limit = None  # NVENC sessions the selected GPUs allow, if limited
+        self.ladder = []  # renditions encoded from one decode; empty outside ladder mode
+        self.split_ladders = set()  # inputs whose renditions are being encoded one at a time
+        self.unbatched = set()  # short clips that failed in a packed process and now run alone
+        self.routes_logged = set()  # inputs whose CPU-decode routing has been logged
+        self.failed_outputs = set()  # ladder outputs given up on
+        self.committing_outputs = set()  # outputs still being copied back from scratch
+        self.late_probes = set()  # files added to the running batch whose probe is not back yet
+        self.cpu_fallback = set()  # files the GPU has no encoder for, run on the CPU encoder pool
+        # Finished outputs by input fingerprint + settings hash
+        self.output_cache = OutputCache(os.path.join(self.logs_dir, 'input_fingerprints.json'))
+        self.output_keys = {}  # output path -> cache key of the job writing it
+        self.retry_policy = RetryPolicy()
+        self.failure_log = FailureLog()
+        self.concurrency = None  # ConcurrencyController while "Auto job count" is on
+        self.thermal = None  # ThermalPolicy while a temperature or power limit is set
+        self.thermal_lowered_to = None  # job limit the thermal policy lowered to, restored once the card cools
+        self.admission = AdmissionController()
+        self.watchdog = None  # StallWatchdog while a stall timeout is set
+        self.spill = SpillPlanner()  # GPU/CPU throughput history is kept across batches
+        self.spilled_files = 0
+        self.decode_balance = None  # DecodeBalancer while "Balance decode" is on
+        self.balanced_decodes = set()  # inputs moved off NVDEC by the balancer
+        self.resource_wait = False  # head of the queue is waiting for VRAM/RAM/CPU
+        self.cpu_percent = 0.0
+        
+        # NVENC capabilities (codecs, B-frames, lookahead, session limit), probed in the background
+        self.nvenc_caps = NvencCapabilities()
+        self.caps_prober = CapabilityProber(os.path.join(self.logs_dir, 'nvenc_caps.json'))
+        self.caps_probing = False
+        self.caps_refresh_pending = False
+        
+        # Keyframe times/offsets per input for anything that cuts files, cached by (path, size, mtime)
+        self.keyframe_indexes = KeyframeIndexStore(os.path.join(self.logs_dir, 'keyframe_index'))
+        
+        # GPU <-> NUMA topology used to pin each job next to its GPU
+        self.gpu_topology = GpuTopology()
+        self.job_pinner = JobPinner(self.gpu_topology)
         
         # Create menu bar
         self.create_menu()
@@ -109,17 +221,46 @@ class FFastGPU(QMainWindow):
         button_layout = QHBoxLayout()
         self.add_files_btn = QPushButton("Add Files")
         self.add_files_btn.clicked.connect(self.add_files)
+        self.add_folder_btn = QPushButton("Add Folder")
+        self.add_folder_btn.clicked.connect(self.add_folder)
         self.clear_list_btn = QPushButton("Clear List")
         self.clear_list_btn.clicked.connect(self.clear_file_list)
         button_layout.addWidget(self.add_files_btn)
+        button_layout.addWidget(self.add_folder_btn)
         button_layout.addWidget(self.clear_list_btn)
         file_layout.addLayout(button_layout)
         
-        # File list with drag and drop support
-        self.file_list = QListWidget()
-        self.file_list.setAcceptDrops(True)
-        self.file_list.setDragDropMode(QListWidget.DropOnly)
-        file_layout.addWidget(self.file_list)
+        # Queue filter and duplicate handling
+        filter_layout = QHBoxLayout()
+        self.queue_filter_input = QLineEdit("")
+        self.queue_filter_input.setPlaceholderText("Filter by name or status")
+        self.queue_filter_input.textChanged.connect(self.filter_queue)
+        filter_layout.addWidget(self.queue_filter_input)
+        self.dedup_check = QCheckBox("Encode duplicates once")
+        self.dedup_check.setToolTip("Detect identical inputs by content and link the single output to each name")
+        self.dedup_check.setChecked(True)
+        filter_layout.addWidget(self.dedup_check)
+        file_layout.addLayout(filter_layout)
+        
+        # Queue table - drops fall through to the main window
+        self.queue_model = QueueModel(self)
+        self.queue_view = QTableView()
+        self.queue_view.setModel(self.queue_model)
+        # Insertion order until a column header is clicked (Qt would start sorted by name, descending)
+        self.queue_view.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.queue_view.setSortingEnabled(True)
+        self.queue_view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.queue_view.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.queue_view.setWordWrap(False)
+        self.queue_view.verticalHeader().setVisible(False)
+        # Fixed row heights keep scrolling O(visible rows) for large queues
+        self.queue_view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.queue_view.verticalHeader().setDefaultSectionSize(22)
+        self.queue_view.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        self.queue_view.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.queue_view.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.queue_view.customContextMenuRequested.connect(self.show_queue_menu)
+        file_layout.addWidget(self.queue_view)
         
         layout.addWidget(file_group)
         
@@ -152,20 +293,92 @@ class FFastGPU(QMainWindow):
         settings_layout.addWidget(self.lookahead_input, 2, 1)
 
         settings_layout.addWidget(QLabel("Threads:"), 2, 2)
-        self.threads_input = QLineEdit("1")
+        self.threads_input = QLineEdit("")
+        self.threads_input.setPlaceholderText("auto")
+        self.threads_input.setToolTip("Most threads any decode, filter or encode stage of a job may use; "
+                                      "blank shares the cores between running jobs automatically")
         settings_layout.addWidget(self.threads_input, 2, 3)
 
         # Row 3
         settings_layout.addWidget(QLabel("Encoder:"), 3, 0)
-        self.encoder_input = QLineEdit("nvenc")
-        settings_layout.addWidget(self.encoder_input, 3, 1)
+        self.encoder_combo = QComboBox()
+        for spec in ENCODERS:
+            self.encoder_combo.addItem(spec.label, spec.name)
+        self.encoder_combo.setToolTip("Output codec and encoder; GPU encoders the selected GPUs lack are hidden")
+        settings_layout.addWidget(self.encoder_combo, 3, 1)
 
         settings_layout.addWidget(QLabel("Decoder:"), 3, 2)
         self.decoder_input = QLineEdit("cuda")
         settings_layout.addWidget(self.decoder_input, 3, 3)
 
-        # Row 4 - Output Folder and Format on the same row
-        settings_layout.addWidget(QLabel("Output Folder:"), 4, 0)
+        # Row 4
+        settings_layout.addWidget(QLabel("GPU:"), 4, 0)
+        self.gpu_input = QLineEdit("0")
+        self.gpu_input.setToolTip("GPU index, or a comma separated list to spread files across GPUs")
+        settings_layout.addWidget(self.gpu_input, 4, 1)
+        self.gpu_input.editingFinished.connect(self.filter_encoders)
+        self.encoder_combo.currentIndexChanged.connect(self.on_encoder_changed)
+
+        settings_layout.addWidget(QLabel("Jobs:"), 4, 2)
+        self.jobs_input = QLineEdit("1")
+        self.jobs_input.setToolTip("Files encoded at the same time; lowered automatically if the GPU runs out of sessions or memory")
+        settings_layout.addWidget(self.jobs_input, 4, 3)
+
+        # Row 5
+        check_layout = QHBoxLayout()
+        self.numa_pin_check = QCheckBox("Pin to GPU-local CPUs")
+        self.numa_pin_check.setChecked(True)
+        check_layout.addWidget(self.numa_pin_check)
+        self.smart_skip_check = QCheckBox("Skip/remux if already in target codec")
+        self.smart_skip_check.setToolTip("Skip or stream-copy sources that already meet the codec, bitrate and height targets")
+        self.smart_skip_check.setChecked(True)
+        check_layout.addWidget(self.smart_skip_check)
+        self.readahead_check = QCheckBox("Readahead next input")
+        self.readahead_check.setToolTip("Warm the page cache for the next file while the current one encodes")
+        self.readahead_check.setChecked(True)
+        check_layout.addWidget(self.readahead_check)
+        self.clip_batch_check = QCheckBox("Pack short clips")
+        self.clip_batch_check.setToolTip(f"Encode up to {CLIPS_PER_PROCESS} similar clips shorter than "
+                                         f"{SHORT_CLIP_SECONDS}s in one ffmpeg process to save startup time")
+        check_layout.addWidget(self.clip_batch_check)
+        self.auto_jobs_check = QCheckBox("Auto job count")
+        self.auto_jobs_check.setToolTip("Start at the Jobs value and add or remove jobs while watching "
+                                        "encode throughput and NVENC/NVDEC utilization")
+        check_layout.addWidget(self.auto_jobs_check)
+        settings_layout.addLayout(check_layout, 5, 0, 1, 4)
+
+        # Row 6
+        settings_layout.addWidget(QLabel("Max Height:"), 6, 0)
+        self.max_height_input = QLineEdit("")
+        self.max_height_input.setPlaceholderText("source")
+        settings_layout.addWidget(self.max_height_input, 6, 1)
+
+        settings_layout.addWidget(QLabel("Reuse Factor:"), 6, 2)
+        self.bitrate_factor_input = QLineEdit("1.1")
+        self.bitrate_factor_input.setToolTip("Sources up to this multiple of the target bitrate are not re-encoded")
+        settings_layout.addWidget(self.bitrate_factor_input, 6, 3)
+
+        # Row 7 - optional local scratch staging
+        settings_layout.addWidget(QLabel("Scratch Folder:"), 7, 0)
+        scratch_layout = QHBoxLayout()
+        self.scratch_input = QLineEdit("")
+        self.scratch_input.setPlaceholderText("disabled - encode in place")
+        self.scratch_input.setToolTip("Local SSD folder: inputs are copied here ahead of time and outputs copied back afterwards")
+        scratch_layout.addWidget(self.scratch_input)
+        self.browse_scratch_btn = QPushButton("Browse")
+        self.browse_scratch_btn.clicked.connect(self.browse_scratch_folder)
+        scratch_layout.addWidget(self.browse_scratch_btn)
+        scratch_layout.setStretch(0, 3)
+        scratch_layout.setStretch(1, 1)
+        settings_layout.addLayout(scratch_layout, 7, 1)
+
+        settings_layout.addWidget(QLabel("Copy Limit:"), 7, 2)
+        self.copy_limit_input = QLineEdit("")
+        self.copy_limit_input.setPlaceholderText("MB/s (unlimited)")
+        settings_layout.addWidget(self.copy_limit_input, 7, 3)
+
+        # Row 8 - Output Folder and Format on the same row
+        settings_layout.addWidget(QLabel("Output Folder:"), 8, 0)
 
         # Create a horizontal layout for folder browser and format
         output_row_layout = QHBoxLayout()
@@ -192,7 +405,61 @@ class FFastGPU(QMainWindow):
         output_row_layout.addLayout(format_layout, 1)  # Format section takes 1 part
 
         # Add the combined layout to the grid
-        settings_layout.addLayout(output_row_layout, 4, 1, 1, 3)  # Span all 3 columns
+        settings_layout.addLayout(output_row_layout, 8, 1, 1, 3)  # Span all 3 columns
+
+        # Row 9 - optional ladder: several renditions from one decode
+        settings_layout.addWidget(QLabel("Ladder:"), 9, 0)
+        self.ladder_input = QLineEdit("")
+        self.ladder_input.setPlaceholderText("off - e.g. 1080:6000k, 720:3000k, 480:1200k:mkv")
+        self.ladder_input.setToolTip("height:bitrate[:format] per rendition; every input is decoded once "
+                                     "and encoded to all renditions (replaces Bitrate and Max Height)")
+        settings_layout.addWidget(self.ladder_input, 9, 1, 1, 3)
+
+        # Row 10 - thermal and power throttling
+        settings_layout.addWidget(QLabel("Max GPU Temp:"), 10, 0)
+        self.max_temp_input = QLineEdit("")
+        self.max_temp_input.setPlaceholderText("°C (off)")
+        self.max_temp_input.setToolTip("At this temperature no new jobs start; a few degrees above it fewer jobs run "
+                                       "and further above running jobs are suspended until the card cools. Set it "
+                                       "above the card's boost target (83°C on most NVIDIA cards), which it "
+                                       "reaches under normal load")
+        settings_layout.addWidget(self.max_temp_input, 10, 1)
+
+        settings_layout.addWidget(QLabel("Max Power:"), 10, 2)
+        self.max_power_input = QLineEdit("")
+        self.max_power_input.setPlaceholderText("% of limit (off)")
+        self.max_power_input.setToolTip("Same throttling steps driven by power draw as a percentage of the card's power limit")
+        settings_layout.addWidget(self.max_power_input, 10, 3)
+
+        # Row 11 - stall watchdog
+        settings_layout.addWidget(QLabel("Stall Timeout:"), 11, 0)
+        self.stall_timeout_input = QLineEdit("120")
+        self.stall_timeout_input.setPlaceholderText("seconds (off)")
+        self.stall_timeout_input.setToolTip("Kill and retry a job whose ffmpeg output time and frame count "
+                                            "have not advanced for this long")
+        settings_layout.addWidget(self.stall_timeout_input, 11, 1)
+
+        settings_layout.addWidget(QLabel("Min Speed:"), 11, 2)
+        self.min_speed_input = QLineEdit("")
+        self.min_speed_input.setPlaceholderText("x realtime (off)")
+        self.min_speed_input.setToolTip("Also treat a job as stalled when it stays below this speed "
+                                        "for twice the stall timeout")
+        settings_layout.addWidget(self.min_speed_input, 11, 3)
+
+        # Row 12 - CPU encoder pool next to the GPU slots
+        settings_layout.addWidget(QLabel("CPU Jobs:"), 12, 0)
+        self.cpu_jobs_input = QLineEdit("0")
+        self.cpu_jobs_input.setValidator(QIntValidator(0, 64, self))
+        self.cpu_jobs_input.setToolTip("While every GPU slot is busy, encode up to this many files with the matching "
+                                       "CPU encoder (x265/x264/SVT-AV1) when that is predicted to finish sooner "
+                                       "than waiting; 0 turns it off")
+        settings_layout.addWidget(self.cpu_jobs_input, 12, 1)
+
+        self.balance_decode_check = QCheckBox("Balance decode")
+        self.balance_decode_check.setChecked(True)
+        self.balance_decode_check.setToolTip("When NVDEC is saturated while NVENC has headroom, decode some new "
+                                             "H.264/HEVC jobs on the CPU and upload the frames to the encoder")
+        settings_layout.addWidget(self.balance_decode_check, 12, 2, 1, 2)
 
         layout.addWidget(settings_group)
         
@@ -237,6 +504,12 @@ class FFastGPU(QMainWindow):
         self.stop_btn.setEnabled(False)
         layout.addWidget(self.stop_btn)
         
+        # Pause button: suspends the running encodes instead of killing them
+        self.pause_btn = QPushButton("Pause Queue")
+        self.pause_btn.clicked.connect(self.toggle_queue_pause)
+        self.pause_btn.setEnabled(False)
+        layout.addWidget(self.pause_btn)
+        
         # Status area
         status_group = QGroupBox("Conversion Status")
         status_layout = QVBoxLayout(status_group)
@@ -264,6 +537,7 @@ class FFastGPU(QMainWindow):
         # Log startup
         logging.info(f"{NAME} v{VERSION} application started")
         self.update_status(f"{NAME} v{VERSION} - {COPYRIGHT}")
+        self.detect_capabilities()
     
     def check_dependencies(self):
         """Check if required tools are available in the system PATH"""
@@ -315,6 +589,11 @@ class FFastGPU(QMainWindow):
         self.theme_action.triggered.connect(self.toggle_theme)
         view_menu.addAction(self.theme_action)
         
+        # Re-run the encoder capability probe (e.g. after changing GPUs)
+        caps_action = QAction("Re-detect Encoder Capabilities", self)
+        caps_action.triggered.connect(lambda: self.detect_capabilities(refresh=True))
+        view_menu.addAction(caps_action)
+        
         # Help menu
         help_menu = menu_bar.addMenu("Help")
         
@@ -362,6 +641,7 @@ class FFastGPU(QMainWindow):
         logs_dir = os.path.join(base_dir, PRODUCT_NAME)
         if not os.path.exists(logs_dir):
             os.makedirs(logs_dir)
+        self.logs_dir = logs_dir
         
         # Setup GUI logger with rotation (10MB max, 5 backup files)
         self.gui_logger = logging.getLogger('gui')
@@ -396,6 +676,114 @@ class FFastGPU(QMainWindow):
         console_handler.setFormatter(formatter)
         self.gui_logger.addHandler(console_handler)
 
+    def batch_running(self):
+        """True from Start Conversion until the batch completes or is stopped"""
+        return self.stop_btn.isEnabled()
+    
+    def detect_capabilities(self, refresh=False):
+        """Probe NVENC capabilities on a background thread (cached per driver version)"""
+        # The test encodes need free NVENC sessions, which a running batch holds
+        if self.batch_running():
+            self.caps_refresh_pending = True
+            self.update_status("Encoder capabilities will be re-detected when the batch ends")
+            return
+        self.caps_probing = True
+        self.update_status("Detecting encoder capabilities..." if refresh
+                           else "Checking encoder capabilities...")
+        caps_thread = threading.Thread(target=self.capabilities_worker, args=(refresh,))
+        caps_thread.daemon = True
+        caps_thread.start()
+    
+    def capabilities_worker(self, refresh):
+        """Background thread: run the capability prober and hand the result to the GUI thread"""
+        try:
+            caps = self.caps_prober.probe(refresh=refresh)
+        except Exception as e:
+            self.gui_logger.error(f"Encoder capability probe failed: {e}\n{traceback.format_exc()}")
+            caps = NvencCapabilities()
+        self.caps_detected.emit(caps)
+    
+    def on_caps_detected(self, caps):
+        self.caps_probing = False
+        try:
+            self.nvenc_caps = caps
+            for line in caps.describe() or ["No NVENC capable GPU detected"]:
+                self.update_status(line)
+            self.filter_encoders()
+        except Exception as e:
+            error_msg = f"Error applying encoder capabilities: {str(e)}"
+            self.update_status(error_msg)
+            self.log_error_with_traceback(error_msg)
+    
+    def get_encoder_spec(self):
+        """Registry entry for the encoder selected in the Encoder box"""
+        return get_encoder(self.encoder_combo.currentData() or DEFAULT_ENCODER)
+    
+    def filter_encoders(self):
+        """Offer only encoders ffmpeg was built with and, for NVENC, that the selected GPUs support"""
+        gpus = self.get_gpu_indices()
+        nvenc_supported = None
+        if self.nvenc_caps.gpus:
+            nvenc_supported = lambda name: all(self.nvenc_caps.supports(name, gpu) for gpu in gpus)
+        specs = available_encoders(self.nvenc_caps.compiled_encoders, nvenc_supported)
+        if not specs:
+            return
+        current = self.encoder_combo.currentData()
+        self.encoder_combo.blockSignals(True)
+        self.encoder_combo.clear()
+        for spec in specs:
+            self.encoder_combo.addItem(spec.label, spec.name)
+        index = self.encoder_combo.findData(current)
+        self.encoder_combo.setCurrentIndex(index if index >= 0 else 0)
+        self.encoder_combo.blockSignals(False)
+        if index < 0:
+            self.update_status(f"{get_encoder(current).label} is not available here, "
+                               f"using {self.get_encoder_spec().label}")
+        self.on_encoder_changed()
+    
+    def on_encoder_changed(self, *_):
+        try:
+            codec = self.get_encoder_spec().codec.upper().replace('H264', 'H.264')
+            self.smart_skip_check.setToolTip(f"Skip or stream-copy sources that are already {codec} "
+                                             f"and meet the bitrate and height targets")
+            self.apply_caps_limits()
+        except Exception as e:
+            error_msg = f"Error changing encoder: {str(e)}"
+            self.update_status(error_msg)
+            self.log_error_with_traceback(error_msg)
+    
+    def apply_caps_limits(self):
+        """Limit the B-frames/Lookahead fields to what the selected GPUs accept"""
+        spec = self.get_encoder_spec()
+        gpus = self.get_gpu_indices()
+        if not spec.hardware or not all(self.nvenc_caps.supports(spec.name, gpu) for gpu in gpus):
+            self.bframes_input.setValidator(None)
+            self.lookahead_input.setValidator(None)
+            return
+        max_bframes = self.nvenc_caps.max_bframes(spec.name, gpus)
+        max_lookahead = self.nvenc_caps.max_lookahead(spec.name, gpus)
+        self.bframes_input.setValidator(QIntValidator(0, max_bframes, self))
+        self.bframes_input.setToolTip(f"0-{max_bframes} on the selected GPU(s) with {spec.name}")
+        self.lookahead_input.setValidator(QIntValidator(0, max_lookahead, self))
+        self.lookahead_input.setToolTip(f"0-{max_lookahead} on the selected GPU(s) with {spec.name}")
+    
+    def validate_encoder_settings(self):
+        """Clamp B-frames and lookahead to the detected capabilities before a batch starts"""
+        spec = self.get_encoder_spec()
+        if not spec.hardware:
+            return
+        try:
+            bframes = int(self.bframes_input.text() or "4")
+            lookahead = int(self.lookahead_input.text() or "32")
+        except ValueError:
+            return
+        bframes, lookahead, notes = self.nvenc_caps.validate(spec.name, self.get_gpu_indices(),
+                                                             bframes, lookahead)
+        for note in notes:
+            self.update_status(f"Encoder capabilities: {note}")
+        self.bframes_input.setText(str(bframes))
+        self.lookahead_input.setText(str(lookahead))
+    
     def update_gpu_labels(self, gpu_percent, gpu_temp, enc_util, dec_util):
         """Thread-safe update of GPU labels"""
         self.gpu_label.setText(f"{gpu_percent:.1f}% | ENC: {enc_util:.1f}% | DEC: {dec_util:.1f}%")
@@ -451,6 +839,7 @@ class FFastGPU(QMainWindow):
         try:
             # CPU usage
             cpu_percent = psutil.cpu_percent()
+            self.cpu_percent = cpu_percent
             
             # RAM usage
             ram = psutil.virtual_memory()
@@ -460,6 +849,12 @@ class FFastGPU(QMainWindow):
             self.cpu_label.setText(f"{cpu_percent:.1f}%")
             self.ram_label.setText(f"{ram_percent:.1f}%")
             
+            self.adjust_concurrency()
+            self.balance_decoders()
+            self.check_stalls()
+            if self.resource_wait:
+                self.schedule_jobs()
+            
             # Only update GPU stats occasionally (every 10 seconds)
             current_time = QTime.currentTime()
             if not hasattr(self, 'last_gpu_update'):
@@ -475,18 +870,23 @@ class FFastGPU(QMainWindow):
                     # Get GPU usage and temperature using nvidia-smi
                     result = subprocess.run([
                         'nvidia-smi', 
-                        '--query-gpu=utilization.gpu,temperature.gpu',
+                        '--query-gpu=index,temperature.gpu,power.draw,power.limit,utilization.gpu,'
+                        'memory.total,memory.used',
                         '--format=csv,noheader,nounits'
                     ], capture_output=True, text=True, timeout=3, creationflags=subprocess.CREATE_NO_WINDOW)
                     
                     if result.returncode == 0:
-                        # Handle multiple GPUs - take the first one
+                        # Handle multiple GPUs - display the first one
                         lines = result.stdout.strip().split('\n')
                         if lines and lines[0]:
                             gpu_data = lines[0].split(', ')
-                            if len(gpu_data) >= 2:
-                                gpu_percent = float(gpu_data[0])
+                            if len(gpu_data) >= 5:
+                                gpu_percent = float(gpu_data[4])
                                 gpu_temp = float(gpu_data[1])
+                        # Throttling looks at every selected GPU
+                        gpus = self.get_gpu_indices()
+                        self.apply_thermal_policy([r for r in parse_gpu_readings(result.stdout) if r.gpu in gpus])
+                        self.admission.update_gpu_memory(parse_gpu_memory(result.stdout))
                 except Exception as e:
                     # Log the error but don't crash the app
                     self.gui_logger.warning(f"GPU monitoring failed: {e}")
@@ -500,6 +900,287 @@ class FFastGPU(QMainWindow):
             self.update_status(f"Error getting system stats: {e}")
             self.log_error_with_traceback(f"Error getting system stats: {e}")
     
+    def adjust_concurrency(self):
+        """Feed the running jobs' speeds and engine load to the job count controller"""
+        if not self.concurrency or self.conversion_stopped or not self.active_jobs:
+            return
+        speeds = [job.speed for job in self.active_jobs.values() if not job.cpu_pool]
+        decision = self.concurrency.observe(time.monotonic(), self.gpu_enc_util, self.gpu_dec_util, speeds)
+        if decision:
+            self.job_limit = decision.new_limit
+            self.update_status(f"Concurrent jobs {decision.old_limit} -> {decision.new_limit}: {decision.reason}")
+            self.schedule_jobs()
+    
+    def balance_decoders(self):
+        """Feed engine and CPU load to the decode balancer"""
+        if not self.decode_balance or self.conversion_stopped or not self.active_jobs:
+            return
+        cores = psutil.cpu_count() or 1
+        change = self.decode_balance.observe(time.monotonic(), self.gpu_enc_util, self.gpu_dec_util, self.cpu_percent,
+                                             cores * (100 - self.cpu_percent) / 100,
+                                             self.thread_budget(ROUTE_CPU_DECODE).decode)
+        if change:
+            self.update_status(f"CPU-decoded jobs {change.old_target} -> {change.new_target}: {change.reason}")
+    
+    def job_decode_path(self, job):
+        """Decode path (decode_routing) a running job was started on"""
+        if job.cpu_pool or not self.get_encoder_spec().hardware:
+            return ROUTE_CPU
+        return ROUTE_CPU_DECODE if job.software_decode else ROUTE_GPU
+    
+    def thread_budget(self, path, starting=()):
+        """Threads per stage for a job about to start on a decode path, given every running input
+        (and others starting in the same process); the Threads field caps each stage"""
+        running = [self.job_decode_path(job) for job in self.active_jobs.values() if not job.suspended
+                   for _ in job.members]
+        cap = self.threads_input.text().strip()
+        return stage_budget(psutil.cpu_count() or 1, path, running + list(starting),
+                            int(cap) if cap.isdigit() and int(cap) > 0 else None)
+    
+    def balance_route(self, file_path, route):
+        """Move a starting job off NVDEC while the balancer wants more CPU decoders than are running"""
+        self.balanced_decodes.discard(file_path)
+        if not self.decode_balance or route.path != ROUTE_GPU:
+            return route
+        if video_stream(self.file_probes.get(file_path)).get('codec_name') not in BALANCE_CODECS:
+            return route
+        running = sum(1 for path in self.active_jobs if path in self.balanced_decodes)
+        if running >= self.decode_balance.target:
+            return route
+        self.balanced_decodes.add(file_path)
+        return route._replace(path=ROUTE_CPU_DECODE, surface_format=None, reason="NVDEC saturated")
+    
+    def check_stalls(self):
+        """Kill jobs the watchdog reports as stalled; job_finished classifies and retries them"""
+        if not self.watchdog or self.conversion_stopped:
+            return
+        for file_path, reason in self.watchdog.check(time.monotonic()):
+            job = self.active_jobs.get(file_path)
+            if job is None:
+                continue
+            job.add_output(f"{STALL_MARKER} - {reason}")
+            self.update_status(f"⚠ {os.path.basename(file_path)} stalled ({reason}), stopping ffmpeg")
+            self.gui_logger.warning(f"Stall: {file_path} after {job.media_time:.1f}s of media, "
+                                    f"attempt {job.attempt}: {reason}")
+            job.process.kill()
+    
+    def apply_thermal_policy(self, readings):
+        """Hold, shrink or suspend the queue according to the hottest selected GPU"""
+        if not self.thermal or not readings or self.conversion_stopped:
+            return
+        event = self.thermal.update(time.monotonic(), readings)
+        if not event:
+            return
+        self.update_status(f"Thermal: {THERMAL_LEVEL_NAMES[event.new_level]} ({event.reason})")
+        if event.new_level >= THERMAL_REDUCE > event.old_level and self.job_limit > 1:
+            # The card cannot sustain this many jobs; run one fewer until it cools down
+            self.job_limit -= 1
+            self.thermal_lowered_to = self.job_limit
+            self.update_status(f"Lowering concurrent jobs to {self.job_limit} (thermal)")
+            if self.concurrency:
+                self.concurrency.cap(time.monotonic(), self.job_limit, "thermal")
+        elif event.old_level >= THERMAL_REDUCE > event.new_level and self.thermal_lowered_to is not None:
+            # Give the job back, unless something else (a session or memory failure) lowered the limit since
+            if self.job_limit == self.thermal_lowered_to:
+                self.job_limit += 1
+                self.update_status(f"Restoring concurrent jobs to {self.job_limit} (cooled down)")
+                if self.concurrency:
+                    self.concurrency.cap(time.monotonic(), self.job_limit, "cooled down")
+            self.thermal_lowered_to = None
+        gpu_jobs = [job for job in self.active_jobs.values() if not job.cpu_pool]
+        if event.new_level >= THERMAL_SUSPEND:
+            for job in gpu_jobs:
+                self.suspend_job(job, HOLD_THERMAL)
+        elif event.old_level >= THERMAL_SUSPEND:
+            for job in gpu_jobs:
+                self.resume_job(job, HOLD_THERMAL)
+        self.schedule_jobs()
+    
+    def suspend_job(self, job, reason):
+        """Stop a running ffmpeg process in place (SIGSTOP / NtSuspendProcess) for a reason"""
+        if not job.holds:
+            try:
+                psutil.Process(job.process.processId()).suspend()
+            except (psutil.Error, OSError) as e:
+                self.gui_logger.warning(f"Could not suspend {os.path.basename(job.file_path)}: {e}")
+                return False
+            job.mark_suspended()
+            if self.watchdog:
+                self.watchdog.pause(job.file_path, time.monotonic())
+        job.holds.add(reason)
+        self.show_job_status(job)
+        return True
+    
+    def resume_job(self, job, reason=None):
+        """Drop one reason (or all) a job is suspended for and continue it once none is left"""
+        if reason is None:
+            job.holds.clear()
+        else:
+            job.holds.discard(reason)
+        if job.holds or not job.suspended:
+            self.show_job_status(job)
+            return
+        try:
+            psutil.Process(job.process.processId()).resume()
+        except (psutil.Error, OSError) as e:
+            self.gui_logger.warning(f"Could not resume {os.path.basename(job.file_path)}: {e}")
+        job.mark_resumed()
+        if self.watchdog:
+            self.watchdog.resume(job.file_path, time.monotonic())
+        self.show_job_status(job)
+    
+    def show_job_status(self, job):
+        if job.holds & {HOLD_USER, HOLD_QUEUE}:
+            status = STATUS_PAUSED
+        elif job.holds:
+            status = STATUS_SUSPENDED
+        else:
+            status = STATUS_REMUXING if job.action == ACTION_REMUX else STATUS_CONVERTING
+        for member in job.members:
+            self.queue_model.update_path(member, status=status)
+    
+    def job_for_path(self, file_path):
+        return next((job for job in self.active_jobs.values() if file_path in job.members), None)
+    
+    def file_priority(self, file_path):
+        return self.priorities.get(file_path, PRIORITY_NORMAL)
+    
+    def job_priority(self, job):
+        return min(self.file_priority(member) for member in job.members)
+    
+    def pause_files(self, paths, pause=True):
+        """Pause or resume the running jobs of the given files"""
+        for job in {id(job): job for job in map(self.job_for_path, paths) if job}.values():
+            if pause:
+                self.suspend_job(job, HOLD_USER)
+            else:
+                self.resume_job(job, HOLD_USER)
+        self.update_job_progress()
+    
+    def toggle_queue_pause(self):
+        """Pause every running job and stop starting new ones, or undo that"""
+        self.queue_paused = not self.queue_paused
+        for job in list(self.active_jobs.values()):
+            if self.queue_paused:
+                self.suspend_job(job, HOLD_QUEUE)
+            else:
+                self.resume_job(job, HOLD_QUEUE)
+        self.pause_btn.setText("Resume Queue" if self.queue_paused else "Pause Queue")
+        self.update_status("Queue paused" if self.queue_paused else "Queue resumed")
+        if not self.queue_paused:
+            self.schedule_jobs()
+    
+    def set_priority(self, paths, priority):
+        """Change the priority of files; queued ones are reordered, files outside a running batch join it"""
+        late = []
+        for path in paths:
+            self.priorities[path] = priority
+            self.queue_model.update_path(path, priority=priority)
+            duplicate = any(path in group for group in self.duplicate_inputs.values())
+            if self.total_files and not self.conversion_stopped and path not in self.files_to_process \
+                    and not duplicate:
+                late.append(path)
+        if late:
+            self.add_to_running_batch(late)
+        self.sort_pending()
+        self.schedule_jobs()
+    
+    def sort_pending(self):
+        # Stable, so files of equal priority keep their order
+        self.pending_files = deque(sorted(self.pending_files, key=self.file_priority))
+    
+    def add_to_running_batch(self, paths):
+        """Probe files added after the batch started and queue them once the probe is back"""
+        self.files_to_process.extend(paths)
+        self.total_files += len(paths)
+        self.late_probes.update(paths)
+        for path in paths:
+            self.queue_model.update_path(path, status=STATUS_PROBING)
+        self.update_status(f"Adding {len(paths)} file(s) to the running batch")
+        threading.Thread(target=self.late_probe_worker, args=(self.batch_generation, paths), daemon=True).start()
+    
+    def late_probe_worker(self, generation, paths):
+        try:
+            probes = probe_files(paths)
+        except Exception as e:
+            self.gui_logger.error(f"Probing added files failed: {e}\n{traceback.format_exc()}")
+            probes = {}
+        self.fingerprint_worker(paths)
+        self.late_probe_done.emit(generation, paths, probes)
+    
+    def on_late_probe_done(self, generation, paths, probes):
+        try:
+            if generation != self.batch_generation:
+                return
+            self.late_probes.difference_update(paths)
+            for file_path, data in probes.items():
+                try:
+                    self.apply_probe(file_path, data)
+                except (KeyError, ValueError, TypeError):
+                    continue
+            for file_path in paths:
+                self.output_estimates[file_path] = self.estimate_output_size(file_path)
+                self.queue_model.update_path(file_path, status=STATUS_QUEUED)
+                self.pending_files.append(file_path)
+            self.sort_pending()
+            self.schedule_jobs()
+        except Exception as e:
+            error_msg = f"Error adding files to the batch: {str(e)}"
+            self.update_status(error_msg)
+            self.log_error_with_traceback(error_msg)
+    
+    def running_job_count(self):
+        """Jobs holding a GPU slot; a job preempted for an urgent one gives its slot up"""
+        return sum(1 for job in self.active_jobs.values() if HOLD_PREEMPT not in job.holds and not job.cpu_pool)
+    
+    def cpu_job_count(self):
+        return sum(1 for job in self.active_jobs.values() if job.cpu_pool)
+    
+    def preemption_victim(self, file_path):
+        """Running job an urgent file may suspend: lowest priority, then most recently started"""
+        if self.file_priority(file_path) != PRIORITY_URGENT:
+            return None
+        candidates = [job for job in self.active_jobs.values()
+                      if not job.holds and not job.cpu_pool and self.job_priority(job) > PRIORITY_URGENT]
+        return max(candidates, key=lambda job: (self.job_priority(job), job.started), default=None)
+    
+    def resume_preempted(self):
+        """Continue preempted jobs as slots free up, unless an urgent file is still waiting"""
+        preempted = sorted((job for job in self.active_jobs.values() if HOLD_PREEMPT in job.holds),
+                           key=lambda job: (self.job_priority(job), job.started))
+        for job in preempted:
+            if self.running_job_count() >= self.job_limit:
+                break
+            if self.pending_files and self.file_priority(self.pending_files[0]) == PRIORITY_URGENT:
+                break
+            self.resume_job(job, HOLD_PREEMPT)
+            self.update_status(f"Resuming {os.path.basename(job.file_path)}")
+    
+    def show_queue_menu(self, pos):
+        """Pause/resume and priority actions for the selected queue rows"""
+        rows = {index.row() for index in self.queue_view.selectionModel().selectedRows()}
+        row = self.queue_view.indexAt(pos).row()
+        if row >= 0:
+            rows.add(row)
+        paths = [self.queue_model.path_at(r) for r in sorted(rows)]
+        if not paths:
+            return
+        
+        menu = QMenu(self)
+        jobs = [job for job in map(self.job_for_path, paths) if job]
+        pause_action = menu.addAction("Pause")
+        pause_action.setEnabled(any(HOLD_USER not in job.holds for job in jobs))
+        pause_action.triggered.connect(lambda: self.pause_files(paths, True))
+        resume_action = menu.addAction("Resume")
+        resume_action.setEnabled(any(HOLD_USER in job.holds for job in jobs))
+        resume_action.triggered.connect(lambda: self.pause_files(paths, False))
+        
+        priority_menu = menu.addMenu("Priority")
+        for priority, name in PRIORITY_NAMES.items():
+            action = priority_menu.addAction(name)
+            action.triggered.connect(lambda _, p=priority: self.set_priority(paths, p))
+        menu.exec_(self.queue_view.viewport().mapToGlobal(pos))
+    
     def dragEnterEvent(self, event):
         """Accept drag events containing URLs"""
         if event.mimeData().hasUrls():
@@ -508,25 +1189,15 @@ class FFastGPU(QMainWindow):
             event.ignore()
 
     def dropEvent(self, event):
-        """Handle file drops on the main window"""
+        """Handle file and folder drops on the main window"""
         if event.mimeData().hasUrls():
-            urls = event.mimeData().urls()
-            video_files = []
-            
-            for url in urls:
-                file_path = url.toLocalFile()
-                if os.path.isfile(file_path) and file_path.lower().endswith(('.mp4', '.mkv')):
-                    video_files.append(file_path)
-            
-            if video_files:
-                self.files.extend(video_files)
-                self.file_list.clear()
-                self.file_list.addItems([os.path.basename(f) for f in self.files])
-                self.update_status(f"Added {len(video_files)} files via drag & drop")
-                self.gui_logger.info(f"Added {len(video_files)} files via drag & drop")
-                
-                # UPDATE OUTPUT FOLDER BASED ON NEW FILES
-                self.update_output_folder_based_on_input()
+            paths = [url.toLocalFile() for url in event.mimeData().urls()]
+            paths = [p for p in paths if p and os.path.exists(p)]
+            
+            if paths:
+                self.update_status(f"Scanning {len(paths)} dropped item(s)...")
+                self.gui_logger.info(f"Scanning dropped items: {paths}")
+                self.media_scanner.scan(paths)
             
             event.acceptProposedAction()
         else:
@@ -536,26 +1207,63 @@ class FFastGPU(QMainWindow):
         try:
             files, _ = QFileDialog.getOpenFileNames(
                 self, "Select Video Files", "", 
-                "Video Files (*.mp4 *.mkv);;All Files (*)"
+                "Video Files (*.mp4 *.mkv *.mov *.m4v *.ts *.m2ts *.webm *.avi *.flv *.wmv *.mpg);;All Files (*)"
             )
             if files:
-                self.files.extend(files)
-                self.file_list.clear()
-                self.file_list.addItems(self.files)
-                self.update_status(f"Added {len(files)} files")
-                self.gui_logger.info(f"Added {len(files)} files: {files}")
-                
-                # UPDATE OUTPUT FOLDER BASED ON NEW FILES
-                self.update_output_folder_based_on_input()
+                self.update_status(f"Checking {len(files)} files...")
+                self.media_scanner.scan(files)
         except Exception as e:
             error_msg = f"Error adding files: {str(e)}"
             self.update_status(error_msg)
             self.log_error_with_traceback(error_msg)
     
+    def add_folder(self):
+        try:
+            folder = QFileDialog.getExistingDirectory(self, "Select Folder to Scan")
+            if folder:
+                self.update_status(f"Scanning folder: {folder}")
+                self.gui_logger.info(f"Scanning folder: {folder}")
+                self.media_scanner.scan([folder])
+        except Exception as e:
+            error_msg = f"Error adding folder: {str(e)}"
+            self.update_status(error_msg)
+            self.log_error_with_traceback(error_msg)
+    
+    def on_files_discovered(self, video_files):
+        """Append a batch of scanned (path, size) videos to the queue without rebuilding it"""
+        try:
+            # Drop paths that are already queued
+            new_files = []
+            for path, size in video_files:
+                path = os.path.normpath(path)
+                if not self.queue_model.contains_path(path):
+                    new_files.append((path, size))
+            self.files.extend(path for path, _ in new_files)
+            self.queue_model.add_entries(new_files)
+        except Exception as e:
+            error_msg = f"Error adding scanned files: {str(e)}"
+            self.update_status(error_msg)
+            self.log_error_with_traceback(error_msg)
+    
+    def on_scan_finished(self, accepted, rejected):
+        """Report scan results once every folder has been visited"""
+        try:
+            self.update_status(f"Added {accepted} video files ({rejected} non-video files skipped)")
+            
+            # UPDATE OUTPUT FOLDER BASED ON NEW FILES
+            if accepted:
+                self.update_output_folder_based_on_input()
+        except Exception as e:
+            error_msg = f"Error finishing scan: {str(e)}"
+            self.update_status(error_msg)
+            self.log_error_with_traceback(error_msg)
+    
     def clear_file_list(self):
         try:
+            self.media_scanner.cancel()
             self.files = []
-            self.file_list.clear()
+            self.priorities = {}
+            self.queue_model.clear()
             self.update_status("File list cleared")
             self.gui_logger.info("File list cleared")
             
@@ -566,6 +1274,25 @@ class FFastGPU(QMainWindow):
             self.update_status(error_msg)
             self.log_error_with_traceback(error_msg)
     
+    def browse_scratch_folder(self):
+        try:
+            folder = QFileDialog.getExistingDirectory(self, "Select Scratch Folder")
+            if folder:
+                self.scratch_input.setText(folder)
+                self.update_status(f"Scratch folder set to: {folder}")
+        except Exception as e:
+            error_msg = f"Error browsing scratch folder: {str(e)}"
+            self.update_status(error_msg)
+            self.log_error_with_traceback(error_msg)
+    
+    def filter_queue(self, text):
+        try:
+            self.queue_model.set_filter(text)
+        except Exception as e:
+            error_msg = f"Error filtering queue: {str(e)}"
+            self.update_status(error_msg)
+            self.log_error_with_traceback(error_msg)
+    
     def browse_output_folder(self):
         try:
             folder = QFileDialog.getExistingDirectory(self, "Select Output Folder")
@@ -585,64 +1312,27 @@ class FFastGPU(QMainWindow):
         except Exception as e:
             print(f"Error updating status: {str(e)}")  # Fallback to console
     
-    def get_video_duration(self, file_path):
-        try:
-            # Use ffprobe to get the duration of the video file
-            cmd = [
-                'ffprobe',
-                '-v', 'quiet',
-                '-print_format', 'json',
-                '-show_format',
-                file_path
-            ]
-            
-            self.probe_process = QProcess()
-            self.probe_process.finished.connect(self.probe_finished)
-            self.probe_process.start(cmd[0], cmd[1:])
-            self.gui_logger.info(f"Getting video duration for: {file_path}")
-        except Exception as e:
-            error_msg = f"Error getting video duration: {str(e)}"
-            self.update_status(error_msg)
-            self.log_error_with_traceback(error_msg)  # Use enhanced logging
-            # Continue with conversion but without accurate progress
-            self.file_durations[self.files_to_process[self.current_file_index]] = 0
-            self.start_conversion_process()
+    def apply_probe(self, file_path, data):
+        """Store probe results for a file and fill in its queue row; returns the duration"""
+        duration = float(data['format']['duration'])
+        self.file_durations[file_path] = duration
+        self.file_probes[file_path] = data
+        
+        # Fill in the queue row from the first video stream
+        video = video_stream(data)
+        resolution = f"{video['width']}x{video['height']}" if 'width' in video and 'height' in video else None
+        self.queue_model.update_path(file_path, duration=duration,
+                                     codec=video.get('codec_name'), resolution=resolution)
+        return duration
     
-    def probe_finished(self):
-        try:
-            if self.probe_process.exitStatus() == QProcess.NormalExit and self.probe_process.exitCode() == 0:
-                output = self.probe_process.readAllStandardOutput().data().decode()
-                self.ffmpeg_logger.debug(f"FFprobe output: {output}")
-                try:
-                    data = json.loads(output)
-                    duration = float(data['format']['duration'])
-                    current_file = self.files_to_process[self.current_file_index]
-                    self.file_durations[current_file] = duration
-                    self.update_status(f"Video duration: {self.format_time(duration)}")
-                    
-                    # Now that we have the duration, start the conversion
-                    self.start_conversion_process()
-                except (KeyError, ValueError) as e:
-                    error_msg = f"Error parsing video duration: {e}"
-                    self.update_status(error_msg)
-                    self.log_error_with_traceback(error_msg)
-                    # Continue with conversion but without accurate progress
-                    self.file_durations[self.files_to_process[self.current_file_index]] = 0
-                    self.start_conversion_process()
-            else:
-                error_msg = "Error getting video duration from ffprobe"
-                self.update_status(error_msg)
-                self.log_error_with_traceback(error_msg)
-                # Continue with conversion but without accurate progress
-                self.file_durations[self.files_to_process[self.current_file_index]] = 0
-                self.start_conversion_process()
-        except Exception as e:
-            error_msg = f"Error in probe_finished: {str(e)}"
-            self.update_status(error_msg)
-            self.log_error_with_traceback(error_msg)
-            # Continue with conversion but without accurate progress
-            self.file_durations[self.files_to_process[self.current_file_index]] = 0
-            self.start_conversion_process()
+    def keyframe_index(self, file_path):
+        """KeyframeIndex of an input (keyframe times and byte offsets), or None if it can't be built.
+
+        Read from the MP4 sample tables or Matroska Cues, with an ffprobe packet
+        scan as the fallback, which can take minutes on a large file; call it
+        from a worker thread.
+        """
+        return self.keyframe_indexes.get(file_path)
     
     def format_time(self, seconds):
         # Convert seconds to HH:MM:SS format
@@ -651,27 +1341,28 @@ class FFastGPU(QMainWindow):
         seconds = int(seconds % 60)
         return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
     
-    def handle_stdout(self):
+    def handle_stdout(self, job):
         try:
-            data = self.process.readAllStandardOutput()
+            data = job.process.readAllStandardOutput()
             stdout = bytes(data).decode("utf8", errors='ignore')
             self.ffmpeg_logger.info(f"FFmpeg stdout: {stdout}")
-            self.parse_ffmpeg_output(stdout)
+            self.parse_ffmpeg_output(stdout, job)
         except Exception as e:
             self.update_status(f"Error handling stdout: {str(e)}")
             self.log_error_with_traceback(f"Error handling stdout: {str(e)}")
     
-    def handle_stderr(self):
+    def handle_stderr(self, job):
         try:
-            data = self.process.readAllStandardError()
+            data = job.process.readAllStandardError()
             stderr = bytes(data).decode("utf8", errors='ignore')
             self.ffmpeg_logger.info(f"FFmpeg stderr: {stderr}")
-            self.parse_ffmpeg_output(stderr)
+            job.add_output(stderr)
+            self.parse_ffmpeg_output(stderr, job)
         except Exception as e:
             self.update_status(f"Error handling stderr: {str(e)}")
             self.log_error_with_traceback(f"Error handling stderr: {str(e)}")
     
-    def parse_ffmpeg_output(self, output):
+    def parse_ffmpeg_output(self, output, job):
         try:
             # Parse FFmpeg output to extract progress information
             lines = output.split('\n')
@@ -684,23 +1375,41 @@ class FFastGPU(QMainWindow):
                         minutes = int(time_match.group(2))
                         seconds = float(time_match.group(3))
                         current_time = hours * 3600 + minutes * 60 + seconds
+                        job.media_time = current_time
                         
                         # Get the total duration for this file
-                        current_file = self.files_to_process[self.current_file_index]
-                        total_duration = self.file_durations.get(current_file, 0)
+                        total_duration = self.file_durations.get(job.file_path, 0)
                         
-                        if total_duration > 0:
+                        if len(job.members) > 1:
+                            self.update_batch_progress(job, current_time)
+                        elif total_duration > 0:
                             # Calculate accurate progress percentage
-                            progress = min(100, int((current_time / total_duration) * 100))
-                            self.current_progress.setValue(progress)
-                            self.progress_percentage.setText(f"{progress}%")
-                            
-                            # Calculate remaining time
-                            if self.start_time and progress > 0:
-                                elapsed_seconds = self.start_time.secsTo(QTime.currentTime())
-                                total_estimated = elapsed_seconds * 100 / progress
-                                remaining_seconds = total_estimated - elapsed_seconds
-                                self.remaining_time.setText(f"Remaining: {self.format_time(remaining_seconds)}")
+                            job.progress = min(100, int((current_time / total_duration) * 100))
+                            self.queue_model.update_path(job.file_path, progress=job.progress)
+                            self.update_job_progress()
+                    
+                    # Per-file speed and output size for the queue table
+                    speed_match = re.search(r'speed=\s*([\d.]+)x', line)
+                    size_match = re.search(r'size=\s*(\d+)\s*(?:kB|KiB)', line)
+                    fields = {}
+                    if speed_match:
+                        fields['speed'] = job.speed = job.effective_speed(float(speed_match.group(1)))
+                    if size_match:
+                        fields['output_size'] = int(size_match.group(1)) * 1024
+                    if fields and len(job.members) > 1:
+                        # The stats line covers every packed clip; sizes come from each output instead
+                        fields.pop('output_size', None)
+                        for member in job.members:
+                            self.queue_model.update_path(member, **fields)
+                    elif fields:
+                        self.queue_model.update_path(job.file_path, **fields)
+                    
+                    if self.watchdog:
+                        frame_match = re.search(r'frame=\s*(\d+)', line)
+                        self.watchdog.progress(job.file_path, time.monotonic(),
+                                               job.media_time if time_match else None,
+                                               int(frame_match.group(1)) if frame_match else None,
+                                               fields.get('speed'))
                 
                 # Display the output in the status area
                 if line.strip():
@@ -710,6 +1419,39 @@ class FFastGPU(QMainWindow):
             self.update_status(error_msg)
             self.log_error_with_traceback(error_msg)
     
+    def update_batch_progress(self, job, current_time):
+        """Per-clip progress and output size for a process encoding several clips"""
+        progresses = []
+        for member, (_, _, write_path) in zip(job.members, job.outputs):
+            duration = self.file_durations.get(member, 0)
+            progress = min(100, int(current_time / duration * 100)) if duration > 0 else 0
+            progresses.append(progress)
+            fields = {'progress': progress}
+            try:
+                fields['output_size'] = os.path.getsize(write_path)
+            except OSError:
+                pass
+            self.queue_model.update_path(member, **fields)
+        job.progress = min(progresses)
+        self.update_job_progress()
+    
+    def update_job_progress(self):
+        """Show the running jobs and the remaining time of the slowest one"""
+        jobs = list(self.active_jobs.values())
+        if not jobs:
+            self.current_file_label.setText("Current File: None")
+            return
+        names = ", ".join(os.path.basename(member) for job in jobs for member in job.members)
+        self.current_file_label.setText(f"Current File: {names}" if len(jobs) == 1
+                                        else f"Current Files ({len(jobs)}): {names}")
+        progress = min(job.progress for job in jobs)
+        self.current_progress.setValue(progress)
+        self.progress_percentage.setText(f"{progress}%")
+        
+        remaining = [job.elapsed() * (100 - job.progress) / job.progress for job in jobs if job.progress > 0]
+        if remaining:
+            self.remaining_time.setText(f"Remaining: {self.format_time(max(remaining))}")
+    
     def update_timer(self):
         try:
             if self.start_time:
@@ -719,141 +1461,1146 @@ class FFastGPU(QMainWindow):
             self.update_status(f"Error updating timer: {str(e)}")
             self.log_error_with_traceback(f"Error updating timer: {str(e)}")
     
-    def process_finished(self):
+    def job_finished(self, job):
         try:
-            # Stop the timer
-            self.timer.stop()
+            file_path = job.file_path
+            filename = os.path.basename(file_path)
+            self.active_jobs.pop(file_path, None)
+            self.balanced_decodes.discard(file_path)
+            if self.watchdog:
+                self.watchdog.stop(file_path)
+            if len(job.members) > 1:
+                self.batch_finished(job)
+                self.update_job_progress()
+                self.schedule_jobs()
+                return
+            if self.staging:
+                self.staging.release_input(file_path)
             
-            if self.process.exitStatus() == QProcess.NormalExit and self.process.exitCode() == 0:
-                success_msg = f"✓ Successfully converted {os.path.basename(self.files_to_process[self.current_file_index])}"
+            started = job.process.error() != QProcess.FailedToStart
+            if started and job.process.exitStatus() == QProcess.NormalExit and job.process.exitCode() == 0:
+                renditions = f" ({len(job.outputs)} renditions)" if len(job.outputs) > 1 else ""
+                success_msg = f"✓ Successfully converted {filename}{renditions}"
                 self.update_status(success_msg)
                 self.gui_logger.info(success_msg)
+                self.retry_state.pop(file_path, None)
+                self.record_throughput(job)
                 
-                # Move to next file
-                self.current_file_index += 1
-                if self.current_file_index < self.total_files:
-                    self.process_next_file()
+                for rendition, output_path, write_path in job.outputs:
+                    # A ladder output that came out empty is redone on its own
+                    if job.is_ladder and not (os.path.exists(write_path) and os.path.getsize(write_path) > 0):
+                        self.update_status(f"✗ {filename} {rendition_label(rendition)}: no output written")
+                        self.split_ladders.add(file_path)
+                        continue
+                    if job.is_ladder:
+                        self.update_status(f"  {rendition_label(rendition)}: "
+                                           f"{format_size(os.path.getsize(write_path))}")
+                    # Outputs written to scratch are copied back in the background
+                    if write_path != output_path:
+                        self.committing_outputs.add(output_path)
+                        self.queue_model.update_path(file_path, status=STATUS_COPYING, progress=100)
+                        self.staging.commit_output(file_path, write_path, output_path)
+                    else:
+                        self.finish_output(file_path, output_path)
+                
+                if job.is_ladder:
+                    self.continue_ladder(file_path)
                 else:
-                    self.conversion_complete()
+                    self.file_resolved(file_path)
             else:
-                error = self.process.readAllStandardError().data().decode(errors='ignore')
-                error_msg = f"✗ Error converting file: {error}"
-                self.update_status(error_msg)
-                self.log_error_with_traceback(error_msg)
-                self.conversion_complete()
+                # Never leave a partial output behind; it would be mistaken for a finished one
+                self.disk_reservations.release(file_path)
+                self.remove_partial_output(job)
+                if self.conversion_stopped:
+                    self.queue_model.update_path(file_path, status=STATUS_STOPPED)
+                    return
+                if job.is_ladder and len(job.outputs) > 1:
+                    # One bad rendition fails the whole process; redo them one at a time
+                    failure, detail = classify_failure(job.output_text())
+                    self.failure_log.record_retry(file_path, failure)
+                    self.split_ladders.add(file_path)
+                    self.update_status(f"↻ {filename}: ladder failed ({failure}), encoding renditions one at a time")
+                    self.queue_model.update_path(file_path, status=STATUS_QUEUED, progress=0)
+                    self.pending_files.appendleft(file_path)
+                else:
+                    self.handle_job_failure(job)
+            
+            self.update_job_progress()
+            self.schedule_jobs()
         except Exception as e:
-            error_msg = f"Error in process_finished: {str(e)}"
+            error_msg = f"Error in job_finished: {str(e)}"
             self.update_status(error_msg)
             self.log_error_with_traceback(error_msg)
-            self.conversion_complete()
+            self.file_resolved(job.file_path)
+            self.schedule_jobs()
+    
+    def batch_finished(self, job):
+        """Resolve each clip of a packed process; a failed process is split up and its clips requeued"""
+        if self.staging:
+            for member in job.members:
+                self.staging.release_input(member)
+        
+        started = job.process.error() != QProcess.FailedToStart
+        if started and job.process.exitStatus() == QProcess.NormalExit and job.process.exitCode() == 0:
+            for member, (_, output_path, write_path) in zip(job.members, job.outputs):
+                if not (os.path.exists(write_path) and os.path.getsize(write_path) > 0):
+                    # Redo a clip that came out empty in a process of its own
+                    self.update_status(f"✗ {os.path.basename(member)}: no output written, retrying alone")
+                    self.disk_reservations.release(member)
+                    self.unbatched.add(member)
+                    self.queue_model.update_path(member, status=STATUS_QUEUED, progress=0)
+                    self.pending_files.appendleft(member)
+                    continue
+                success_msg = f"✓ Successfully converted {os.path.basename(member)}"
+                self.update_status(success_msg)
+                self.gui_logger.info(success_msg)
+                if write_path != output_path:
+                    self.committing_outputs.add(output_path)
+                    self.queue_model.update_path(member, status=STATUS_COPYING, progress=100)
+                    self.staging.commit_output(member, write_path, output_path)
+                else:
+                    self.finish_output(member, output_path)
+                self.file_resolved(member)
+            return
+        
+        for member in job.members:
+            self.disk_reservations.release(member)
+        self.remove_partial_output(job)
+        if self.conversion_stopped:
+            for member in job.members:
+                self.queue_model.update_path(member, status=STATUS_STOPPED)
+            return
+        
+        # The error line names the input (or its stream #N:M); that clip is retried alone, the rest may pack again
+        failure, detail = classify_failure(job.output_text())
+        culprits = [m for m in job.members if detail and os.path.basename(m) in detail]
+        stream_match = re.search(r'stream #(\d+):', detail or '', re.IGNORECASE)
+        if not culprits and stream_match and int(stream_match.group(1)) < len(job.members):
+            culprits = [job.members[int(stream_match.group(1))]]
+        if len(culprits) != 1:
+            culprits = job.members
+        for member in job.members:
+            if member in culprits:
+                self.unbatched.add(member)
+                self.failure_log.record_retry(member, failure)
+            self.queue_model.update_path(member, status=STATUS_QUEUED, progress=0)
+        for member in reversed(job.members):
+            self.pending_files.appendleft(member)
+        names = ", ".join(os.path.basename(m) for m in culprits)
+        self.update_status(f"↻ Packed clips failed ({failure}); retrying {names} on their own")
+    
+    def job_failed_to_start(self, job, error):
+        """QProcess does not emit finished for a process that never started"""
+        if error == QProcess.FailedToStart and job.file_path in self.active_jobs:
+            job.add_output(job.process.errorString())
+            self.job_finished(job)
+    
+    def remove_partial_output(self, job):
+        for _, output_path, write_path in job.outputs:
+            if write_path != output_path and self.staging:
+                self.staging.discard_output(write_path)
+            elif os.path.exists(write_path):
+                try:
+                    os.remove(write_path)
+                except OSError as e:
+                    self.gui_logger.warning(f"Could not remove partial output {write_path}: {e}")
+    
+    def handle_job_failure(self, job):
+        """Classify a failed run and either schedule a retry or mark the file failed"""
+        file_path = job.file_path
+        filename = os.path.basename(file_path)
+        failure, detail = classify_failure(job.output_text())
+        plan = self.retry_policy.plan(failure, job.attempt, job.software_decode)
+        self.gui_logger.error(f"{filename} failed (attempt {job.attempt}): {failure} - {detail}")
+        
+        if plan.lower_concurrency and self.job_limit > 1:
+            self.job_limit -= 1
+            self.update_status(f"Lowering concurrent jobs to {self.job_limit} ({failure})")
+            if self.concurrency:
+                # A session or memory failure is a hard ceiling the controller must not probe past
+                self.concurrency.cap(time.monotonic(), self.job_limit, failure)
+        
+        if failure == FAILURE_ENCODER_UNSUPPORTED and not job.cpu_pool and not job.is_ladder \
+                and self.cpu_pool_encoder():
+            # No GPU encoder for this file, but the CPU equivalent can still produce it
+            self.failure_log.record_retry(file_path, failure)
+            self.cpu_fallback.add(file_path)
+            self.retry_state[file_path] = (job.attempt, job.software_decode)
+            self.queue_model.update_path(file_path, status=STATUS_QUEUED, progress=0)
+            self.update_status(f"↻ {filename}: {failure}, moving it to {self.cpu_pool_encoder()[0].label}")
+            self.pending_files.appendleft(file_path)
+            return
+        
+        if not plan.retry:
+            self.retry_state.pop(file_path, None)
+            if job.is_ladder:
+                # Give up on this rendition only; the file's other renditions still run
+                rendition, output_path, _ = job.outputs[0]
+                given_up = [rendition]
+                if failure == FAILURE_CORRUPT_INPUT:
+                    # The input itself is bad, no other rendition can succeed either
+                    given_up += [r for r in self.missing_renditions(file_path) if r != rendition]
+                for rendition in given_up:
+                    label = rendition_label(rendition)
+                    self.failed_outputs.add(self.get_output_path(file_path, rendition))
+                    self.failure_log.record_failure(f"{file_path} ({label})", failure, job.attempt, detail)
+                    self.fail_duplicates(file_path, failure, job.attempt, label)
+                    self.update_status(f"✗ {filename} {label}: {plan.reason} - {detail}")
+                self.continue_ladder(file_path)
+                return
+            self.failure_log.record_failure(file_path, failure, job.attempt, detail)
+            self.queue_model.update_path(file_path, status=STATUS_FAILED)
+            self.fail_duplicates(file_path, failure, job.attempt)
+            self.update_status(f"✗ {filename}: {plan.reason} - {detail}")
+            self.file_resolved(file_path)
+            return
+        
+        self.failure_log.record_retry(file_path, failure)
+        self.retry_state[file_path] = (job.attempt, plan.software_decode)
+        self.retry_waiting.add(file_path)
+        self.queue_model.update_path(file_path, status=STATUS_QUEUED, progress=0)
+        self.update_status(f"↻ {filename}: {plan.reason} (retry {job.attempt} in {plan.delay_ms // 1000}s)")
+        generation = self.batch_generation
+        QTimer.singleShot(plan.delay_ms, lambda: self.requeue_retry(generation, file_path))
+    
+    def requeue_retry(self, generation, file_path):
+        """Put a file whose retry backoff has passed back at the front of the queue"""
+        if generation != self.batch_generation or file_path not in self.retry_waiting:
+            return
+        self.retry_waiting.discard(file_path)
+        self.pending_files.appendleft(file_path)
+        self.schedule_jobs()
+    
+    def file_resolved(self, file_path):
+        """Count a file (and the duplicates riding on it) as done, skipped or failed for good and update overall progress"""
+        self.finished_count += 1 + len(self.duplicate_inputs.get(file_path, ()))
+        if self.total_files:
+            self.overall_progress.setValue(int((self.finished_count / self.total_files) * 100))
+    
+    def missing_renditions(self, file_path):
+        """Ladder renditions of a file that still have to be encoded"""
+        missing = []
+        for rendition in self.ladder:
+            output_path = self.get_output_path(file_path, rendition)
+            if (output_path not in self.failed_outputs and output_path not in self.committing_outputs
+                    and not self.cached_output(output_path, self.rendition_key(file_path, rendition))):
+                missing.append(rendition)
+        return missing
+    
+    def failed_renditions(self, file_path):
+        return [r for r in self.ladder if self.get_output_path(file_path, r) in self.failed_outputs]
+    
+    def continue_ladder(self, file_path):
+        """Queue a ladder file again while renditions are missing, otherwise count it as finished"""
+        if self.missing_renditions(file_path):
+            self.queue_model.update_path(file_path, status=STATUS_QUEUED, progress=0)
+            self.pending_files.appendleft(file_path)
+            return
+        if self.failed_renditions(file_path):
+            self.queue_model.update_path(file_path, status=STATUS_FAILED)
+        self.disk_reservations.release(file_path)
+        self.file_resolved(file_path)
+    
+    def finish_output(self, file_path, output_path):
+        """Mark a file done once its output is in place and give duplicates their copies"""
+        self.committing_outputs.discard(output_path)
+        key = self.output_keys.pop(output_path, None)
+        if key and os.path.exists(output_path):
+            self.output_cache.record(key, output_path, file_path)
+        if not self.ladder:
+            self.disk_reservations.release(file_path)
+            output_size = os.path.getsize(output_path) if os.path.exists(output_path) else None
+            self.queue_model.update_path(file_path, status=STATUS_DONE, progress=100,
+                                         output_size=output_size)
+            self.materialize_duplicates(file_path, output_path)
+            return
+        
+        rendition = next((r for r in self.ladder if self.get_output_path(file_path, r) == output_path), None)
+        self.materialize_duplicates(file_path, output_path, rendition)
+        outputs = [self.get_output_path(file_path, r) for r in self.ladder]
+        output_size = sum(os.path.getsize(path) for path in outputs if os.path.exists(path))
+        self.queue_model.update_path(file_path, output_size=output_size)
+        # The row is done once every rendition is in place (and none is still copying back)
+        if file_path not in self.active_jobs and not any(path in self.committing_outputs for path in outputs) \
+                and not self.missing_renditions(file_path):
+            status = STATUS_FAILED if self.failed_renditions(file_path) else STATUS_DONE
+            self.queue_model.update_path(file_path, status=status, progress=100)
     
-    def start_conversion_process(self):
+    def on_output_committed(self, file_path, output_path, ok, error):
+        """Called when the staging pipeline has copied an output back from scratch"""
+        try:
+            if ok:
+                self.finish_output(file_path, output_path)
+            else:
+                self.committing_outputs.discard(output_path)
+                self.disk_reservations.release(file_path)
+                self.queue_model.update_path(file_path, status=STATUS_FAILED)
+                self.failed_outputs.add(output_path)
+                self.failure_log.record_failure(f"{file_path} ({os.path.basename(output_path)})"
+                                                if self.ladder else file_path, "copy-back failed", 1, error)
+                self.fail_duplicates(file_path, "copy-back failed", 1,
+                                     os.path.basename(output_path) if self.ladder else None)
+                self.update_status(f"✗ Copy-back of {os.path.basename(output_path)} failed: {error}")
+            self.schedule_jobs()
+        except Exception as e:
+            error_msg = f"Error finishing copied output: {str(e)}"
+            self.update_status(error_msg)
+            self.log_error_with_traceback(error_msg)
+    
+    def create_staging_pipeline(self):
+        """Create the scratch staging pipeline if a scratch folder is configured"""
+        scratch = self.scratch_input.text().strip()
+        if not scratch:
+            return None
+        try:
+            rate_limit = float(self.copy_limit_input.text()) * 1024 * 1024 if self.copy_limit_input.text().strip() else None
+        except ValueError:
+            rate_limit = None
+        try:
+            pipeline = StagingPipeline(scratch, self.output_committed.emit, rate_limit=rate_limit)
+            self.update_status(f"Staging inputs and outputs through scratch folder: {scratch}")
+            return pipeline
+        except OSError as e:
+            error_msg = f"Cannot use scratch folder {scratch}, encoding in place: {str(e)}"
+            self.update_status(error_msg)
+            self.log_error_with_traceback(error_msg)
+            return None
+    
+    def shutdown_staging(self):
+        """Stop staging; outputs already queued for copy-back still complete"""
+        if self.staging:
+            if self.staging.pending_commits():
+                self.update_status(f"Copying {self.staging.pending_commits()} output(s) back from scratch...")
+            self.staging.shutdown()
+            self.staging = None
+    
+    def start_job(self, file_path, gpu=None, cpu_pool=False):
+        """Start converting one file; returns False if it has to wait for disk space.
+        
+        cpu_pool runs it on the CPU equivalent of the selected NVENC encoder instead.
+        """
         try:
-            file_path = self.files_to_process[self.current_file_index]
             filename = os.path.basename(file_path)
-            
-            # Update progress UI
-            self.overall_progress.setValue(int((self.current_file_index / self.total_files) * 100))
-            self.current_file_label.setText(f"Current File: {filename}")
-            self.current_progress.setValue(0)
-            self.progress_percentage.setText("0%")
+            attempts = self.retry_state.get(file_path, (0, False))[0]
             
             # Get settings
-            bitrate = self.bitrate_input.text() or "3000k"
-            fps = self.fps_input.text()
+            spec = self.get_encoder_spec()
             preset = self.preset_input.text() or "p1"
-            bframes = self.bframes_input.text() or "4"
-            lookahead = self.lookahead_input.text() or "32"
-            encoder = self.encoder_input.text() or "nvenc"
-            decoder = self.decoder_input.text() or "cuda"
-            threads = self.threads_input.text() or "1"
-            output_folder = self.output_input.text()
-            output_format = self.format_combo.currentText()
+            if file_path in self.cpu_fallback and self.cpu_pool_encoder():
+                cpu_pool = True
+            if cpu_pool:
+                spec, preset = self.cpu_pool_encoder()
+                gpu = None
+            elif gpu is None:
+                gpu = self.select_gpu()
+            # Decode on the GPU only when its NVDEC handles this stream (CPU encoders always decode in software)
+            route = self.decode_route(file_path, gpu, spec)
+            if not cpu_pool:
+                route = self.balance_route(file_path, route)
+            software_decode = route.path != ROUTE_GPU
+            if self.ladder:
+                return self.start_ladder_job(file_path, spec, gpu, attempts, route)
             
             # Prepare output filename
-            name, ext = os.path.splitext(filename)
-            output_filename = f"{name}.{bitrate}bps.{fps if fps else 'source'}fps.{decoder}.{encoder}.{output_format}"
-            output_path = os.path.join(output_folder, output_filename)
+            output_path = self.get_output_path(file_path)
             
             if not self.is_safe_path(output_path):
                 error_msg = f"Output path contains invalid characters: {output_path}"
+                self.queue_model.update_path(file_path, status=STATUS_FAILED)
+                self.failure_log.record_failure(file_path, "invalid output name", 0, output_path)
+                self.fail_duplicates(file_path, "invalid output name", 0)
                 self.update_status(error_msg)
                 self.log_error_with_traceback(error_msg)
-                self.current_file_index += 1
-                self.process_next_file()
-                return
+                self.file_resolved(file_path)
+                return True
+            
+            # Decide between re-encode, stream-copy remux and skip
+            action, reason = self.decide_action(file_path)
+            
+            # Skip when this input was already encoded with exactly these settings (under any name)
+            if action != ACTION_SKIP:
+                key = self.output_key(file_path, spec, preset, action)
+                cached = self.cached_output(output_path, key)
+                if cached is None and cpu_pool:
+                    # An output of the configured GPU encode is as good as the CPU stand-in
+                    cached = self.cached_output(output_path, self.output_key(
+                        file_path, self.get_encoder_spec(), self.preset_input.text() or "p1", action))
+                if cached is not None and self.place_cached_output(file_path, cached, output_path):
+                    self.file_resolved(file_path)
+                    return True
+                if cached is None and os.path.exists(output_path):
+                    self.gui_logger.info(f"{filename}: {os.path.basename(output_path)} was written with other "
+                                         f"settings (or before the output index), encoding it again")
+                self.output_keys[output_path] = key
             
-            # Skip if output file already exists
-            if os.path.exists(output_path):
-                skip_msg = f"Skipping {filename} - already exists in output folder"
+            if action == ACTION_SKIP:
+                skip_msg = f"Skipping {filename} - {reason}"
+                self.queue_model.update_path(file_path, status=STATUS_SKIPPED)
+                for duplicate in self.duplicate_inputs.get(file_path, []):
+                    self.queue_model.update_path(duplicate, status=STATUS_SKIPPED)
                 self.update_status(skip_msg)
-                self.gui_logger.info(skip_msg)
-                self.current_file_index += 1
-                self.process_next_file()
-                return
+                self.file_resolved(file_path)
+                return True
+            
+            # Hold the job (not fail it) until its estimated output fits on the destination
+            if not self.reserve_output_space(file_path, output_path, action):
+                return False
             
-            # Build FFmpeg command
+            # Read from the staged copy and write to scratch when staging is enabled
+            input_path = file_path
+            encode_output = output_path
+            if self.staging:
+                input_path = self.staging.staged_input(file_path) or file_path
+                encode_output = self.scratch_write_path(file_path, output_path, action)
+            
+            job = Job(file_path, output_path, encode_output, action, gpu,
+                      attempt=attempts + 1, software_decode=software_decode, cpu_pool=cpu_pool)
+            
+            if action == ACTION_REMUX:
+                self.run_ffmpeg(job, [
+                    'ffmpeg',
+                    '-hide_banner',
+                    '-loglevel', 'info',
+                    '-i', input_path,
+                    '-c', 'copy',
+                ] + (['-tag:v', spec.mp4_tag] if spec.mp4_tag and self.format_combo.currentText() == 'mp4' else [])
+                  + self.output_tag_args(output_path) + [
+                    '-y',
+                    encode_output
+                ], f"Remuxing {filename} - {reason}", STATUS_REMUXING)
+                return True
+            
+            # Pack short clips with similar ones into one process to share ffmpeg/CUDA startup
+            if (action == ACTION_ENCODE and self.clip_batch_check.isChecked() and attempts == 0
+                    and not cpu_pool and file_path not in self.unbatched):
+                members = self.collect_batch_members(file_path, gpu)
+                if members:
+                    return self.start_batch_job([file_path] + members, spec, gpu)
+            
+            # Build FFmpeg command; software decode leaves frames in system memory
             cmd = [
                 'ffmpeg',
                 '-hide_banner',
                 '-loglevel', 'info',
-                '-hwaccel', decoder,
-                '-hwaccel_output_format', decoder,
-                '-threads', threads,
-                '-i', file_path
             ]
+            # Threads are shared out again for every job that starts, from the jobs running now
+            budget = self.thread_budget(route.path)
+            self.gui_logger.info(f"{filename}: {route.path} path, threads decode {budget.decode}, "
+                                 f"filter {budget.filter}, encode {budget.encode or 'GPU'}")
+            cmd.extend(['-filter_threads', str(budget.filter)])
+            if route.path == ROUTE_CPU_DECODE:
+                cmd.extend(self.upload_device_args(gpu))
+            cmd.extend(self.input_args(input_path, gpu, software_decode, budget.decode))
+            cmd.extend(self.output_args(file_path, encode_output, spec, gpu, route, preset, budget.encode,
+                                        self.output_tag_args(output_path)))
             
-            # Add FPS filter if specified
-            if fps:
-                cmd.extend(['-vf', f'fps={fps}'])
-            
-            # Add encoding parameters
-            cmd.extend([
-                '-c:v', f'hevc_{encoder}',
-                '-preset', preset,
-                '-b:v', bitrate,
-                '-bf', bframes,
-                '-rc-lookahead', lookahead,
-                '-c:a', 'copy',
-                '-y',  # Overwrite output files without asking
-                output_path
-            ])
-            
-            # Log the command
-            self.ffmpeg_logger.info(f"FFmpeg command: {' '.join(cmd)}")
-            
-            # Start the process
-            self.update_status(f"Converting {filename}...")
+            # Keep the job's memory on the GPU's NUMA node where possible
+            pin_job = self.numa_pin_check.isChecked() and spec.hardware
+            if pin_job:
+                cmd = self.job_pinner.wrap_command(cmd, gpu)
             
-            self.process = QProcess()
-            self.process.readyReadStandardOutput.connect(self.handle_stdout)
-            self.process.readyReadStandardError.connect(self.handle_stderr)
-            self.process.finished.connect(self.process_finished)
-            self.process.start(cmd[0], cmd[1:])
-            
-            # Start the timer for elapsed time
-            self.start_time = QTime.currentTime()
-            self.timer.start(1000)  # Update every second
+            if spec.hardware:
+                decode_note = f" (CPU decode: {route.reason})" if software_decode else ""
+                status_msg = f"Converting {filename} to {spec.label} on GPU {gpu}{decode_note}..."
+            elif cpu_pool:
+                reason = "no GPU encoder for it" if file_path in self.cpu_fallback else "while the GPU slots are busy"
+                status_msg = f"Converting {filename} to {spec.label} ({preset}) {reason}..."
+            else:
+                status_msg = f"Converting {filename} to {spec.label}..."
+            self.run_ffmpeg(job, cmd, status_msg, STATUS_CONVERTING, gpu if pin_job else None)
+            return True
         except Exception as e:
-            error_msg = f"Error starting conversion process: {str(e)}"
+            error_msg = f"Error starting conversion of {file_path}: {str(e)}"
+            self.queue_model.update_path(file_path, status=STATUS_FAILED)
+            self.failure_log.record_failure(file_path, "could not start", 0, str(e))
+            self.fail_duplicates(file_path, "could not start", 0)
             self.update_status(error_msg)
             self.log_error_with_traceback(error_msg)
-            self.conversion_complete()
+            self.file_resolved(file_path)
+            return True
+    
+    def input_args(self, input_path, gpu, software_decode, threads=None):
+        """ffmpeg options for one input, decoding on the GPU unless software_decode"""
+        decoder = self.decoder_input.text() or "cuda"
+        args = []
+        if not software_decode:
+            args.extend([
+                '-hwaccel', decoder,
+                '-hwaccel_device', str(gpu),
+                '-hwaccel_output_format', decoder,
+            ])
+        args.extend([
+            '-threads', str(threads or self.threads_input.text() or "1"),
+            '-i', input_path
+        ])
+        return args
+    
+    def upload_device_args(self, gpu):
+        """Global options naming the CUDA device hwupload_cuda puts software-decoded frames on"""
+        return ['-init_hw_device', f'cuda=cu:{gpu}', '-filter_hw_device', 'cu']
+    
+    def output_args(self, file_path, write_path, spec, gpu, route, preset=None, threads=0, tags=()):
+        """ffmpeg options for one encoded output: filters, pixel format, encoder settings and audio copy"""
+        decoder = self.decoder_input.text() or "cuda"
+        gpu_frames = decoder == 'cuda' and route.path == ROUTE_GPU
+        args = []
+        
+        # Add FPS and downscale filters if specified
+        filters = []
+        fps = self.fps_input.text()
+        if fps:
+            filters.append(f'fps={fps}')
+        # CUDA frames NVDEC hands over in another format (p010 for an 8-bit encoder, 4:4:4) are converted on the GPU
+        convert = gpu_frames and route.surface_format and route.surface_format != route.output_format
+        max_height = self.get_max_height()
+        source_height = video_stream(self.file_probes.get(file_path)).get('height')
+        if max_height and source_height and source_height > max_height:
+            if gpu_frames:
+                filters.append(f'scale_cuda=-2:{max_height}' + (f':format={route.output_format}' if convert else ''))
+            else:
+                filters.append(f'scale=-2:{max_height}')
+        elif convert:
+            filters.append(f'scale_cuda=format={route.output_format}')
+        if route.path == ROUTE_CPU_DECODE:
+            # Software-decoded frames go to NVENC through the filter graph, after any CPU scaling
+            filters.extend([f'format={route.output_format}', 'hwupload_cuda'])
+        if filters:
+            args.extend(['-vf', ','.join(filters)])
+        if route.path == ROUTE_CPU:
+            args.extend(['-pix_fmt', route.output_format])
+        
+        # Add encoding parameters
+        args.extend(encoder_args(spec, preset or self.preset_input.text() or "p1", self.bitrate_input.text() or "3000k",
+                                 self.bframes_input.text() or "4", self.lookahead_input.text() or "32",
+                                 gpu if spec.hardware else None))
+        if threads:
+            args.extend(['-threads', str(threads)])
+        args.extend(tags)
+        args.extend([
+            '-c:a', 'copy',
+            '-y',  # Overwrite output files without asking
+            write_path
+        ])
+        return args
+    
+    def is_short_clip(self, file_path):
+        duration = self.file_durations.get(file_path, 0)
+        return 0 < duration <= SHORT_CLIP_SECONDS
+    
+    def batch_key(self, file_path):
+        """Clips only share a process with clips of the same codec, resolution and pixel format"""
+        video = video_stream(self.file_probes.get(file_path))
+        return video.get('codec_name'), video.get('width'), video.get('height'), video.get('pix_fmt')
+    
+    def collect_batch_members(self, file_path, gpu):
+        """Take short clips like file_path off the head of the queue to encode alongside it"""
+        if not self.is_short_clip(file_path):
+            return []
+        limit = CLIPS_PER_PROCESS - 1
+        if self.session_limit:
+            # Every packed clip opens its own encoder session
+            in_use = sum(len(job.outputs) for job in self.active_jobs.values() if not job.cpu_pool)
+            limit = min(limit, self.session_limit - in_use - 1)
+        key = self.batch_key(file_path)
+        members = []
+        for candidate in list(islice(self.pending_files, BATCH_SCAN_DEPTH)):
+            if len(members) >= limit:
+                break
+            if (candidate in self.retry_state or candidate in self.unbatched
+                    or not self.is_short_clip(candidate) or self.batch_key(candidate) != key):
+                continue
+            # Anything that would be skipped, remuxed, reused or rejected takes its own turn
+            output_path = self.get_output_path(candidate)
+            if not self.is_safe_path(output_path):
+                continue
+            if self.decide_action(candidate, log=False)[0] != ACTION_ENCODE:
+                continue
+            spec = self.get_encoder_spec()
+            if self.cached_output(output_path, self.output_key(candidate, spec, self.preset_input.text() or "p1")):
+                continue
+            # Each packed clip brings its own decoder and encoder surfaces
+            if self.try_admit(candidate, gpu, running=1):
+                break
+            if not self.reserve_output_space(candidate, output_path, ACTION_ENCODE, hold=False):
+                break
+            self.pending_files.remove(candidate)
+            members.append(candidate)
+        return members
+    
+    def start_batch_job(self, files, spec, gpu):
+        """Encode several short clips in one ffmpeg process, one mapped output per input"""
+        cmd = [
+            'ffmpeg',
+            '-hide_banner',
+            '-loglevel', 'info',
+        ]
+        outputs = []
+        routes = [self.decode_route(file_path, gpu, spec) for file_path in files]
+        paths = [route.path for route in routes]
+        # Every packed input is its own decoder and encoder, so each counts as a job
+        budgets = [self.thread_budget(path, paths[:i] + paths[i + 1:]) for i, path in enumerate(paths)]
+        cmd.extend(['-filter_threads', str(min(budget.filter for budget in budgets))])
+        if any(route.path == ROUTE_CPU_DECODE for route in routes):
+            cmd.extend(self.upload_device_args(gpu))
+        for file_path, route, budget in zip(files, routes, budgets):
+            input_path = file_path
+            output_path = self.get_output_path(file_path)
+            write_path = output_path
+            if self.staging:
+                input_path = self.staging.staged_input(file_path) or file_path
+                write_path = self.scratch_write_path(file_path, output_path)
+            cmd.extend(self.input_args(input_path, gpu, route.path != ROUTE_GPU, budget.decode))
+            self.output_keys[output_path] = self.output_key(file_path, spec, self.preset_input.text() or "p1")
+            outputs.append((None, output_path, write_path))
+        for index, (file_path, route, budget, (_, output_path, write_path)) in enumerate(
+                zip(files, routes, budgets, outputs)):
+            cmd.extend(['-map', f'{index}:V:0', '-map', f'{index}:a?'])
+            cmd.extend(self.output_args(file_path, write_path, spec, gpu, route, threads=budget.encode,
+                                        tags=self.output_tag_args(output_path)))
+        
+        job = Job(files[0], outputs[0][1], outputs[0][2], ACTION_ENCODE, gpu,
+                  software_decode=routes[0].path != ROUTE_GPU, outputs=outputs, members=files)
+        
+        pin_job = self.numa_pin_check.isChecked() and spec.hardware
+        if pin_job:
+            cmd = self.job_pinner.wrap_command(cmd, gpu)
+        
+        names = ", ".join(os.path.basename(f) for f in files)
+        where = f" on GPU {gpu}" if spec.hardware else ""
+        self.run_ffmpeg(job, cmd, f"Converting {len(files)} clips together to {spec.label}{where}: {names}",
+                        STATUS_CONVERTING, gpu if pin_job else None)
+        return True
+    
+    def start_ladder_job(self, file_path, spec, gpu, attempts, route):
+        """Encode every missing rendition of a file from one decode (or just the next one after a failure)"""
+        filename = os.path.basename(file_path)
+        renditions = self.missing_renditions(file_path)
+        # Renditions encoded before with these settings (perhaps from a renamed input) are linked into place
+        for rendition in self.ladder:
+            if rendition in renditions:
+                continue
+            output_path = self.get_output_path(file_path, rendition)
+            cached = self.cached_output(output_path, self.rendition_key(file_path, rendition))
+            if cached is not None and cached != output_path and self.is_safe_path(output_path):
+                link_or_copy_over(cached, output_path)
+        if not renditions:
+            skip_msg = f"Skipping {filename} - all renditions already encoded with these settings"
+            self.queue_model.update_path(file_path, status=STATUS_SKIPPED)
+            self.update_status(skip_msg)
+            for rendition in self.ladder:
+                self.materialize_duplicates(file_path, self.get_output_path(file_path, rendition), rendition)
+            self.file_resolved(file_path)
+            return True
+        if file_path in self.split_ladders:
+            renditions = renditions[:1]
+        
+        outputs = []
+        for rendition in renditions:
+            output_path = self.get_output_path(file_path, rendition)
+            if not self.is_safe_path(output_path):
+                error_msg = f"Output path contains invalid characters: {output_path}"
+                self.queue_model.update_path(file_path, status=STATUS_FAILED)
+                self.failure_log.record_failure(file_path, "invalid output name", 0, output_path)
+                self.fail_duplicates(file_path, "invalid output name", 0)
+                self.update_status(error_msg)
+                self.file_resolved(file_path)
+                return True
+            self.output_keys[output_path] = self.rendition_key(file_path, rendition)
+            outputs.append((rendition, output_path))
+        
+        if not self.reserve_output_space(file_path, outputs[0][1], ACTION_ENCODE):
+            return False
+        
+        input_path = file_path
+        if self.staging:
+            input_path = self.staging.staged_input(file_path) or file_path
+            outputs = [(r, out, self.scratch_write_path(file_path, out, parts=len(self.ladder)))
+                       for r, out in outputs]
+        else:
+            outputs = [(r, out, out) for r, out in outputs]
+        job = Job(file_path, outputs[0][1], outputs[0][2], ACTION_ENCODE, gpu,
+                  attempt=attempts + 1, software_decode=route.path != ROUTE_GPU, outputs=outputs)
+        
+        preset = self.preset_input.text() or "p1"
+        bframes = self.bframes_input.text() or "4"
+        lookahead = self.lookahead_input.text() or "32"
+        decoder = self.decoder_input.text() or "cuda"
+        cmd = [
+            'ffmpeg',
+            '-hide_banner',
+            '-loglevel', 'info',
+        ]
+        budget = self.thread_budget(route.path)
+        cmd.extend(['-filter_complex_threads', str(budget.filter)])
+        if route.path == ROUTE_CPU_DECODE:
+            cmd.extend(self.upload_device_args(gpu))
+        cmd.extend(self.input_args(input_path, gpu, route.path != ROUTE_GPU, budget.decode))
+        
+        # Decode once, split the frames and scale each copy for its rendition
+        source_height = video_stream(self.file_probes.get(file_path)).get('height')
+        gpu_frames = decoder == 'cuda' and route.path == ROUTE_GPU
+        convert = route.surface_format != route.output_format
+        upload = route.output_format if route.path == ROUTE_CPU_DECODE else None
+        filter_graph, labels = ladder_filter(renditions, self.fps_input.text(), source_height, gpu_frames=gpu_frames,
+                                             gpu_format=route.output_format if route.surface_format and convert else None,
+                                             upload=upload)
+        cmd.extend(['-filter_complex', filter_graph])
+        for label, (rendition, output_path, write_path) in zip(labels, outputs):
+            cmd.extend(['-map', f'[{label}]', '-map', '0:a?'])
+            if route.path == ROUTE_CPU:
+                cmd.extend(['-pix_fmt', route.output_format])
+            cmd.extend(encoder_args(spec, preset, rendition.bitrate, bframes, lookahead,
+                                    gpu if spec.hardware else None))
+            if budget.encode:
+                # The renditions' encoders run side by side within the job's share
+                cmd.extend(['-threads', str(max(1, budget.encode // len(renditions)))])
+            cmd.extend(self.output_tag_args(output_path))
+            cmd.extend(['-c:a', 'copy', '-y', write_path])
+        
+        pin_job = self.numa_pin_check.isChecked() and spec.hardware
+        if pin_job:
+            cmd = self.job_pinner.wrap_command(cmd, gpu)
+        
+        labels_text = ", ".join(rendition_label(r) for r in renditions)
+        where = f" on GPU {gpu}" if spec.hardware else ""
+        self.run_ffmpeg(job, cmd, f"Converting {filename} to {spec.label}{where}: {labels_text}...",
+                        STATUS_CONVERTING, gpu if pin_job else None)
+        return True
     
-    def process_next_file(self):
+    def run_ffmpeg(self, job, cmd, status_msg, status, pin_gpu=None):
+        """Start the ffmpeg command for a job and track its progress"""
+        # Log the command
+        self.ffmpeg_logger.info(f"FFmpeg command: {' '.join(cmd)}")
+        
+        # Start the process
+        self.update_status(status_msg)
+        for member in job.members:
+            self.queue_model.update_path(member, status=status, progress=0)
+        
+        job.process = QProcess()
+        # Number GPUs like nvidia-smi does, which GPU selection, monitoring and pinning go by
+        env = QProcessEnvironment.systemEnvironment()
+        for name, value in CUDA_ENV.items():
+            env.insert(name, value)
+        job.process.setProcessEnvironment(env)
+        if self.watchdog:
+            self.watchdog.start(job.file_path, time.monotonic())
+        job.process.readyReadStandardOutput.connect(lambda: self.handle_stdout(job))
+        job.process.readyReadStandardError.connect(lambda: self.handle_stderr(job))
+        job.process.finished.connect(lambda *_: self.job_finished(job))
+        job.process.errorOccurred.connect(lambda error: self.job_failed_to_start(job, error))
+        # Restrict the job to the CPUs local to its GPU once it is running, without blocking the GUI
+        if pin_gpu is not None:
+            job.process.started.connect(lambda: self.job_pinner.pin_process(job.process.processId(), pin_gpu))
+        self.active_jobs[job.file_path] = job
+        job.process.start(cmd[0], cmd[1:])
+        self.update_job_progress()
+    
+    def estimate_output_size(self, file_path, action=None):
+        """Estimated output bytes for a file from its probed duration and the target bitrate"""
+        if action is None:
+            action = ACTION_ENCODE if self.ladder else self.decide_action(file_path, log=False)[0]
+        if action == ACTION_SKIP:
+            return 0
         try:
-            if self.current_file_index >= self.total_files:
-                self.conversion_complete()
+            input_size = os.path.getsize(file_path)
+        except OSError:
+            input_size = 0
+        if action == ACTION_REMUX:
+            return input_size
+        bitrates = [r.bitrate for r in self.ladder] or [self.bitrate_input.text() or "3000k"]
+        estimates = [estimate_encode_bytes(self.file_durations.get(file_path), parse_bitrate(bitrate),
+                                           self.file_probes.get(file_path)) for bitrate in bitrates]
+        # Without a duration the input size is a conservative stand-in
+        return sum(estimates) if None not in estimates else input_size * len(bitrates)
+    
+    def reserve_output_space(self, file_path, output_path, action, hold=True):
+        """Reserve destination space for a job, or hold it and retry later; returns True if reserved"""
+        estimate = self.output_estimates.get(file_path)
+        if estimate is None:
+            estimate = self.estimate_output_size(file_path, action)
+        # With scratch staging the destination only grows during copy-back
+        written_path = output_path + '.part' if self.staging else output_path
+        output_folder = os.path.dirname(output_path)
+        if self.disk_reservations.try_reserve(file_path, output_folder, estimate, written_path):
+            return True
+        if not hold:
+            return False
+        
+        free = max(0, self.disk_reservations.free_bytes(output_folder))
+        self.queue_model.update_path(file_path, status=STATUS_WAITING_SPACE)
+        if not self.space_hold:
+            self.update_status(f"Holding {os.path.basename(file_path)}: needs ~{format_gb(estimate)}, "
+                               f"{format_gb(free)} free on destination - retrying in {SPACE_RETRY_MS // 1000}s")
+            self.space_hold = True
+            generation = self.batch_generation
+            QTimer.singleShot(SPACE_RETRY_MS, lambda: self.retry_held_job(generation))
+        return False
+    
+    def scratch_write_path(self, file_path, output_path, action=ACTION_ENCODE, parts=1):
+        """Scratch path to encode output_path into if its estimated size fits on scratch, else output_path"""
+        estimate = self.output_estimates.get(file_path)
+        if estimate is None:
+            estimate = self.estimate_output_size(file_path, action)
+        # A ladder's estimate covers all of its renditions
+        return self.staging.scratch_output(output_path, estimate // parts) or output_path
+    
+    def retry_held_job(self, generation):
+        """Re-attempt jobs that were held for disk space, unless the batch has moved on"""
+        if generation == self.batch_generation:
+            self.space_hold = False
+            self.schedule_jobs()
+    
+    def get_max_height(self):
+        """Parse the Max Height field; None means keep the source resolution"""
+        text = self.max_height_input.text().strip().lower().rstrip('p')
+        return int(text) if text.isdigit() and int(text) > 0 else None
+    
+    def decide_action(self, file_path, log=True):
+        """Ask the encode policy what to do with a file and log the decision"""
+        if not self.smart_skip_check.isChecked():
+            return ACTION_ENCODE, "policy disabled"
+        try:
+            factor = float(self.bitrate_factor_input.text() or "1.1")
+        except ValueError:
+            factor = 1.1
+        policy = EncodePolicy(target_codec=self.get_encoder_spec().codec,
+                              target_bitrate=self.bitrate_input.text() or "3000k",
+                              bitrate_factor=factor,
+                              max_height=self.get_max_height(),
+                              target_fps=self.fps_input.text() or None)
+        action, reason = policy.decide(self.file_probes.get(file_path), self.format_combo.currentText(),
+                                       file_path)
+        if log:
+            self.gui_logger.info(f"Encode policy: {os.path.basename(file_path)} -> {action} ({reason})")
+        return action, reason
+    
+    def get_output_path(self, file_path, rendition=None):
+        """Build the output path for an input (or one of its ladder renditions) from the current settings"""
+        bitrate = rendition.bitrate if rendition else self.bitrate_input.text() or "3000k"
+        fps = self.fps_input.text()
+        encoder = self.get_encoder_spec().tag
+        decoder = self.decoder_input.text() or "cuda"
+        output_format = rendition.output_format if rendition else self.format_combo.currentText()
+        
+        name, ext = os.path.splitext(os.path.basename(file_path))
+        output_filename = f"{name}.{bitrate}bps.{fps if fps else 'source'}fps.{decoder}.{encoder}.{output_format}"
+        return os.path.join(self.output_input.text(), output_filename)
+    
+    def output_recipe(self, file_path, spec, preset, action=ACTION_ENCODE, rendition=None):
+        """ffmpeg output options deciding what an output contains, with a placeholder output path.
+        
+        GPU index, thread counts and the decode path (NVDEC, CPU decode, the
+        balancer moving between them) change how a file is encoded, not what
+        comes out, so the recipe is built for the encoder's plain route.
+        """
+        output_format = rendition.output_format if rendition else self.format_combo.currentText()
+        output = f"output.{output_format}"
+        if action == ACTION_REMUX:
+            return ['-c', 'copy'] + (['-tag:v', spec.mp4_tag] if spec.mp4_tag and output_format == 'mp4' else []) \
+                + [output]
+        route = route_for(video_stream(self.file_probes.get(file_path)), spec, nvdec=False)
+        if rendition is None:
+            return self.output_args(file_path, output, spec, None, route, preset)
+        source_height = video_stream(self.file_probes.get(file_path)).get('height')
+        filter_graph, _ = ladder_filter([rendition], self.fps_input.text(), source_height,
+                                        gpu_frames=route.path == ROUTE_GPU)
+        args = ['-filter_complex', filter_graph]
+        if route.path == ROUTE_CPU:
+            args.extend(['-pix_fmt', route.output_format])
+        return args + encoder_args(spec, preset, rendition.bitrate, self.bframes_input.text() or "4",
+                                   self.lookahead_input.text() or "32") + ['-c:a', 'copy', output]
+    
+    def output_key(self, file_path, spec, preset, action=ACTION_ENCODE, rendition=None):
+        """Cache key of an output: input content fingerprint + output recipe hash, or None without a fingerprint.
+        
+        Fingerprints are read by the probe workers; this only looks them up.
+        """
+        fingerprint = self.output_cache.fingerprint(file_path)
+        if fingerprint is None:
+            return None
+        return cache_key(fingerprint, self.output_recipe(file_path, spec, preset, action, rendition))
+    
+    def rendition_key(self, file_path, rendition):
+        return self.output_key(file_path, self.get_encoder_spec(), self.preset_input.text() or "p1",
+                               rendition=rendition)
+    
+    def cached_output(self, output_path, key):
+        """Existing output recorded for key in the index of output_path's folder, or None"""
+        return self.output_cache.lookup(os.path.dirname(output_path), key)
+    
+    def output_tag_args(self, output_path):
+        """Options tagging an output's container with the cache key of the job writing it"""
+        key = self.output_keys.get(output_path)
+        return tag_args(key, os.path.splitext(output_path)[1].lstrip('.')) if key else []
+    
+    def place_cached_output(self, file_path, cached, output_path):
+        """Resolve a file from an output already encoded with its settings; returns False to encode instead"""
+        filename = os.path.basename(file_path)
+        try:
+            if os.path.normcase(os.path.abspath(cached)) == os.path.normcase(os.path.abspath(output_path)):
+                skip_msg = f"Skipping {filename} - already encoded with these settings"
+                self.queue_model.update_path(file_path, status=STATUS_SKIPPED)
+            else:
+                method = link_or_copy_over(cached, output_path)
+                skip_msg = f"✓ {filename} was already encoded with these settings as " \
+                           f"{os.path.basename(cached)} - output {method}"
+                self.queue_model.update_path(file_path, status=STATUS_DONE, progress=100,
+                                             output_size=os.path.getsize(output_path))
+        except OSError as e:
+            self.gui_logger.warning(f"Could not reuse {cached} for {filename}: {e}")
+            return False
+        self.update_status(skip_msg)
+        self.gui_logger.info(skip_msg)
+        self.materialize_duplicates(file_path, output_path)
+        return True
+    
+    def fail_duplicates(self, file_path, failure, attempts, label=None):
+        """Fail the duplicates of an input that failed for good (label: the failed ladder rendition)"""
+        for duplicate in self.duplicate_inputs.get(file_path, []):
+            self.queue_model.update_path(duplicate, status=STATUS_FAILED)
+            self.failure_log.record_failure(f"{duplicate} ({label})" if label else duplicate, failure, attempts,
+                                            f"identical to {os.path.basename(file_path)}, which failed")
+    
+    def materialize_duplicates(self, file_path, output_path, rendition=None):
+        """Give every duplicate of file_path its own output by hard-linking (or copying) output_path"""
+        for duplicate in self.duplicate_inputs.get(file_path, []):
+            try:
+                duplicate_output = self.get_output_path(duplicate, rendition)
+                if os.path.exists(duplicate_output):
+                    self.queue_model.update_path(duplicate, status=STATUS_SKIPPED)
+                    continue
+                if not self.is_safe_path(duplicate_output):
+                    self.queue_model.update_path(duplicate, status=STATUS_FAILED)
+                    continue
+                method = link_or_copy(output_path, duplicate_output)
+                # A ladder duplicate stays failed once a rendition of its input has failed
+                status = STATUS_FAILED if rendition and self.failed_renditions(file_path) else STATUS_DONE
+                self.queue_model.update_path(duplicate, status=status, progress=100,
+                                             output_size=os.path.getsize(duplicate_output))
+                self.update_status(f"✓ {os.path.basename(duplicate)} is identical to "
+                                   f"{os.path.basename(file_path)} - output {method}")
+            except Exception as e:
+                self.queue_model.update_path(duplicate, status=STATUS_FAILED)
+                error_msg = f"Error creating output for duplicate {duplicate}: {str(e)}"
+                self.update_status(error_msg)
+                self.log_error_with_traceback(error_msg)
+    
+    def get_gpu_indices(self):
+        """Parse the GPU field into a list of device indices"""
+        indices = []
+        for part in (self.gpu_input.text() or "0").split(','):
+            part = part.strip()
+            if part.isdigit():
+                indices.append(int(part))
+        return indices or [0]
+    
+    def gpus_by_load(self):
+        """Selected GPUs, the one running the fewest jobs first"""
+        gpus = self.get_gpu_indices()
+        load = {gpu: 0 for gpu in gpus}
+        for job in self.active_jobs.values():
+            if job.gpu in load:
+                load[job.gpu] += 1
+        return sorted(gpus, key=lambda gpu: load[gpu])
+    
+    def select_gpu(self):
+        """Pick the selected GPU running the fewest jobs"""
+        return self.gpus_by_load()[0]
+    
+    def decode_route(self, file_path, gpu=None, spec=None):
+        """Decode path and pixel formats for a file on a GPU (the weakest selected GPU when None)"""
+        spec = spec or self.get_encoder_spec()
+        software_decode = self.retry_state.get(file_path, (0, False))[1]
+        stream = video_stream(self.file_probes.get(file_path))
+        # The capability table is NVDEC's; other hwaccels keep the GPU path
+        nvdec = (self.decoder_input.text() or "cuda") == 'cuda'
+        gpus = [gpu] if gpu is not None else self.get_gpu_indices()
+        caps = [self.nvenc_caps.compute_cap(g) for g in gpus]
+        compute_cap = min(caps) if caps and None not in caps else None
+        route = route_for(stream, spec, compute_cap, software_decode, nvdec)
+        if route.path == ROUTE_CPU_DECODE and file_path not in self.routes_logged:
+            self.routes_logged.add(file_path)
+            self.gui_logger.info(f"{os.path.basename(file_path)}: {route.path} path ({route.reason}), "
+                                 f"encoding from {route.output_format}")
+        return route
+    
+    def job_footprint(self, file_path, gpu=None, spec=None):
+        """Estimated VRAM/RAM/CPU needs of encoding a file with the current settings"""
+        video = video_stream(self.file_probes.get(file_path))
+        spec = spec or self.get_encoder_spec()
+        software_decode = self.decode_route(file_path, gpu, spec).path != ROUTE_GPU
+        lookahead = self.lookahead_input.text()
+        bframes = self.bframes_input.text()
+        return estimate_footprint(video.get('width') or 1920, video.get('height') or 1080,
+                                  pixel_layout(video)[1],
+                                  int(lookahead) if lookahead.isdigit() else 32,
+                                  int(bframes) if bframes.isdigit() else 4,
+                                  outputs=len(self.ladder) or 1,
+                                  gpu_decode=not software_decode, gpu_encode=spec.hardware)
+    
+    def try_admit(self, file_path, gpu, running, spec=None):
+        """Admit a file on a GPU if its footprint fits; returns None or the reason it does not"""
+        spec = spec or self.get_encoder_spec()
+        footprint = self.job_footprint(file_path, gpu, spec)
+        gpu = gpu if spec.hardware else None
+        now = time.monotonic()
+        free_cores = (psutil.cpu_count() or 1) * (100 - self.cpu_percent) / 100
+        reason = self.admission.check(now, footprint, gpu, psutil.virtual_memory().available,
+                                      free_cores, running)
+        if reason is None:
+            self.admission.admitted(now, gpu, footprint)
+        return reason
+    
+    def admit_job(self, file_path):
+        """GPU to start a file on if its footprint fits now, else None (the file stays queued)"""
+        reason = None
+        for gpu in self.gpus_by_load():
+            reason = self.try_admit(file_path, gpu, len(self.active_jobs))
+            if reason is None:
+                self.resource_wait = False
+                return gpu
+        
+        self.queue_model.update_path(file_path, status=STATUS_WAITING_RESOURCES)
+        if not self.resource_wait:
+            self.update_status(f"Holding {os.path.basename(file_path)}: not enough {reason}")
+            self.resource_wait = True
+        return None
+    
+    def cpu_pool_encoder(self):
+        """(spec, preset) of the CPU encoder standing in for the selected NVENC encoder, or None"""
+        spec = self.get_encoder_spec()
+        text = self.cpu_jobs_input.text().strip()
+        if not spec.hardware or not text.isdigit() or int(text) == 0:
+            return None
+        equivalent = cpu_equivalent(spec.name, self.preset_input.text() or "p1")
+        if equivalent is None:
+            return None
+        name, preset = equivalent
+        if self.nvenc_caps.compiled_encoders and name not in self.nvenc_caps.compiled_encoders:
+            return None
+        return get_encoder(name), preset
+    
+    def remaining_seconds(self, job):
+        """Predicted seconds until a running job finishes, from its reported speed or the history"""
+        duration = sum(self.file_durations.get(member, 0) for member in job.members)
+        remaining = max(duration - job.media_time, 0)
+        if job.speed > 0:
+            return remaining / job.speed
+        video = video_stream(self.file_probes.get(job.file_path))
+        pixels = (video.get('width') or 1920) * (video.get('height') or 1080)
+        predicted = self.spill.history.predict(BACKEND_GPU, duration, pixels)
+        return max(predicted - job.elapsed(), 0) if predicted is not None else remaining
+    
+    def spill_to_cpu(self):
+        """Start queued files on the CPU encoder pool when that beats waiting for a GPU slot"""
+        cpu = self.cpu_pool_encoder()
+        if cpu is None or self.ladder:
+            return
+        if self.running_job_count() < self.job_limit and self.sessions_available() and not self.thermal_hold():
+            return
+        spec, _ = cpu
+        cpu_limit = int(self.cpu_jobs_input.text())
+        gpu_remaining = [self.remaining_seconds(job) for job in self.active_jobs.values()
+                         if not job.cpu_pool and HOLD_PREEMPT not in job.holds]
+        position = 0
+        for file_path in list(islice(self.pending_files, BATCH_SCAN_DEPTH)):
+            if self.cpu_job_count() >= cpu_limit:
+                break
+            duration = self.file_durations.get(file_path, 0)
+            # Urgent files preempt a GPU job instead
+            if not duration or self.file_priority(file_path) == PRIORITY_URGENT:
+                position += 1
+                continue
+            video = video_stream(self.file_probes.get(file_path))
+            pixels = (video.get('width') or 1920) * (video.get('height') or 1080)
+            decision = self.spill.decide(duration, pixels, position, gpu_remaining, self.cpu_job_count())
+            if not decision.spill:
+                position += 1
+                continue
+            if self.try_admit(file_path, None, len(self.active_jobs), spec):
+                break
+            self.pending_files.remove(file_path)
+            self.update_status(f"Sending {os.path.basename(file_path)} to {spec.label}: {decision.reason}")
+            if not self.start_job(file_path, cpu_pool=True):
+                self.pending_files.appendleft(file_path)
+                break
+            self.spilled_files += 1
+    
+    def record_throughput(self, job):
+        """Feed a finished single-file encode into the GPU/CPU throughput history"""
+        if job.action != ACTION_ENCODE or job.is_ladder or len(job.members) > 1:
+            return
+        if not job.cpu_pool and not self.get_encoder_spec().hardware:
+            return
+        video = video_stream(self.file_probes.get(job.file_path))
+        pixels = (video.get('width') or 0) * (video.get('height') or 0)
+        self.spill.history.record(BACKEND_CPU if job.cpu_pool else BACKEND_GPU,
+                                  self.file_durations.get(job.file_path, 0), pixels, job.elapsed())
+    
+    def get_job_limit(self):
+        """Parse the Jobs field"""
+        text = self.jobs_input.text().strip()
+        return max(1, int(text)) if text.isdigit() else 1
+    
+    def thermal_hold(self):
+        """No new jobs start while any throttle level is active"""
+        return bool(self.thermal) and self.thermal.level > THERMAL_NORMAL
+    
+    def sessions_available(self):
+        """Whether another job fits under the NVENC session limit (a ladder job opens one per rendition)"""
+        if not self.session_limit or not self.active_jobs:
+            return True
+        in_use = sum(len(job.outputs) for job in self.active_jobs.values() if not job.cpu_pool)
+        return in_use + min(len(self.ladder) or 1, self.session_limit) <= self.session_limit
+    
+    def schedule_jobs(self):
+        """Fill free job slots from the queue and finish the batch once nothing is left"""
+        try:
+            if self.conversion_stopped or self.total_files == 0:
                 return
             
-            # Get the duration of the current file first
-            current_file = self.files_to_process[self.current_file_index]
-            if current_file not in self.file_durations:
-                self.get_video_duration(current_file)
-            else:
-                self.start_conversion_process()
+            if not self.queue_paused:
+                self.resume_preempted()
+            while (self.pending_files and not self.queue_paused and not self.space_hold
+                   and not self.thermal_hold() and self.sessions_available()):
+                # With every slot taken only an urgent file gets in, by suspending a lower-priority job
+                victim = None
+                if self.running_job_count() >= self.job_limit:
+                    victim = self.preemption_victim(self.pending_files[0])
+                    if victim is None:
+                        break
+                # Wait (never fail) until the next file's memory and CPU needs fit
+                gpu = self.admit_job(self.pending_files[0])
+                if gpu is None:
+                    break
+                if victim is not None:
+                    if not self.suspend_job(victim, HOLD_PREEMPT):
+                        break
+                    self.update_status(f"Suspending {os.path.basename(victim.file_path)} for urgent "
+                                       f"{os.path.basename(self.pending_files[0])}")
+                file_path = self.pending_files.popleft()
+                if not self.start_job(file_path, gpu):
+                    # Waiting for space; keep its place at the head of the queue
+                    self.pending_files.appendleft(file_path)
+                    break
+            if self.pending_files and not self.queue_paused and not self.space_hold:
+                self.spill_to_cpu()
+            
+            # Warm up the inputs that will run next
+            upcoming = list(islice(self.pending_files, 8))
+            if self.staging:
+                self.staging.prefetch(upcoming)
+            elif self.readahead_check.isChecked():
+                self.readahead.warm(upcoming)
+            
+            # Outputs still copying back from scratch can fail yet and files still being probed
+            # have yet to be queued; the batch ends once both are done
+            if (not self.pending_files and not self.active_jobs and not self.retry_waiting
+                    and not self.committing_outputs and not self.late_probes):
+                self.conversion_complete()
         except Exception as e:
-            error_msg = f"Error in process_next_file: {str(e)}"
+            error_msg = f"Error scheduling jobs: {str(e)}"
             self.update_status(error_msg)
             self.log_error_with_traceback(error_msg)
             self.conversion_complete()
@@ -883,14 +2630,20 @@ class FFastGPU(QMainWindow):
                 
             self.is_stopping = True
             self.conversion_stopped = True
+            self.batch_generation += 1
+            self.late_probes.clear()
         
             # STOP SYSTEM MONITORING HERE
             self.stop_gpu_monitoring()
             if hasattr(self, 'monitor_timer') and self.monitor_timer.isActive():
                 self.monitor_timer.stop()
             
-            self.safe_terminate_process(self.process, "FFmpeg process")
-            self.safe_terminate_process(self.probe_process, "probe process")
+            for job in list(self.active_jobs.values()):
+                self.resume_job(job)
+                for member in job.members:
+                    self.queue_model.update_path(member, status=STATUS_STOPPED)
+                self.safe_terminate_process(job.process, f"FFmpeg process for {os.path.basename(job.file_path)}")
+            self.active_jobs = {}
             
             stop_msg = "Conversion stopped by user"
             self.update_status(stop_msg)
@@ -911,6 +2664,8 @@ class FFastGPU(QMainWindow):
     # In the reset_after_conversion method, fix the condition check:
     def reset_after_conversion(self):
         try:
+            self.shutdown_staging()
+            
             # Stop timers
             if hasattr(self, 'timer') and self.timer.isActive():
                 self.timer.stop()
@@ -926,16 +2681,26 @@ class FFastGPU(QMainWindow):
                 self.convert_btn.setEnabled(True)
             if hasattr(self, 'stop_btn'):
                 self.stop_btn.setEnabled(False)
+            if hasattr(self, 'pause_btn'):
+                self.pause_btn.setEnabled(False)
+                self.pause_btn.setText("Pause Queue")
+            self.queue_paused = False
+            if self.caps_refresh_pending:
+                self.caps_refresh_pending = False
+                self.detect_capabilities(refresh=True)
             
             # Reset file processing state
             if hasattr(self, 'files_to_process'):
                 self.files_to_process = []
-            if hasattr(self, 'current_file_index'):
-                self.current_file_index = -1
+            self.pending_files.clear()
+            self.retry_waiting.clear()
+            self.retry_state = {}
             if hasattr(self, 'total_files'):
                 self.total_files = 0
             if hasattr(self, 'file_durations'):
                 self.file_durations = {}
+            if hasattr(self, 'file_probes'):
+                self.file_probes = {}
             
             # Only show completion message if conversion wasn't stopped
             if not hasattr(self, 'conversion_stopped') or not self.conversion_stopped:
@@ -965,6 +2730,11 @@ class FFastGPU(QMainWindow):
     
     def conversion_complete(self):
         try:
+            # Results still on their way from background threads belong to this batch, not the next
+            self.batch_generation += 1
+            self.late_probes.clear()
+            self.shutdown_staging()
+            
             # STOP SYSTEM MONITORING HERE
             self.stop_gpu_monitoring()
             if hasattr(self, 'monitor_timer') and self.monitor_timer.isActive():
@@ -985,31 +2755,72 @@ class FFastGPU(QMainWindow):
                 self.convert_btn.setEnabled(True)
             if hasattr(self, 'stop_btn'):
                 self.stop_btn.setEnabled(False)
+            if hasattr(self, 'pause_btn'):
+                self.pause_btn.setEnabled(False)
+                self.pause_btn.setText("Pause Queue")
+            self.queue_paused = False
+            if self.caps_refresh_pending:
+                self.caps_refresh_pending = False
+                self.detect_capabilities(refresh=True)
             
             # Show completion message only if not stopped
             if not hasattr(self, 'conversion_stopped') or not self.conversion_stopped:
-                self.update_status("Conversion completed successfully")
+                self.show_failure_summary()
             
             # Reset file processing state
             if hasattr(self, 'files_to_process'):
                 self.files_to_process = []
-            if hasattr(self, 'current_file_index'):
-                self.current_file_index = -1
+            self.pending_files.clear()
+            self.retry_waiting.clear()
+            self.retry_state = {}
             if hasattr(self, 'total_files'):
                 self.total_files = 0
             if hasattr(self, 'file_durations'):
                 self.file_durations = {}
+            if hasattr(self, 'file_probes'):
+                self.file_probes = {}
             
         except Exception as e:
             error_msg = f"Error in conversion_complete: {str(e)}"
             self.update_status(error_msg)
             self.log_error_with_traceback(error_msg)
     
+    def show_failure_summary(self):
+        """Report the batch result, listing every file that failed and why"""
+        if self.concurrency:
+            self.update_status(self.concurrency.summary())
+        if self.watchdog and self.watchdog.events:
+            self.update_status(f"{len(self.watchdog.events)} stalled run(s) killed by the watchdog")
+        if self.decode_balance and self.decode_balance.changes:
+            peak = max(change.new_target for change in self.decode_balance.changes)
+            self.update_status(f"Decode balancing moved up to {peak} concurrent job(s) from NVDEC to the CPU")
+        if self.spilled_files:
+            self.update_status(f"{self.spilled_files} job(s) sent to the CPU encoder while the GPU slots were busy")
+        if self.thermal and self.thermal.throttled_total() > 0:
+            parts = ", ".join(f"{THERMAL_LEVEL_NAMES[level]} {format_duration(seconds)}"
+                              for level, seconds in self.thermal.throttled_seconds.items() if seconds)
+            self.update_status(f"Thermal throttling: {format_duration(self.thermal.throttled_total())} ({parts})")
+        summary = self.failure_log.summary_lines(os.path.basename)
+        if not self.failure_log.failures:
+            self.update_status("Conversion completed successfully")
+            for line in summary:
+                self.update_status(line)
+            return
+        
+        self.update_status("Conversion completed with failures")
+        for line in summary:
+            self.update_status(line)
+        self.gui_logger.warning("Failure summary:\n" + "\n".join(summary))
+        QMessageBox.warning(self, "Conversion Finished With Failures", "\n".join(summary))
+    
     def start_conversion(self):
         try:
             if not self.files:
                 self.update_status("No files selected for conversion")
                 return
+            if self.caps_probing:
+                self.update_status("Still detecting encoder capabilities, start again in a moment")
+                return
         
             # START SYSTEM MONITORING HERE
             self.start_gpu_monitoring()
@@ -1031,11 +2842,121 @@ class FFastGPU(QMainWindow):
                     self.log_error_with_traceback(error_msg)
                     return
             
-            # Reset conversion state
-            self.files_to_process = self.files.copy()
-            self.total_files = len(self.files_to_process)
-            self.current_file_index = 0
+            self.validate_encoder_settings()
+            
+            try:
+                self.ladder = parse_ladder(self.ladder_input.text(), self.format_combo.currentText())
+            except ValueError as e:
+                self.update_status(f"Invalid ladder: {e}")
+                return
+            if self.ladder:
+                self.update_status(f"Ladder mode: {len(self.ladder)} renditions per input "
+                                   f"({', '.join(rendition_label(r) for r in self.ladder)})")
+            
+            # Discover GPU locality once per batch so each job can be pinned
+            if self.numa_pin_check.isChecked():
+                self.gpu_topology.discover(refresh=True)
+            
+            self.queue_model.reset_status(STATUS_QUEUED)
             self.conversion_stopped = False
+            self.batch_generation += 1
+            
+            # Update buttons
+            self.convert_btn.setEnabled(False)
+            self.stop_btn.setEnabled(True)
+            self.pause_btn.setEnabled(True)
+            
+            # Hash inputs in the background; begin_batch runs when it is done
+            if self.dedup_check.isChecked() and len(self.files) > 1:
+                self.update_status("Checking inputs for duplicates...")
+                dedup_thread = threading.Thread(target=self.find_duplicates_worker,
+                                                args=(self.batch_generation, self.files.copy()))
+                dedup_thread.daemon = True
+                dedup_thread.start()
+            else:
+                self.begin_batch(self.batch_generation, {})
+        except Exception as e:
+            error_msg = f"Error starting conversion: {str(e)}"
+            self.update_status(error_msg)
+            self.log_error_with_traceback(error_msg)
+    
+    def find_duplicates_worker(self, generation, files):
+        """Background thread: group identical inputs and hand the result to the GUI thread"""
+        try:
+            duplicates = find_duplicates(files)
+        except Exception as e:
+            self.gui_logger.error(f"Duplicate detection failed: {e}\n{traceback.format_exc()}")
+            duplicates = {}
+        self.duplicates_found.emit(generation, duplicates)
+    
+    def begin_batch(self, generation, duplicates):
+        """Queue every unique input and start converting"""
+        try:
+            # Ignore results for a batch that was stopped in the meantime
+            if generation != self.batch_generation:
+                return
+            
+            # Duplicates ride along with their canonical input's encode
+            self.duplicate_inputs = duplicates
+            duplicate_files = {d for group in duplicates.values() for d in group}
+            for duplicate in duplicate_files:
+                self.queue_model.update_path(duplicate, status=STATUS_DUPLICATE)
+            if duplicate_files:
+                self.update_status(f"Found {len(duplicate_files)} duplicate inputs - each will reuse one encode")
+            
+            # Reset conversion state
+            self.files_to_process = [f for f in self.files if f not in duplicate_files]
+            self.staging = self.create_staging_pipeline()
+            self.readahead.reset()
+            self.total_files = len(self.files_to_process) + len(duplicate_files)
+            self.pending_files = deque(self.files_to_process)
+            self.sort_pending()
+            self.retry_waiting.clear()
+            self.retry_state = {}
+            self.finished_count = 0
+            self.job_limit = self.get_job_limit()
+            session_limit = self.nvenc_caps.session_limit(self.get_gpu_indices())
+            self.session_limit = session_limit if self.get_encoder_spec().hardware else None
+            if self.session_limit and self.job_limit > self.session_limit:
+                self.update_status(f"Limiting concurrent jobs to {self.session_limit} (NVENC session limit)")
+                self.job_limit = self.session_limit
+            max_temp = self.max_temp_input.text().strip()
+            max_power = self.max_power_input.text().strip()
+            self.thermal = None
+            self.thermal_lowered_to = None
+            if max_temp.isdigit() or max_power.isdigit():
+                self.thermal = ThermalPolicy.from_limits(int(max_temp) if max_temp.isdigit() else None,
+                                                         int(max_power) if max_power.isdigit() else None)
+            stall_timeout = self.stall_timeout_input.text().strip()
+            self.watchdog = None
+            if stall_timeout.isdigit() and int(stall_timeout) > 0:
+                try:
+                    min_speed = float(self.min_speed_input.text()) if self.min_speed_input.text().strip() else None
+                except ValueError:
+                    min_speed = None
+                self.watchdog = StallWatchdog(int(stall_timeout), min_speed)
+            self.decode_balance = None
+            if (self.balance_decode_check.isChecked() and self.get_encoder_spec().hardware
+                    and (self.decoder_input.text() or "cuda") == 'cuda'):
+                self.decode_balance = DecodeBalancer()
+            self.balanced_decodes = set()
+            self.concurrency = None
+            if self.auto_jobs_check.isChecked():
+                self.concurrency = ConcurrencyController(start=self.job_limit,
+                                                         max_jobs=self.session_limit or MAX_AUTO_JOBS)
+            self.split_ladders = set()
+            self.unbatched = set()
+            self.routes_logged = set()
+            self.spilled_files = 0
+            self.failed_outputs = set()
+            self.committing_outputs = set()
+            self.late_probes = set()
+            self.cpu_fallback = set()
+            self.space_hold = False
+            self.resource_wait = False
+            self.admission.clear()
+            self.failure_log.clear()
+            self.disk_reservations.clear()
             
             # Show progress bars
             self.overall_progress.setVisible(True)
@@ -1043,17 +2964,80 @@ class FFastGPU(QMainWindow):
             self.overall_progress.setValue(0)
             self.current_progress.setValue(0)
             
-            # Update buttons
-            self.convert_btn.setEnabled(False)
-            self.stop_btn.setEnabled(True)
+            # Probe everything up front so the batch's output size can be estimated
+            unprobed = [f for f in self.files_to_process if f not in self.file_probes]
+            for file_path in unprobed:
+                self.queue_model.update_path(file_path, status=STATUS_PROBING)
+            self.update_status(f"Pre-flight: probing {len(unprobed)} files...")
+            preflight_thread = threading.Thread(target=self.preflight_worker,
+                                                args=(self.batch_generation, unprobed))
+            preflight_thread.daemon = True
+            preflight_thread.start()
+        except Exception as e:
+            error_msg = f"Error starting batch: {str(e)}"
+            self.update_status(error_msg)
+            self.log_error_with_traceback(error_msg)
+            self.conversion_complete()
+    
+    def preflight_worker(self, generation, files):
+        """Background thread: probe files in parallel and hand the results to the GUI thread"""
+        try:
+            probes = probe_files(files)
+        except Exception as e:
+            self.gui_logger.error(f"Pre-flight probing failed: {e}\n{traceback.format_exc()}")
+            probes = {}
+        self.fingerprint_worker(files)
+        self.preflight_done.emit(generation, probes)
+    
+    def fingerprint_worker(self, files):
+        """Background thread: read the content fingerprints output cache keys are built from"""
+        try:
+            self.output_cache.compute_fingerprints(files)
+        except Exception as e:
+            self.gui_logger.error(f"Fingerprinting inputs failed: {e}\n{traceback.format_exc()}")
+    
+    def on_preflight_done(self, generation, probes):
+        """Estimate the batch's output size, compare it with free space and start converting"""
+        try:
+            if generation != self.batch_generation:
+                return
+            
+            for file_path, data in probes.items():
+                try:
+                    self.apply_probe(file_path, data)
+                except (KeyError, ValueError, TypeError):
+                    continue
+            for file_path in self.files_to_process:
+                self.queue_model.update_path(file_path, status=STATUS_QUEUED)
+            
+            # Estimate every output and total it per destination volume
+            output_folder = self.output_input.text()
+            self.output_estimates = {f: self.estimate_output_size(f) for f in self.files_to_process}
+            total = sum(self.output_estimates.values())
+            free = max(0, self.disk_reservations.free_bytes(output_folder))
+            self.update_status(f"Estimated output size: {format_gb(total)} ({format_gb(free)} free on destination)")
+            
+            for folder, needed, available in check_batch_space([(output_folder, total)]):
+                warning = (f"The batch needs about {format_gb(needed)} in {folder} but only "
+                           f"{format_gb(max(0, available))} is free.\n\n"
+                           f"Start anyway? Jobs will wait when space runs out.")
+                self.gui_logger.warning(warning)
+                answer = QMessageBox.question(self, "Not Enough Disk Space", warning,
+                                              QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+                if answer != QMessageBox.Yes:
+                    self.stop_conversion()
+                    return
             
             # Start processing
-            self.update_status(f"Starting conversion of {self.total_files} files...")
-            self.process_next_file()
+            self.update_status(f"Starting conversion of {self.total_files} files, {self.job_limit} at a time...")
+            self.start_time = QTime.currentTime()
+            self.timer.start(1000)  # Update every second
+            self.schedule_jobs()
         except Exception as e:
-            error_msg = f"Error starting conversion: {str(e)}"
+            error_msg = f"Error in pre-flight check: {str(e)}"
             self.update_status(error_msg)
             self.log_error_with_traceback(error_msg)
+            self.conversion_complete()
     
     def is_safe_path(self, path):
         """Check if the path contains any potentially dangerous characters"""
@@ -1135,15 +3119,19 @@ class FFastGPU(QMainWindow):
         """Handle application close event"""
         try:
             # Stop any running processes
-            if hasattr(self, 'process') and self.process and self.process.state() == QProcess.Running:
-                self.safe_terminate_process(self.process, "FFmpeg process")
-            
-            if hasattr(self, 'probe_process') and self.probe_process and self.probe_process.state() == QProcess.Running:
-                self.safe_terminate_process(self.probe_process, "probe process")
+            self.conversion_stopped = True
+            for job in list(self.active_jobs.values()):
+                self.resume_job(job)
+                self.safe_terminate_process(job.process, "FFmpeg process")
             
             # Stop GPU monitoring if it's running
             self.stop_gpu_monitoring()
             
+            # Abandon any folder scan still in progress
+            self.media_scanner.cancel()
+            self.shutdown_staging()
+            self.readahead.shutdown()
+            
             # Stop timers
             if hasattr(self, 'timer') and self.timer.isActive():
                 self.timer.stop()
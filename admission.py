@@ -0,0 +1,110 @@
+# admission.py - Only start a job when its estimated VRAM, RAM and CPU footprint fits
+from collections import namedtuple
+from disk_space import format_gb
+
+Footprint = namedtuple('Footprint', 'vram ram cpu')  # bytes, bytes, cores
+
+# Surfaces NVDEC keeps for a CUDA-decoded input (decoder pool plus filter/encoder hand-off)
+DECODE_SURFACES = 20
+# Reference and in-flight frames an encoder holds on top of lookahead and B-frames
+ENCODER_EXTRA_FRAMES = 6
+CUDA_CONTEXT_BYTES = 300 * 1024 * 1024
+PROCESS_RAM_BYTES = 200 * 1024 * 1024
+# Cores for one 1080p stream decoded / encoded in software; demux, audio and muxing always take some
+SOFTWARE_DECODE_CORES = 1.0
+SOFTWARE_ENCODE_CORES = 4.0
+BASE_CORES = 0.25
+PIXELS_1080P = 1920 * 1080
+
+VRAM_HEADROOM = 512 * 1024 * 1024
+RAM_HEADROOM = 1024 * 1024 * 1024
+# Seconds a started job's footprint is still counted on top of the measured usage
+ALLOCATION_GRACE = 20
+
+
+def estimate_footprint(width, height, bit_depth=8, lookahead=32, bframes=4, outputs=1,
+                       gpu_decode=True, gpu_encode=True, decode_surfaces=DECODE_SURFACES):
+    """Rough memory and CPU needs of one ffmpeg job from the source size and encoder settings"""
+    frame = width * height * 1.5 * (2 if bit_depth > 8 else 1)  # 4:2:0, 16-bit samples above 8 bits
+    decode = decode_surfaces * frame
+    encode = (lookahead + bframes + ENCODER_EXTRA_FRAMES) * frame * outputs
+    scale = width * height / PIXELS_1080P
+
+    vram, ram, cpu = 0, PROCESS_RAM_BYTES, BASE_CORES
+    if gpu_decode or gpu_encode:
+        vram += CUDA_CONTEXT_BYTES
+    if gpu_decode:
+        vram += decode
+    else:
+        ram += decode
+        cpu += SOFTWARE_DECODE_CORES * scale
+    if gpu_encode:
+        vram += encode
+    else:
+        ram += encode
+        cpu += SOFTWARE_ENCODE_CORES * scale * outputs
+    return Footprint(int(vram), int(ram), cpu)
+
+
+def parse_gpu_memory(text):
+    """{gpu: (total, used) bytes} from an nvidia-smi --query-gpu csv whose first field is index
+    and last two are memory.total,memory.used (noheader, nounits, MiB)"""
+    memory = {}
+    for line in text.strip().splitlines():
+        parts = [p.strip() for p in line.split(',')]
+        if len(parts) < 3 or not parts[0].isdigit():
+            continue
+        try:
+            memory[int(parts[0])] = (float(parts[-2]) * 1024 * 1024, float(parts[-1]) * 1024 * 1024)
+        except ValueError:
+            continue
+    return memory
+
+
+class AdmissionController:
+    """Decide whether a job's footprint fits in what is free right now.
+
+    VRAM comes from the last nvidia-smi sample (unknown GPUs are not limited),
+    RAM and CPU are passed in by the caller. Jobs admitted in the last
+    ALLOCATION_GRACE seconds are counted on top of the measurements, since a
+    new ffmpeg takes a while to allocate. With nothing running every job is
+    admitted, so an oversized job runs alone instead of waiting forever.
+    """
+
+    def __init__(self, vram_headroom=VRAM_HEADROOM, ram_headroom=RAM_HEADROOM, grace=ALLOCATION_GRACE):
+        self.vram_headroom = vram_headroom
+        self.ram_headroom = ram_headroom
+        self.grace = grace
+        self.gpu_memory = {}
+        self.recent = []  # (time admitted, gpu, footprint)
+
+    def update_gpu_memory(self, memory):
+        self.gpu_memory = memory
+
+    def _recent(self, now):
+        self.recent = [entry for entry in self.recent if now - entry[0] < self.grace]
+        return self.recent
+
+    def check(self, now, footprint, gpu, available_ram, free_cores, running):
+        """None if the job fits, otherwise the reason it has to wait"""
+        if not running:
+            return None
+        recent = self._recent(now)
+        if gpu is not None and footprint.vram and gpu in self.gpu_memory:
+            total, used = self.gpu_memory[gpu]
+            free = total - used - sum(f.vram for _, g, f in recent if g == gpu)
+            if footprint.vram > free - self.vram_headroom:
+                return f"GPU {gpu} memory (needs ~{format_gb(footprint.vram)}, {format_gb(max(0, free))} free)"
+        free_ram = available_ram - sum(f.ram for _, _, f in recent)
+        if footprint.ram > free_ram - self.ram_headroom:
+            return f"host memory (needs ~{format_gb(footprint.ram)}, {format_gb(max(0, free_ram))} available)"
+        cores = free_cores - sum(f.cpu for _, _, f in recent)
+        if footprint.cpu > max(cores, 0) + BASE_CORES:
+            return f"CPU (needs ~{footprint.cpu:.1f} cores, {max(cores, 0):.1f} idle)"
+        return None
+
+    def admitted(self, now, gpu, footprint):
+        self.recent.append((now, gpu, footprint))
+
+    def clear(self):
+        self.recent = []
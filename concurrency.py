@@ -0,0 +1,113 @@
+# concurrency.py - Adapt the number of concurrent jobs to the measured encode throughput
+from collections import namedtuple, deque
+
+Decision = namedtuple('Decision', 'time old_limit new_limit reason throughput enc_util dec_util')
+
+# An engine this busy has no headroom for another job
+SATURATED_UTIL = 95
+
+
+def _mean(values):
+    return sum(values) / len(values) if values else 0.0
+
+
+class ConcurrencyController:
+    """Additive-increase/multiplicative-decrease controller for the job limit.
+
+    observe() takes one sample per tick: the time, NVENC/NVDEC utilization and
+    the speed (x realtime) of each running job. Once window samples have been
+    taken with the limit filled, the mean aggregate speed at that level is
+    compared with the level below:
+
+    - more than gain better: add a job (unless an engine is saturated or the
+      last back-off is still being held)
+    - within gain: plateau, step back one job and hold
+    - worse, or per-job speed below collapse x the level below: cut the limit
+      by the backoff factor and hold
+
+    max_jobs is a hard cap (NVENC sessions, memory) that cap() can lower.
+    Nothing here reads the clock or the GPU, so synthetic traces can be fed in.
+    """
+
+    def __init__(self, start=1, min_jobs=1, max_jobs=8, window=15, gain=0.05, collapse=0.5,
+                 backoff=0.75, hold=120):
+        self.min_jobs = max(1, min_jobs)
+        self.max_jobs = max(self.min_jobs, max_jobs)
+        self.limit = min(max(start, self.min_jobs), self.max_jobs)
+        self.window = window
+        self.gain = gain
+        self.collapse = collapse
+        self.backoff = backoff
+        self.hold = hold
+        self.hold_until = None
+        self.samples = []
+        self.levels = {}  # job limit -> (mean aggregate speed, mean per-job speed)
+        self.decisions = deque(maxlen=200)
+
+    @property
+    def last_decision(self):
+        return self.decisions[-1] if self.decisions else None
+
+    def _change(self, now, new_limit, reason, throughput=0.0, enc_util=0.0, dec_util=0.0, hold=False):
+        decision = Decision(now, self.limit, new_limit, reason, throughput, enc_util, dec_util)
+        self.decisions.append(decision)
+        self.limit = new_limit
+        self.samples = []
+        if hold:
+            self.hold_until = now + self.hold
+        return decision
+
+    def cap(self, now, max_jobs, reason):
+        """Lower the hard cap; returns a Decision if the limit had to drop"""
+        self.max_jobs = max(self.min_jobs, max_jobs)
+        if self.limit > self.max_jobs:
+            return self._change(now, self.max_jobs, reason, hold=True)
+        return None
+
+    def observe(self, now, enc_util, dec_util, speeds):
+        """Feed one sample; returns a Decision when the limit changes, else None"""
+        speeds = [s for s in speeds if s > 0]
+        if len(speeds) < self.limit:
+            # The level is not filled (jobs starting or finishing, queue draining); it says nothing
+            return None
+        self.samples.append((sum(speeds), _mean(speeds), enc_util, dec_util))
+        if len(self.samples) < self.window:
+            return None
+
+        throughput = _mean([s[0] for s in self.samples])
+        per_job = _mean([s[1] for s in self.samples])
+        enc = _mean([s[2] for s in self.samples])
+        dec = _mean([s[3] for s in self.samples])
+        self.samples = []
+        self.levels[self.limit] = (throughput, per_job)
+        below = self.levels.get(self.limit - 1)
+        stats = (throughput, enc, dec)
+
+        if below and self.limit > self.min_jobs:
+            below_throughput, below_per_job = below
+            if per_job < below_per_job * self.collapse or throughput < below_throughput * (1 - self.gain):
+                new_limit = max(self.min_jobs, min(self.limit - 1, int(self.limit * self.backoff)))
+                if per_job < below_per_job * self.collapse:
+                    reason = f"per-job speed collapsed ({below_per_job:.2f}x -> {per_job:.2f}x)"
+                else:
+                    reason = f"throughput fell ({below_throughput:.2f}x -> {throughput:.2f}x)"
+                return self._change(now, new_limit, reason, *stats, hold=True)
+            if throughput < below_throughput * (1 + self.gain):
+                reason = f"throughput plateaued ({below_throughput:.2f}x -> {throughput:.2f}x)"
+                return self._change(now, self.limit - 1, reason, *stats, hold=True)
+
+        if self.limit >= self.max_jobs or max(enc, dec) >= SATURATED_UTIL:
+            return None
+        if self.hold_until is not None and now < self.hold_until:
+            return None
+        return self._change(now, self.limit + 1, f"probing ({throughput:.2f}x at {self.limit} jobs, "
+                                                 f"ENC {enc:.0f}%, DEC {dec:.0f}%)", *stats)
+
+    def summary(self):
+        if not self.decisions:
+            return f"Concurrent jobs held at {self.limit}"
+        ups = sum(1 for d in self.decisions if d.new_limit > d.old_limit)
+        downs = len(self.decisions) - ups
+        best = max(self.levels.items(), key=lambda item: item[1][0], default=None)
+        best_text = f", best {best[1][0]:.2f}x at {best[0]} jobs" if best else ""
+        return f"Concurrent jobs ended at {self.limit} ({ups} increases, {downs} decreases{best_text})"
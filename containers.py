@@ -0,0 +1,506 @@
+# containers.py - Read MP4/MOV and Matroska headers in-process through mmap, without ffprobe
+import mmap
+import struct
+import sys
+from array import array
+from contextlib import contextmanager
+from fractions import Fraction
+
+# Sample entry / CodecID -> ffprobe codec_name; anything else is left to ffprobe
+MP4_VIDEO_CODECS = {'avc1': 'h264', 'avc3': 'h264', 'hvc1': 'hevc', 'hev1': 'hevc', 'av01': 'av1', 'vp09': 'vp9'}
+MP4_AUDIO_CODECS = {'mp4a': 'aac', 'ac-3': 'ac3', 'ec-3': 'eac3', 'Opus': 'opus', 'fLaC': 'flac',
+                    'alac': 'alac', '.mp3': 'mp3'}
+MKV_VIDEO_CODECS = {'V_MPEG4/ISO/AVC': 'h264', 'V_MPEGH/ISO/HEVC': 'hevc', 'V_AV1': 'av1',
+                    'V_VP9': 'vp9', 'V_VP8': 'vp8'}
+MKV_AUDIO_CODECS = {'A_AAC': 'aac', 'A_AC3': 'ac3', 'A_EAC3': 'eac3', 'A_OPUS': 'opus', 'A_VORBIS': 'vorbis',
+                    'A_FLAC': 'flac', 'A_DTS': 'dts', 'A_MPEG/L3': 'mp3', 'A_TRUEHD': 'truehd'}
+
+H264_PROFILES = {66: 'Baseline', 77: 'Main', 88: 'Extended', 100: 'High', 110: 'High 10',
+                 122: 'High 4:2:2', 244: 'High 4:4:4 Predictive', 44: 'CAVLC 4:4:4'}
+HEVC_PROFILES = {1: 'Main', 2: 'Main 10', 3: 'Main Still Picture', 4: 'Rext'}
+AV1_PROFILES = {0: 'Main', 1: 'High', 2: 'Professional'}
+
+# format_name ffprobe reports for each family
+MP4_FORMAT_NAME = 'mov,mp4,m4a,3gp,3g2,mj2'
+MKV_FORMAT_NAME = 'matroska,webm'
+
+# Matroska element IDs
+EBML_HEADER = 0x1A45DFA3
+SEGMENT = 0x18538067
+SEEK_HEAD, SEEK, SEEK_ID, SEEK_POSITION = 0x114D9B74, 0x4DBB, 0x53AB, 0x53AC
+INFO, TIMESTAMP_SCALE, DURATION = 0x1549A966, 0x2AD7B1, 0x4489
+TRACKS, TRACK_ENTRY = 0x1654AE6B, 0xAE
+TRACK_NUMBER, TRACK_TYPE, CODEC_ID, CODEC_PRIVATE, DEFAULT_DURATION = 0xD7, 0x83, 0x86, 0x63A2, 0x23E383
+CONTENT_ENCODINGS = 0x6D80
+VIDEO, PIXEL_WIDTH, PIXEL_HEIGHT = 0xE0, 0xB0, 0xBA
+COLOUR, BITS_PER_CHANNEL, CHROMA_SUBSAMPLING_HORZ, CHROMA_SUBSAMPLING_VERT = 0x55B0, 0x55B2, 0x55B3, 0x55B4
+CUES, CLUSTER = 0x1C53BB6B, 0x1F43B675
+
+
+class ContainerError(ValueError):
+    """The file is not a container this reader handles, or uses a feature it leaves to ffprobe"""
+
+
+@contextmanager
+def mapped(path):
+    """Read-only mmap of a whole file"""
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            yield buf
+
+
+def pix_fmt(chroma, depth, mono=False):
+    """ffmpeg pixel format name for a chroma layout ('420'/'422'/'444') and bit depth"""
+    if mono:
+        return 'gray' if depth <= 8 else f'gray{depth}le'
+    return f'yuv{chroma}p' if depth <= 8 else f'yuv{chroma}p{depth}le'
+
+
+def frame_rate(frames_per_second):
+    """ffprobe style 'num/den' for a frame rate, snapping to the NTSC /1001 rates"""
+    if not frames_per_second:
+        return '0/0'
+    rate = Fraction(frames_per_second).limit_denominator(1001)
+    return f"{rate.numerator}/{rate.denominator}"
+
+
+# --- codec configuration records (shared by MP4 sample entries and Matroska CodecPrivate)
+
+def parse_avcc(data):
+    """(profile, chroma, bit depth) from an AVCDecoderConfigurationRecord"""
+    if len(data) < 7:
+        raise ContainerError("short avcC")
+    profile_idc, constraints = data[1], data[2]
+    pos = 6
+    for count_mask in (0x1F, 0xFF):
+        count = data[pos - 1] & count_mask
+        for _ in range(count):
+            pos += 2 + struct.unpack_from('>H', data, pos)[0]
+        pos += 1
+    profile = H264_PROFILES.get(profile_idc, str(profile_idc))
+    if profile_idc == 66 and constraints & 0x40:
+        profile = 'Constrained Baseline'
+    if profile_idc in (100, 110, 122, 244, 44):
+        # High profiles carry chroma format and bit depth after the parameter sets
+        if len(data) >= pos + 2:
+            chroma = {0: '400', 1: '420', 2: '422', 3: '444'}[data[pos - 1] & 3]
+            return profile, chroma, (data[pos] & 7) + 8
+        if profile_idc != 100:
+            raise ContainerError("avcC without chroma/bit depth")
+    return profile, '420', 8
+
+
+def parse_hvcc(data):
+    """(profile, chroma, bit depth) from an HEVCDecoderConfigurationRecord"""
+    if len(data) < 19:
+        raise ContainerError("short hvcC")
+    chroma = {0: '400', 1: '420', 2: '422', 3: '444'}[data[16] & 3]
+    return HEVC_PROFILES.get(data[1] & 0x1F, str(data[1] & 0x1F)), chroma, (data[17] & 7) + 8
+
+
+def parse_av1c(data):
+    """(profile, chroma, bit depth) from an AV1CodecConfigurationRecord"""
+    if len(data) < 4:
+        raise ContainerError("short av1C")
+    flags = data[2]
+    depth = (12 if flags & 0x20 else 10) if flags & 0x40 else 8
+    if flags & 0x10:
+        chroma = '400'
+    else:
+        chroma = {(1, 1): '420', (1, 0): '422', (0, 0): '444'}.get(((flags >> 3) & 1, (flags >> 2) & 1), '420')
+    return AV1_PROFILES.get(data[1] >> 5, str(data[1] >> 5)), chroma, depth
+
+
+def parse_vpcc(data):
+    """(profile, chroma, bit depth) from a VPCodecConfigurationRecord (vpcC, after its version/flags)"""
+    if len(data) < 3:
+        raise ContainerError("short vpcC")
+    chroma = {0: '420', 1: '420', 2: '422', 3: '444'}.get((data[2] >> 1) & 7, '420')
+    return f"Profile {data[0]}", chroma, data[2] >> 4
+
+
+def video_fields(codec, config, fallback=None):
+    """profile and pix_fmt stream fields for a codec from its configuration record"""
+    parsers = {'h264': parse_avcc, 'hevc': parse_hvcc, 'av1': parse_av1c, 'vp9': parse_vpcc}
+    if codec in parsers and config:
+        profile, chroma, depth = parsers[codec](config)
+    elif fallback:
+        profile, chroma, depth = fallback
+    elif codec == 'vp8':
+        profile, chroma, depth = None, '420', 8
+    else:
+        raise ContainerError(f"no configuration record for {codec}")
+    fields = {'pix_fmt': pix_fmt(chroma, depth, mono=chroma == '400'), 'bits_per_raw_sample': str(depth)}
+    if profile:
+        fields['profile'] = profile
+    return fields
+
+
+# --- MP4 / MOV
+
+def iter_boxes(buf, start, end):
+    """(type, payload start, box end) for each ISO BMFF box between start and end"""
+    pos = start
+    while pos + 8 <= end:
+        size, kind = struct.unpack_from('>I4s', buf, pos)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from('>Q', buf, pos + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header:
+            raise ContainerError(f"bad size for box {kind!r}")
+        yield kind.decode('latin-1'), pos + header, min(pos + size, end)
+        pos += size
+
+
+def find_box(buf, start, end, *path):
+    """(payload start, end) of the first box along a path of box types, or None"""
+    for kind in path:
+        for box, payload, box_end in iter_boxes(buf, start, end):
+            if box == kind:
+                start, end = payload, box_end
+                break
+        else:
+            return None
+    return start, end
+
+
+def _full_box_times(buf, pos):
+    """(timescale, duration) from an mvhd/mdhd payload"""
+    if buf[pos] == 1:
+        return struct.unpack_from('>IQ', buf, pos + 20)
+    return struct.unpack_from('>II', buf, pos + 12)
+
+
+def mp4_tracks(buf):
+    """Tracks of an MP4/MOV file: dicts with handler, fourcc, timescale, duration, sample entry, stbl and trak ranges"""
+    moov = find_box(buf, 0, len(buf), 'moov')
+    if moov is None:
+        raise ContainerError("no moov box")
+    tracks = []
+    for kind, start, end in iter_boxes(buf, *moov):
+        if kind != 'trak':
+            continue
+        mdia = find_box(buf, start, end, 'mdia')
+        hdlr = mdia and find_box(buf, *mdia, 'hdlr')
+        mdhd = mdia and find_box(buf, *mdia, 'mdhd')
+        stbl = mdia and find_box(buf, *mdia, 'minf', 'stbl')
+        stsd = stbl and find_box(buf, *stbl, 'stsd')
+        if not (hdlr and mdhd and stsd):
+            continue
+        timescale, duration = _full_box_times(buf, mdhd[0])
+        entry = next(iter_boxes(buf, stsd[0] + 8, stsd[1]), None)
+        tracks.append({
+            'handler': bytes(buf[hdlr[0] + 8:hdlr[0] + 12]).decode('latin-1'),
+            'fourcc': entry[0] if entry else None,
+            'entry': entry,
+            'timescale': timescale,
+            'duration': duration,
+            'stbl': stbl,
+            'trak': (start, end),
+        })
+    return tracks
+
+
+def uint32s(buf, start, count):
+    """count big-endian 32-bit unsigned integers starting at start"""
+    values = array('I', buf[start:start + count * 4])
+    if sys.byteorder == 'little':
+        values.byteswap()
+    return values
+
+
+def mp4_sample_count(buf, stbl):
+    """Number of samples from the stts table"""
+    stts = find_box(buf, *stbl, 'stts')
+    if stts is None:
+        return 0
+    count = struct.unpack_from('>I', buf, stts[0] + 4)[0]
+    return sum(uint32s(buf, stts[0] + 8, count * 2)[0::2])
+
+
+def mp4_sample_bytes(buf, stbl):
+    """Total size of a track's samples from the stsz table"""
+    stsz = find_box(buf, *stbl, 'stsz')
+    if stsz is None:
+        return 0
+    sample_size, count = struct.unpack_from('>II', buf, stsz[0] + 4)
+    if sample_size:
+        return sample_size * count
+    return sum(uint32s(buf, stsz[0] + 12, count))
+
+
+def _mp4_video_stream(buf, track, codec, seconds):
+    _, start, end = track['entry']
+    width, height = struct.unpack_from('>HH', buf, start + 24)
+    config = None
+    children = {kind: (s, e) for kind, s, e in iter_boxes(buf, start + 78, end)}
+    for kind in ('avcC', 'hvcC', 'av1C'):
+        if kind in children:
+            config = bytes(buf[children[kind][0]:children[kind][1]])
+    if 'vpcC' in children:
+        config = bytes(buf[children['vpcC'][0] + 4:children['vpcC'][1]])
+    frames = mp4_sample_count(buf, track['stbl'])
+    stream = {'codec_type': 'video', 'codec_name': codec, 'width': width, 'height': height,
+              'avg_frame_rate': frame_rate(frames / seconds if seconds else 0),
+              'nb_frames': str(frames), 'disposition': {'attached_pic': 0}}
+    stream['r_frame_rate'] = stream['avg_frame_rate']
+    stream.update(video_fields(codec, config))
+    return stream
+
+
+def read_mp4(buf, size):
+    mvhd = find_box(buf, *find_box(buf, 0, len(buf), 'moov'), 'mvhd')
+    if mvhd is None:
+        raise ContainerError("no mvhd box")
+    timescale, duration = _full_box_times(buf, mvhd[0])
+    duration_us = duration * 1000000 // timescale if timescale else 0
+    streams = []
+    for track in mp4_tracks(buf):
+        if track['fourcc'] in ('encv', 'enca'):
+            raise ContainerError("encrypted track")
+        if not track['timescale']:
+            continue
+        track_us = track['duration'] * 1000000 // track['timescale']
+        duration_us = duration_us or track_us
+        seconds = track_us / 1e6
+        if track['handler'] == 'vide':
+            codec = MP4_VIDEO_CODECS.get(track['fourcc'])
+            if codec is None:
+                raise ContainerError(f"video sample entry {track['fourcc']}")
+            stream = _mp4_video_stream(buf, track, codec, seconds)
+        elif track['handler'] == 'soun':
+            stream = {'codec_type': 'audio', 'codec_name': MP4_AUDIO_CODECS.get(track['fourcc'], track['fourcc'])}
+        else:
+            continue
+        if seconds:
+            stream['bit_rate'] = str(int(mp4_sample_bytes(buf, track['stbl']) * 8 / seconds))
+        stream['duration'] = f"{seconds:.6f}"
+        stream['index'] = len(streams)
+        streams.append(stream)
+    if not duration_us:
+        # Fragmented files keep their samples in moof boxes; ffprobe walks those
+        raise ContainerError("no duration in moov")
+    return MP4_FORMAT_NAME, duration_us, streams
+
+
+# --- Matroska / WebM
+
+def read_vint(buf, pos):
+    """(value, length) of an EBML variable-size integer; value is None for 'unknown size'"""
+    first = buf[pos]
+    if not first:
+        raise ContainerError("bad EBML vint")
+    length = 9 - first.bit_length()
+    value = first & (0xFF >> length)
+    for i in range(1, length):
+        value = (value << 8) | buf[pos + i]
+    if value == (1 << (7 * length)) - 1:
+        return None, length
+    return value, length
+
+
+def read_element_id(buf, pos):
+    first = buf[pos]
+    if not first:
+        raise ContainerError("bad EBML id")
+    length = 9 - first.bit_length()
+    return int.from_bytes(buf[pos:pos + length], 'big'), length
+
+
+def iter_elements(buf, start, end):
+    """(element id, data start, data end) for each EBML element between start and end"""
+    pos = start
+    while pos < end:
+        element_id, id_length = read_element_id(buf, pos)
+        size, size_length = read_vint(buf, pos + id_length)
+        data = pos + id_length + size_length
+        data_end = end if size is None else min(data + size, end)
+        yield element_id, data, data_end
+        pos = data_end
+
+
+def ebml_uint(buf, start, end):
+    return int.from_bytes(buf[start:end], 'big')
+
+
+def ebml_float(buf, start, end):
+    if end - start == 4:
+        return struct.unpack_from('>f', buf, start)[0]
+    if end - start == 8:
+        return struct.unpack_from('>d', buf, start)[0]
+    return 0.0
+
+
+def ebml_string(buf, start, end):
+    return bytes(buf[start:end]).split(b'\0', 1)[0].decode('utf-8', errors='replace')
+
+
+def mkv_segment(buf):
+    """(segment data start, end, {top-level element id: (data start, data end)}) of a Matroska file.
+
+    Top-level elements are found by walking the segment up to the first
+    Cluster, then from the SeekHead for anything stored after the clusters.
+    """
+    elements = iter_elements(buf, 0, len(buf))
+    element_id, _, header_end = next(elements)
+    if element_id != EBML_HEADER:
+        raise ContainerError("not an EBML file")
+    segment = next((e for e in iter_elements(buf, header_end, len(buf)) if e[0] == SEGMENT), None)
+    if segment is None:
+        raise ContainerError("no Segment")
+    _, start, end = segment
+    offsets = {}
+    for element_id, data, data_end in iter_elements(buf, start, end):
+        if element_id == CLUSTER:
+            break
+        offsets.setdefault(element_id, (data, data_end))
+        if element_id == SEEK_HEAD:
+            for seek_id, seek, seek_end in iter_elements(buf, data, data_end):
+                if seek_id != SEEK:
+                    continue
+                target, position = None, None
+                for child_id, child, child_end in iter_elements(buf, seek, seek_end):
+                    if child_id == SEEK_ID:
+                        target = ebml_uint(buf, child, child_end)
+                    elif child_id == SEEK_POSITION:
+                        position = ebml_uint(buf, child, child_end)
+                if target is not None and position is not None and target not in offsets:
+                    # SeekHead positions are relative to the segment data and point at the element header
+                    element_pos = start + position
+                    if element_pos < end:
+                        found = next(iter_elements(buf, element_pos, end))
+                        if found[0] == target:
+                            offsets[target] = found[1:]
+    return start, end, offsets
+
+
+def mkv_element(buf, segment, element_id):
+    """(data start, data end) of a top-level Matroska element, or None"""
+    return segment[2].get(element_id)
+
+
+def _mkv_track(buf, start, end):
+    track = {'video': {}, 'colour': {}}
+    for element_id, data, data_end in iter_elements(buf, start, end):
+        if element_id in (TRACK_NUMBER, TRACK_TYPE, DEFAULT_DURATION):
+            track[element_id] = ebml_uint(buf, data, data_end)
+        elif element_id == CODEC_ID:
+            track[element_id] = ebml_string(buf, data, data_end)
+        elif element_id == CODEC_PRIVATE:
+            track[element_id] = bytes(buf[data:data_end])
+        elif element_id == CONTENT_ENCODINGS:
+            track[element_id] = True
+        elif element_id == VIDEO:
+            for video_id, v, v_end in iter_elements(buf, data, data_end):
+                if video_id == COLOUR:
+                    for colour_id, c, c_end in iter_elements(buf, v, v_end):
+                        track['colour'][colour_id] = ebml_uint(buf, c, c_end)
+                else:
+                    track['video'][video_id] = (v, v_end)
+    return track
+
+
+def mkv_tracks(buf, segment):
+    tracks_range = mkv_element(buf, segment, TRACKS)
+    if tracks_range is None:
+        raise ContainerError("no Tracks")
+    return [_mkv_track(buf, data, data_end)
+            for element_id, data, data_end in iter_elements(buf, *tracks_range) if element_id == TRACK_ENTRY]
+
+
+def mkv_timestamp_scale(buf, segment):
+    """Nanoseconds per Matroska timestamp tick (Info/TimestampScale)"""
+    info = mkv_element(buf, segment, INFO)
+    if info is not None:
+        for element_id, data, data_end in iter_elements(buf, *info):
+            if element_id == TIMESTAMP_SCALE:
+                return ebml_uint(buf, data, data_end)
+    return 1000000
+
+
+def _mkv_video_stream(buf, track, codec):
+    video, colour = track['video'], track['colour']
+    if PIXEL_WIDTH not in video or PIXEL_HEIGHT not in video:
+        raise ContainerError("video track without size")
+    fallback = None
+    if BITS_PER_CHANNEL in colour:
+        horizontal, vertical = colour.get(CHROMA_SUBSAMPLING_HORZ, 1), colour.get(CHROMA_SUBSAMPLING_VERT, 1)
+        chroma = {(1, 1): '420', (1, 0): '422', (0, 0): '444'}.get((horizontal, vertical), '420')
+        fallback = (None, chroma, colour[BITS_PER_CHANNEL])
+    config = track.get(CODEC_PRIVATE) if codec != 'vp9' else None
+    default_duration = track.get(DEFAULT_DURATION)
+    stream = {'codec_type': 'video', 'codec_name': codec,
+              'width': ebml_uint(buf, *video[PIXEL_WIDTH]), 'height': ebml_uint(buf, *video[PIXEL_HEIGHT]),
+              'avg_frame_rate': frame_rate(1e9 / default_duration if default_duration else 0),
+              'disposition': {'attached_pic': 0}}
+    stream['r_frame_rate'] = stream['avg_frame_rate']
+    stream.update(video_fields(codec, config, fallback))
+    return stream
+
+
+def read_mkv(buf, size):
+    segment = mkv_segment(buf)
+    scale = mkv_timestamp_scale(buf, segment)
+    duration_us = 0
+    info = mkv_element(buf, segment, INFO)
+    if info is not None:
+        for element_id, data, data_end in iter_elements(buf, *info):
+            if element_id == DURATION:
+                duration_us = int(ebml_float(buf, data, data_end) * scale / 1000)
+    if not duration_us:
+        raise ContainerError("no Segment duration")
+    streams = []
+    for track in mkv_tracks(buf, segment):
+        if track.get(CONTENT_ENCODINGS):
+            raise ContainerError("compressed or encrypted track")
+        codec_id = track.get(CODEC_ID, '')
+        if track.get(TRACK_TYPE) == 1:
+            codec = MKV_VIDEO_CODECS.get(codec_id)
+            if codec is None:
+                raise ContainerError(f"video codec {codec_id}")
+            stream = _mkv_video_stream(buf, track, codec)
+        elif track.get(TRACK_TYPE) == 2:
+            stream = {'codec_type': 'audio', 'codec_name': MKV_AUDIO_CODECS.get(codec_id, codec_id.lower())}
+        else:
+            continue
+        stream['index'] = len(streams)
+        streams.append(stream)
+    return MKV_FORMAT_NAME, duration_us, streams
+
+
+def read_header(path):
+    """ffprobe-shaped {'format', 'streams'} for an MP4/MOV or Matroska file, read from its headers.
+
+    Durations are computed in microseconds. Raises ContainerError (or OSError)
+    for files this reader leaves to ffprobe: other containers, fragmented or
+    encrypted files, codecs without a configuration record it understands.
+    """
+    with mapped(path) as buf:
+        size = len(buf)
+        if size < 16:
+            raise ContainerError("too small")
+        tags = {}
+        if bytes(buf[4:8]) in (b'ftyp', b'moov', b'mdat', b'free', b'wide', b'skip'):
+            format_name, duration_us, streams = read_mp4(buf, size)
+            if bytes(buf[4:8]) == b'ftyp':
+                # ffprobe reports it as a tag; it tells MP4 apart from MOV/3GP under the shared format name
+                tags['major_brand'] = bytes(buf[8:12]).decode('latin-1')
+        elif bytes(buf[:4]) == b'\x1a\x45\xdf\xa3':
+            format_name, duration_us, streams = read_mkv(buf, size)
+        else:
+            raise ContainerError("not MP4/MOV or Matroska")
+    seconds = duration_us / 1e6
+    return {
+        'format': {
+            'format_name': format_name,
+            'duration': f"{seconds:.6f}",
+            'size': str(size),
+            'bit_rate': str(int(size * 8 / seconds)),
+            'nb_streams': len(streams),
+            'tags': tags,
+        },
+        'streams': streams,
+    }
@@ -0,0 +1,63 @@
+# decode_balance.py - Move new jobs to CPU decode while NVDEC is the bottleneck and the CPU has room
+from collections import namedtuple
+
+DEC_PEGGED = 95     # NVDEC utilization treated as saturated
+ENC_HEADROOM = 15   # ...when NVENC sits at least this many points below it
+DEC_RELAXED = 70    # NVDEC below this has room to take decoding back
+CPU_BUSY = 85       # host CPU percent above which no more decoding moves to it
+
+# Sources whose NVDEC load is worth moving; their software decoders thread well
+BALANCE_CODECS = ('h264', 'hevc')
+
+BalanceChange = namedtuple('BalanceChange', 'time old_target new_target reason')
+
+
+class DecodeBalancer:
+    """Number of running GPU-encode jobs that should decode on the CPU instead of NVDEC.
+
+    observe() takes one sample per tick. After window samples where NVDEC is
+    pegged while NVENC has headroom (decode-bound), the CPU is below CPU_BUSY
+    and has idle cores for another decoder, the target rises by one. It falls
+    by one when the CPU is busy or NVDEC has relaxed with CPU decoders still
+    running. Every change is held for hold seconds so its effect can show.
+    The target only applies to jobs as they start; a running job keeps its
+    decoder.
+    """
+
+    def __init__(self, window=10, hold=30, max_target=8):
+        self.window = window
+        self.hold = hold
+        self.max_target = max_target
+        self.target = 0
+        self.samples = []
+        self.hold_until = None
+        self.changes = []
+
+    def _change(self, now, new_target, reason):
+        change = BalanceChange(now, self.target, new_target, reason)
+        self.changes.append(change)
+        self.target = new_target
+        self.samples = []
+        self.hold_until = now + self.hold
+        return change
+
+    def observe(self, now, enc_util, dec_util, cpu_percent, idle_cores, threads_per_decoder):
+        """Feed one sample; returns a BalanceChange when the target moves, else None"""
+        self.samples.append((enc_util, dec_util, cpu_percent))
+        if len(self.samples) < self.window:
+            return None
+        enc = sum(s[0] for s in self.samples) / len(self.samples)
+        dec = sum(s[1] for s in self.samples) / len(self.samples)
+        cpu = sum(s[2] for s in self.samples) / len(self.samples)
+        self.samples = self.samples[1:]
+        if self.hold_until is not None and now < self.hold_until:
+            return None
+
+        if self.target and cpu >= CPU_BUSY:
+            return self._change(now, self.target - 1, f"CPU at {cpu:.0f}%")
+        if self.target and dec < DEC_RELAXED:
+            return self._change(now, self.target - 1, f"NVDEC down to {dec:.0f}%")
+        if (dec >= DEC_PEGGED and enc <= dec - ENC_HEADROOM and cpu < CPU_BUSY
+                and idle_cores >= threads_per_decoder and self.target < self.max_target):
+            return self._change(now, self.target + 1, f"decode-bound (DEC {dec:.0f}%, ENC {enc:.0f}%)")
+        return None
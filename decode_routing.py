@@ -0,0 +1,110 @@
+# decode_routing.py - Pick GPU or CPU decode per input from its probed stream and the GPU's NVDEC generation
+import re
+from collections import namedtuple
+
+ROUTE_GPU = "gpu"                # NVDEC decode, frames stay on the GPU for NVENC
+ROUTE_CPU_DECODE = "cpu-decode"  # software decode, frames uploaded (hwupload_cuda) to NVENC
+ROUTE_CPU = "cpu"                # software decode and a CPU encoder
+
+# path, pixel format NVDEC hands over (None when not decoded on the GPU or unknown),
+# pixel format the encoder is given, and why this path was chosen
+DecodeRoute = namedtuple('DecodeRoute', 'path surface_format output_format reason')
+
+# (codec, chroma) -> {bit depth: minimum CUDA compute capability whose NVDEC decodes it}
+# Maxwell 5.x, Pascal 6.x, Turing 7.5, Ampere 8.6, Blackwell consumer 12.0
+NVDEC_SUPPORT = {
+    ('mpeg1video', '420'): {8: 5.0},
+    ('mpeg2video', '420'): {8: 5.0},
+    ('mpeg4', '420'): {8: 5.0},
+    ('vc1', '420'): {8: 5.0},
+    ('wmv3', '420'): {8: 5.0},
+    ('h264', '420'): {8: 5.0, 10: 12.0},
+    ('h264', '422'): {8: 12.0, 10: 12.0},
+    ('hevc', '420'): {8: 6.0, 10: 6.0, 12: 6.0},
+    ('hevc', '422'): {8: 12.0, 10: 12.0},
+    ('hevc', '444'): {8: 7.5, 10: 7.5, 12: 7.5},
+    ('vp8', '420'): {8: 6.0},
+    ('vp9', '420'): {8: 6.0, 10: 6.0, 12: 6.0},
+    ('av1', '420'): {8: 8.6, 10: 8.6},
+}
+# NVDEC handles only these MPEG-4 Part 2 profiles (no GMC / quarter-pel ASP streams)
+MPEG4_PROFILES = ('Simple Profile',)
+MAX_DECODE_SIZE = {'mpeg2video': 4080, 'mpeg4': 2032, 'vc1': 2048, 'wmv3': 2048, 'h264': 4096, 'vp8': 4096}
+DEFAULT_MAX_DECODE_SIZE = 8192
+# Assumed when the driver does not report a compute capability
+DEFAULT_COMPUTE_CAP = 6.0
+
+# Encoders that can keep a 10-bit source at 10 bits
+TEN_BIT_ENCODERS = ('hevc_nvenc', 'av1_nvenc', 'libx265', 'libsvtav1')
+
+
+def pixel_layout(stream):
+    """(chroma, bit depth) of a video stream from its pix_fmt, e.g. ('420', 10) for yuv420p10le"""
+    pix_fmt = (stream.get('pix_fmt') or '').lower()
+    depth_match = re.search(r'(\d+)(?:le|be)$', pix_fmt)
+    depth = int(depth_match.group(1)) if depth_match else 8
+    try:
+        depth = max(depth, int(stream.get('bits_per_raw_sample') or 0))
+    except (TypeError, ValueError):
+        pass
+    if '444' in pix_fmt or pix_fmt.startswith(('gbr', 'rgb', 'bgr', 'argb', 'abgr')):
+        chroma = '444'
+    elif '422' in pix_fmt or pix_fmt in ('nv16', 'p210le', 'p216le'):
+        chroma = '422'
+    else:
+        chroma = '420'
+    return chroma, depth
+
+
+def nvdec_unsupported(stream, compute_cap=None):
+    """Reason NVDEC on a GPU of this compute capability cannot decode the stream, or None"""
+    codec = stream.get('codec_name')
+    chroma, depth = pixel_layout(stream)
+    compute_cap = compute_cap or DEFAULT_COMPUTE_CAP
+    depths = NVDEC_SUPPORT.get((codec, chroma))
+    if depths is None:
+        return f"NVDEC does not decode {codec} {chroma}"
+    minimum = next((cap for bits, cap in sorted(depths.items()) if bits >= depth), None)
+    if minimum is None or compute_cap < minimum:
+        return f"NVDEC on this GPU does not decode {codec} {chroma} {depth}-bit"
+    if codec == 'mpeg4' and stream.get('profile') not in MPEG4_PROFILES:
+        return f"NVDEC does not decode MPEG-4 {stream.get('profile') or 'unknown profile'}"
+    limit = MAX_DECODE_SIZE.get(codec, DEFAULT_MAX_DECODE_SIZE)
+    if max(stream.get('width') or 0, stream.get('height') or 0) > limit:
+        return f"{stream.get('width')}x{stream.get('height')} exceeds NVDEC's {codec} limit"
+    return None
+
+
+def surface_format(chroma, depth):
+    """Pixel format of the CUDA frames NVDEC outputs"""
+    if chroma == '444':
+        return 'yuv444p' if depth <= 8 else 'yuv444p16le'
+    if depth <= 8:
+        return 'nv12'
+    return 'p010le' if depth <= 10 else 'p016le'
+
+
+def route_for(stream, spec, compute_cap=None, software_decode=False, nvdec=True):
+    """Decode path and pixel formats for encoding a probed video stream with an encoder spec.
+
+    Output is always 4:2:0, at 10 bits when the source is deeper than 8 bits
+    and the encoder can keep it (p010 for NVENC, yuv420p10le for CPU encoders).
+    GPU frames are handed to NVENC as nv12/p010, software-decoded frames are
+    uploaded (hwupload_cuda) as yuv420p/p010.
+    software_decode forces CPU decode (a retry after GPU decode failed);
+    nvdec=False skips the NVDEC table for other hwaccels.
+    """
+    chroma, depth = pixel_layout(stream)
+    deep = depth > 8 and spec.name in TEN_BIT_ENCODERS
+    if not spec.hardware:
+        return DecodeRoute(ROUTE_CPU, None, 'yuv420p10le' if deep else 'yuv420p', f"{spec.name} encodes on the CPU")
+
+    output_format = 'p010le' if deep else 'yuv420p'
+    if software_decode:
+        return DecodeRoute(ROUTE_CPU_DECODE, None, output_format, "GPU decode failed earlier")
+    if not stream.get('codec_name') or not nvdec:
+        return DecodeRoute(ROUTE_GPU, None, 'p010le' if deep else 'nv12', "not probed" if nvdec else "hwaccel")
+    reason = nvdec_unsupported(stream, compute_cap)
+    if reason:
+        return DecodeRoute(ROUTE_CPU_DECODE, None, output_format, reason)
+    return DecodeRoute(ROUTE_GPU, surface_format(chroma, depth), 'p010le' if deep else 'nv12', "NVDEC")
@@ -0,0 +1,134 @@
+# dedup.py - Content-based duplicate detection for queued input files
+import os
+import mmap
+import shutil
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+# Size of each head/middle/tail block in the sampled hash
+SAMPLE_BLOCK = 256 * 1024
+FULL_HASH_CHUNK = 8 * 1024 * 1024
+
+
+def sample_hash(path, size, block=SAMPLE_BLOCK):
+    """Hash the head, middle and tail blocks of a file (the whole file if it is small)"""
+    h = hashlib.blake2b(digest_size=20)
+    h.update(str(size).encode())
+    if size == 0:
+        return h.hexdigest()
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        if size <= 3 * block:
+            h.update(m[:])
+        else:
+            for offset in (0, size // 2 - block // 2, size - block):
+                h.update(m[offset:offset + block])
+    return h.hexdigest()
+
+
+def full_hash(path):
+    """Hash the complete contents of a file"""
+    h = hashlib.blake2b(digest_size=32)
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(FULL_HASH_CHUNK)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _group_by(paths, key_fn, executor):
+    groups = {}
+    for path, key in zip(paths, executor.map(key_fn, paths)):
+        if key is not None:
+            groups.setdefault(key, []).append(path)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+def find_duplicates(paths, max_workers=8, block=SAMPLE_BLOCK):
+    """Group paths with identical content.
+
+    Candidates are grouped by size, then by a sampled hash; a full hash is only
+    computed for files whose samples collide (and that are larger than the
+    sample). Returns {canonical_path: [duplicate_paths]} keeping queue order.
+    """
+    logger = logging.getLogger('gui')
+    order = {path: i for i, path in enumerate(paths)}
+
+    by_size = {}
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        by_size.setdefault(st.st_size, []).append((path, st))
+
+    groups = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for size, items in by_size.items():
+            if len(items) < 2:
+                continue
+
+            # Hard links of the same file need no hashing
+            links = {}
+            for path, st in items:
+                key = (st.st_dev, st.st_ino) if st.st_ino else path
+                links.setdefault(key, []).append(path)
+            links = {group[0]: group for group in links.values()}
+
+            def sampled(path, size=size):
+                try:
+                    return sample_hash(path, size, block)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Dedup: cannot sample {path}: {e}")
+                    return None
+
+            def complete(path):
+                try:
+                    return full_hash(path)
+                except OSError as e:
+                    logger.warning(f"Dedup: cannot hash {path}: {e}")
+                    return None
+
+            content_groups = []
+            if len(links) > 1:
+                for sample_group in _group_by(list(links), sampled, executor):
+                    if size <= 3 * block:
+                        content_groups.append(sample_group)
+                    else:
+                        content_groups.extend(_group_by(sample_group, complete, executor))
+
+            grouped = set()
+            for group in content_groups:
+                groups.append([path for rep in group for path in links[rep]])
+                grouped.update(group)
+            for rep, linked in links.items():
+                if rep not in grouped and len(linked) > 1:
+                    groups.append(linked)
+
+    duplicates = {}
+    for group in groups:
+        group = sorted(group, key=order.get)
+        duplicates[group[0]] = group[1:]
+    return duplicates
+
+
+def link_or_copy(src, dst):
+    """Materialize dst as a hard link of src, copying when linking is not possible"""
+    try:
+        os.link(src, dst)
+        return 'linked'
+    except OSError:
+        shutil.copy2(src, dst)
+        return 'copied'
+
+
+def link_or_copy_over(src, dst):
+    """link_or_copy that replaces an existing dst instead of failing on it"""
+    temp = dst + '.link'
+    if os.path.exists(temp):
+        os.remove(temp)
+    method = link_or_copy(src, temp)
+    os.replace(temp, dst)
+    return method
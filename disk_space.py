@@ -0,0 +1,123 @@
+# disk_space.py - Output size estimation and free-space reservations per volume
+import os
+import shutil
+import logging
+import threading
+
+# Muxing overhead on top of the stream bitrates
+CONTAINER_OVERHEAD = 1.02
+# Always leave this much free on a destination volume
+DEFAULT_MARGIN_BYTES = 512 * 1024 * 1024
+
+
+def audio_bitrate(probe):
+    """Sum of the audio stream bitrates (audio is stream-copied), in bits per second"""
+    total = 0
+    for stream in (probe or {}).get('streams', []):
+        if stream.get('codec_type') == 'audio':
+            try:
+                total += int(stream.get('bit_rate') or 0)
+            except (TypeError, ValueError):
+                continue
+    return total
+
+
+def estimate_encode_bytes(duration, video_bitrate, probe=None):
+    """Expected size of an encode from its duration and target video bitrate"""
+    if not duration or not video_bitrate:
+        return None
+    return int(duration * (video_bitrate + audio_bitrate(probe)) / 8 * CONTAINER_OVERHEAD)
+
+
+def volume_of(path):
+    """Identify the volume a path lives on (device id of its nearest existing parent)"""
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    try:
+        return os.stat(path).st_dev
+    except OSError:
+        return os.path.splitdrive(path)[0] or path
+
+
+def format_gb(num_bytes):
+    return f"{num_bytes / 1024 ** 3:.1f} GB"
+
+
+class DiskReservations:
+    """Running per-volume reservations for outputs that are still being written.
+
+    A job reserves its estimated size before starting. What is still
+    outstanding is the estimate minus what the output already occupies on
+    disk (which free space already accounts for), so the check stays
+    accurate while several outputs grow at once.
+    """
+
+    def __init__(self, margin_bytes=DEFAULT_MARGIN_BYTES, disk_usage=None):
+        self.margin_bytes = margin_bytes
+        self.disk_usage = disk_usage or shutil.disk_usage
+        self.logger = logging.getLogger('gui')
+        self._lock = threading.Lock()
+        self._reservations = {}  # key -> (volume, folder, estimate, written_path)
+
+    def _outstanding(self, volume):
+        total = 0
+        for vol, _, estimate, written_path in self._reservations.values():
+            if vol != volume:
+                continue
+            try:
+                written = os.path.getsize(written_path) if written_path else 0
+            except OSError:
+                written = 0
+            total += max(0, estimate - written)
+        return total
+
+    def free_bytes(self, folder):
+        """Free space on folder's volume after outstanding reservations and the safety margin"""
+        volume = volume_of(folder)
+        with self._lock:
+            outstanding = self._outstanding(volume)
+        return self.disk_usage(folder).free - outstanding - self.margin_bytes
+
+    def try_reserve(self, key, folder, estimate, written_path=None):
+        """Reserve estimate bytes on folder's volume; returns False if it does not fit"""
+        volume = volume_of(folder)
+        with self._lock:
+            self._reservations.pop(key, None)
+            available = self.disk_usage(folder).free - self._outstanding(volume) - self.margin_bytes
+            if estimate > available:
+                return False
+            self._reservations[key] = (volume, folder, estimate, written_path)
+            return True
+
+    def release(self, key):
+        with self._lock:
+            self._reservations.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._reservations = {}
+
+
+def check_batch_space(estimates, disk_usage=None, margin_bytes=DEFAULT_MARGIN_BYTES):
+    """Compare estimated output bytes per destination folder with free space.
+
+    estimates is a list of (folder, bytes). Returns a list of
+    (folder, needed_bytes, free_bytes) for every volume that would run out.
+    """
+    disk_usage = disk_usage or shutil.disk_usage
+    by_volume = {}
+    for folder, nbytes in estimates:
+        volume = volume_of(folder)
+        entry = by_volume.setdefault(volume, [folder, 0])
+        entry[1] += nbytes
+
+    shortfalls = []
+    for folder, needed in by_volume.values():
+        free = disk_usage(folder).free - margin_bytes
+        if needed > free:
+            shortfalls.append((folder, needed, free))
+    return shortfalls
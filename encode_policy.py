@@ -0,0 +1,119 @@
+# encode_policy.py - Decide per file whether to re-encode, remux or skip
+import os
+import logging
+
+ACTION_ENCODE = "encode"
+ACTION_REMUX = "remux"
+ACTION_SKIP = "skip"
+
+# ffprobe format_name values for each output container
+CONTAINER_FORMATS = {
+    'mp4': ('mov', 'mp4'),
+    'mkv': ('matroska',),
+}
+# ffprobe names every ISO-BMFF file "mov,mp4,m4a,3gp,3g2,mj2"; these major brands
+# (QuickTime, 3GPP, iTunes M4V) mark one that is not an MP4 file
+NON_MP4_BRANDS = ('qt', '3gp', '3g2', 'm4v')
+
+
+def parse_bitrate(text):
+    """Convert an ffmpeg style bitrate ('3000k', '2.5M', '800000') to bits per second"""
+    text = str(text).strip().lower()
+    if not text:
+        return None
+    multiplier = 1
+    if text[-1] in 'kmg':
+        multiplier = {'k': 1000, 'm': 1000 ** 2, 'g': 1000 ** 3}[text[-1]]
+        text = text[:-1]
+    try:
+        return int(float(text) * multiplier)
+    except ValueError:
+        return None
+
+
+def parse_frame_rate(text):
+    """Convert an ffprobe rate such as '30000/1001' to a float"""
+    try:
+        if '/' in str(text):
+            num, den = str(text).split('/', 1)
+            return float(num) / float(den) if float(den) else None
+        return float(text)
+    except (TypeError, ValueError):
+        return None
+
+
+def video_stream(probe):
+    """Return the first video stream from ffprobe JSON output, or an empty dict"""
+    for stream in (probe or {}).get('streams', []):
+        if stream.get('codec_type') == 'video' and stream.get('disposition', {}).get('attached_pic', 0) == 0:
+            return stream
+    return {}
+
+
+def same_container(probe, output_format, source_path):
+    """Whether the source already is a file of the output container, not just one ffprobe names alike"""
+    format_name = ((probe or {}).get('format', {}).get('format_name') or '').split(',')
+    if not any(name in format_name for name in CONTAINER_FORMATS.get(output_format, ())):
+        return False
+    if os.path.splitext(source_path)[1].lower() != f'.{output_format}':
+        return False
+    if output_format == 'mp4':
+        brand = (probe.get('format', {}).get('tags') or {}).get('major_brand') or ''
+        return not brand.strip().lower().startswith(NON_MP4_BRANDS)
+    return True
+
+
+def source_bitrate(probe):
+    """Video bitrate in bits per second, falling back to the container's overall bitrate"""
+    stream = video_stream(probe)
+    for value in (stream.get('bit_rate'), (probe or {}).get('format', {}).get('bit_rate')):
+        try:
+            if value:
+                return int(value)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+class EncodePolicy:
+    """Thresholds deciding when a source already meets the target and need not be re-encoded"""
+
+    def __init__(self, target_codec='hevc', target_bitrate='3000k', bitrate_factor=1.1,
+                 max_height=None, target_fps=None):
+        self.target_codec = target_codec
+        self.target_bitrate = parse_bitrate(target_bitrate)
+        self.bitrate_factor = bitrate_factor
+        self.max_height = max_height
+        self.target_fps = parse_frame_rate(target_fps) if target_fps else None
+        self.logger = logging.getLogger('gui')
+
+    def decide(self, probe, output_format, source_path):
+        """Return (action, reason) for one probed input"""
+        stream = video_stream(probe)
+        if not stream:
+            return ACTION_ENCODE, "no probed video stream"
+
+        codec = stream.get('codec_name')
+        if codec != self.target_codec:
+            return ACTION_ENCODE, f"codec {codec} != {self.target_codec}"
+
+        height = stream.get('height')
+        if self.max_height and height and height > self.max_height:
+            return ACTION_ENCODE, f"height {height} above cap {self.max_height}"
+
+        if self.target_fps:
+            fps = parse_frame_rate(stream.get('avg_frame_rate'))
+            if not fps or abs(fps - self.target_fps) > 0.01:
+                return ACTION_ENCODE, f"frame rate {fps or 'unknown'} != requested {self.target_fps:g}"
+
+        bitrate = source_bitrate(probe)
+        if bitrate is None or self.target_bitrate is None:
+            return ACTION_ENCODE, "source bitrate unknown"
+        limit = self.target_bitrate * self.bitrate_factor
+        if bitrate > limit:
+            return ACTION_ENCODE, f"bitrate {bitrate / 1e6:.2f} Mb/s above {limit / 1e6:.2f} Mb/s"
+
+        meets = f"{codec} at {bitrate / 1e6:.2f} Mb/s <= {limit / 1e6:.2f} Mb/s"
+        if same_container(probe, output_format, source_path):
+            return ACTION_SKIP, f"already {meets} in {output_format}"
+        return ACTION_REMUX, f"{meets}, copying streams into {output_format}"
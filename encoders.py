@@ -0,0 +1,71 @@
+# encoders.py - Registry of output encoders and how each maps the common settings to ffmpeg options
+from collections import namedtuple
+
+EncoderSpec = namedtuple('EncoderSpec', 'name codec hardware label tag mp4_tag')
+
+# hevc_nvenc keeps the short 'nvenc' tag so existing output names stay the same
+ENCODERS = [
+    EncoderSpec('hevc_nvenc', 'hevc', True, "HEVC (NVENC)", 'nvenc', 'hvc1'),
+    EncoderSpec('h264_nvenc', 'h264', True, "H.264 (NVENC)", 'h264_nvenc', None),
+    EncoderSpec('av1_nvenc', 'av1', True, "AV1 (NVENC)", 'av1_nvenc', None),
+    EncoderSpec('libx265', 'hevc', False, "HEVC (CPU x265)", 'libx265', 'hvc1'),
+    EncoderSpec('libx264', 'h264', False, "H.264 (CPU x264)", 'libx264', None),
+    EncoderSpec('libsvtav1', 'av1', False, "AV1 (CPU SVT-AV1)", 'libsvtav1', None),
+]
+ENCODERS_BY_NAME = {spec.name: spec for spec in ENCODERS}
+DEFAULT_ENCODER = 'hevc_nvenc'
+
+# NVENC presets p1 (fastest) .. p7 (slowest) mapped onto each CPU encoder's scale
+X26X_PRESETS = {'p1': 'ultrafast', 'p2': 'superfast', 'p3': 'veryfast', 'p4': 'faster',
+                'p5': 'fast', 'p6': 'medium', 'p7': 'slow'}
+SVTAV1_PRESETS = {'p1': '12', 'p2': '11', 'p3': '10', 'p4': '8', 'p5': '7', 'p6': '6', 'p7': '4'}
+
+
+def get_encoder(name):
+    """Spec for an encoder name, accepting the old short form ('nvenc' -> hevc_nvenc)"""
+    if name in ENCODERS_BY_NAME:
+        return ENCODERS_BY_NAME[name]
+    return ENCODERS_BY_NAME.get(f"hevc_{name}", ENCODERS_BY_NAME[DEFAULT_ENCODER])
+
+
+def available_encoders(compiled=None, nvenc_supported=None):
+    """Registry entries usable here.
+
+    compiled is the set of encoders ffmpeg was built with and nvenc_supported a
+    predicate telling whether the selected GPUs support an NVENC encoder; either
+    may be None when it has not been detected (everything is assumed available).
+    """
+    specs = []
+    for spec in ENCODERS:
+        if compiled and spec.name not in compiled:
+            continue
+        if spec.hardware and nvenc_supported is not None and not nvenc_supported(spec.name):
+            continue
+        specs.append(spec)
+    return specs
+
+
+def encoder_args(spec, preset, bitrate, bframes, lookahead, gpu=None):
+    """ffmpeg video encoder options for a spec from the common settings"""
+    if spec.hardware:
+        args = ['-c:v', spec.name]
+        if gpu is not None:
+            args.extend(['-gpu', str(gpu)])
+        return args + [
+            '-preset', preset,
+            '-b:v', bitrate,
+            '-bf', str(bframes),
+            '-rc-lookahead', str(lookahead),
+        ]
+
+    if spec.name == 'libx264':
+        return ['-c:v', spec.name, '-preset', X26X_PRESETS.get(preset, preset), '-b:v', bitrate,
+                '-bf', str(bframes), '-rc-lookahead', str(lookahead)]
+    if spec.name == 'libx265':
+        return ['-c:v', spec.name, '-preset', X26X_PRESETS.get(preset, preset), '-b:v', bitrate,
+                '-x265-params', f"bframes={bframes}:rc-lookahead={lookahead}"]
+    if spec.name == 'libsvtav1':
+        # SVT-AV1 picks its own mini-GOP structure; only the lookahead carries over
+        return ['-c:v', spec.name, '-preset', SVTAV1_PRESETS.get(preset, preset), '-b:v', bitrate,
+                '-svtav1-params', f"lookahead={lookahead}"]
+    return ['-c:v', spec.name, '-b:v', bitrate]
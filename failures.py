@@ -0,0 +1,152 @@
+# failures.py - Classify failed ffmpeg runs from stderr and decide how to retry them
+import re
+from collections import namedtuple, Counter
+
+FAILURE_SESSION_LIMIT = "NVENC session limit"
+FAILURE_ENCODER_UNSUPPORTED = "encoder unsupported"
+FAILURE_OUT_OF_MEMORY = "out of memory"
+FAILURE_UNSUPPORTED = "unsupported decoder/profile"
+FAILURE_GPU_ERROR = "GPU/NVENC error"
+FAILURE_CORRUPT_INPUT = "corrupt input"
+FAILURE_DISK_FULL = "disk full"
+FAILURE_STALLED = "stalled"
+FAILURE_UNKNOWN = "unknown error"
+
+# Line added to a job's output when the stall watchdog kills it
+STALL_MARKER = "Watchdog: stalled"
+
+# Checked in order, first match wins. A watchdog kill comes first since the
+# killed process may print anything. The session limit comes before out of
+# memory because NVENC reports an exhausted session pool as an out of memory error.
+# An encoder the GPU lacks (e.g. av1_nvenc before Ada) is no session problem; retrying cannot help.
+# Corrupt input comes last and only matches fatal demuxer errors: decode warnings
+# ("error while decoding", "corrupt", ...) also show up in runs that failed for a
+# transient GPU reason, and those must stay retryable.
+FAILURE_PATTERNS = [
+    (FAILURE_STALLED, re.compile(re.escape(STALL_MARKER))),
+    (FAILURE_DISK_FULL, re.compile(
+        r'No space left on device|not enough space on the disk|ENOSPC|Disk quota exceeded', re.I)),
+    (FAILURE_SESSION_LIMIT, re.compile(
+        r'OpenEncodeSessionEx failed|incompatible client key|'
+        r'out of (?:NVENC )?sessions|exceeds? the (?:maximum )?number of (?:encode )?sessions', re.I)),
+    (FAILURE_ENCODER_UNSUPPORTED, re.compile(
+        r'No capable devices found|\[\w+_nvenc @ [^\]]+\] Codec not supported', re.I)),
+    (FAILURE_OUT_OF_MEMORY, re.compile(
+        r'CUDA_ERROR_OUT_OF_MEMORY|cuMemAlloc|NV_ENC_ERR_OUT_OF_MEMORY|out of memory|'
+        r'Cannot allocate memory', re.I)),
+    (FAILURE_UNSUPPORTED, re.compile(
+        r'Hardware is lacking required capabilities|hwaccel initialisation returned error|'
+        r'Failed setup for format cuda|No decoder surfaces left|Unsupported (?:codec|profile|pixel format)|'
+        r'(?:codec|profile|format|bit depth|chroma).{0,40}not supported|Impossible to convert between|'
+        r'Function not implemented|Decoder .{0,40} not found', re.I)),
+    (FAILURE_GPU_ERROR, re.compile(
+        r'CUDA_ERROR_\w+|NV_ENC_ERR_\w+|\bcu\w+\(.*\) failed|Device creation failed|'
+        r'\[\w+_nvenc @ [^\]]+\].*(?:failed|error)', re.I)),
+    (FAILURE_CORRUPT_INPUT, re.compile(
+        r'Invalid data found when processing input|moov atom not found|EBML header parsing failed|'
+        r'could not find codec parameters', re.I)),
+]
+
+RetryPlan = namedtuple('RetryPlan', 'retry delay_ms software_decode lower_concurrency reason')
+
+
+def classify_failure(stderr_text):
+    """Return (failure_class, matching_line) for the stderr of a failed run"""
+    lines = [line.strip() for line in (stderr_text or '').splitlines() if line.strip()]
+    for failure, pattern in FAILURE_PATTERNS:
+        # The most recent matching line is the most relevant one
+        for line in reversed(lines):
+            if pattern.search(line):
+                return failure, line
+    return FAILURE_UNKNOWN, lines[-1] if lines else ""
+
+
+class RetryPolicy:
+    """Maps a failure class and attempt number to what to do next.
+
+    - NVENC session limit: lower concurrency and retry after a backoff
+    - out of memory: lower concurrency and retry, then fall back to software decode
+    - encoder unsupported: give up (the caller may move the file to a CPU encoder)
+    - unsupported decoder/profile: retry at once with software decode, else give up
+    - GPU/NVENC error: back off and retry
+    - corrupt input: give up on the file, the rest of the batch carries on
+    - disk full: back off and retry (the job waits for space before restarting)
+    - stalled (killed by the watchdog): back off and retry, or give up at once
+      when retry_stalled is False
+    - anything else: one retry after a backoff
+    attempt is the number of runs that have failed so far.
+    """
+
+    def __init__(self, max_attempts=3, backoff_ms=5000, max_backoff_ms=120000, retry_stalled=True):
+        self.max_attempts = max_attempts
+        self.backoff_ms = backoff_ms
+        self.max_backoff_ms = max_backoff_ms
+        self.retry_stalled = retry_stalled
+
+    def backoff(self, attempt):
+        return min(self.max_backoff_ms, self.backoff_ms * 2 ** (attempt - 1))
+
+    def plan(self, failure, attempt, software_decode=False):
+        give_up = RetryPlan(False, 0, software_decode, False, f"{failure}, giving up")
+        if attempt >= self.max_attempts:
+            return give_up._replace(reason=f"{failure} after {attempt} attempts, giving up")
+
+        if failure == FAILURE_SESSION_LIMIT:
+            return RetryPlan(True, self.backoff(attempt), software_decode, True,
+                             "encoder sessions exhausted, lowering concurrency and backing off")
+        if failure == FAILURE_OUT_OF_MEMORY:
+            if attempt == 1 or software_decode:
+                return RetryPlan(True, self.backoff(attempt), software_decode, True,
+                                 "out of memory, lowering concurrency and backing off")
+            return RetryPlan(True, self.backoff(attempt), True, True,
+                             "still out of memory, retrying with software decode")
+        if failure == FAILURE_ENCODER_UNSUPPORTED:
+            return give_up
+        if failure == FAILURE_UNSUPPORTED:
+            if software_decode:
+                return give_up
+            return RetryPlan(True, 0, True, False, "GPU decode unsupported, retrying with software decode")
+        if failure == FAILURE_GPU_ERROR:
+            return RetryPlan(True, self.backoff(attempt), software_decode, False,
+                             "GPU error, retrying after a backoff")
+        if failure == FAILURE_DISK_FULL:
+            return RetryPlan(True, self.backoff(attempt + 2), software_decode, False,
+                             "destination full, waiting for space before retrying")
+        if failure == FAILURE_STALLED:
+            if not self.retry_stalled:
+                return give_up._replace(reason="stalled, skipping")
+            return RetryPlan(True, self.backoff(attempt), software_decode, False,
+                             "stalled, restarting after a backoff")
+        if failure == FAILURE_UNKNOWN and attempt == 1:
+            return RetryPlan(True, self.backoff(attempt), software_decode, False, "retrying once")
+        return give_up
+
+
+class FailureLog:
+    """Retries and final failures of one batch, for the end-of-batch summary"""
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.retries = Counter()  # failure class -> retries made
+        self.failures = {}        # path -> (failure class, attempts, detail)
+
+    def record_retry(self, path, failure):
+        self.retries[failure] += 1
+
+    def record_failure(self, path, failure, attempts, detail):
+        self.failures[path] = (failure, attempts, detail)
+
+    def summary_lines(self, name=None):
+        """Human readable summary; name maps a path to its display name"""
+        name = name or (lambda path: path)
+        if not self.failures and not self.retries:
+            return []
+        lines = [f"{len(self.failures)} file(s) failed, {sum(self.retries.values())} retried"]
+        by_class = Counter(failure for failure, _, _ in self.failures.values())
+        for failure, count in by_class.most_common():
+            lines.append(f"  {failure}: {count}")
+        for path, (failure, attempts, detail) in self.failures.items():
+            lines.append(f"  ✗ {name(path)} - {failure} ({attempts} attempt(s)): {detail}")
+        return lines
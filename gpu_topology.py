@@ -0,0 +1,200 @@
+# gpu_topology.py - Discover GPU <-> NUMA node affinity and pin encode jobs to it
+import os
+import sys
+import shutil
+import logging
+import subprocess
+from collections import namedtuple
+import psutil
+
+# CUDA numbers GPUs fastest first by default, nvidia-smi, NVML and sysfs in PCI bus order;
+# ffmpeg runs with this so its -gpu / -hwaccel_device N is nvidia-smi's GPU N
+CUDA_ENV = {'CUDA_DEVICE_ORDER': 'PCI_BUS_ID'}
+
+# CPUs and NUMA node local to one GPU (numa_node is -1 when unknown)
+GpuAffinity = namedtuple('GpuAffinity', ['gpu_index', 'pci_bus_id', 'numa_node', 'cpus'])
+
+
+def parse_cpu_list(text):
+    """Parse a sysfs CPU list such as '0-7,16-23' into a sorted list of ints"""
+    cpus = set()
+    for part in text.strip().split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            start, end = part.split('-', 1)
+            cpus.update(range(int(start), int(end) + 1))
+        else:
+            cpus.add(int(part))
+    return sorted(cpus)
+
+
+def parse_cpu_mask(words, word_bits=64):
+    """Convert an NVML CPU affinity bitmask (array of words) into a list of CPU ids"""
+    cpus = []
+    for word_index, word in enumerate(words):
+        for bit in range(word_bits):
+            if word & (1 << bit):
+                cpus.append(word_index * word_bits + bit)
+    return cpus
+
+
+def sysfs_bus_id(nvidia_bus_id):
+    """Convert nvidia-smi bus id (00000000:3B:00.0) to sysfs form (0000:3b:00.0)"""
+    bus_id = nvidia_bus_id.strip().lower()
+    domain, _, rest = bus_id.partition(':')
+    if rest and len(domain) > 4:
+        domain = domain[-4:]
+    return f"{domain}:{rest}" if rest else bus_id
+
+
+class GpuTopology:
+    """Discover which CPUs and memory node are local to each NVIDIA GPU.
+
+    All system access goes through injectable hooks (sysfs_root, run, nvml,
+    platform, cpu_count) so discovery can be exercised on a single-socket box.
+    """
+
+    def __init__(self, sysfs_root='/sys', run=None, nvml=None, platform=None, cpu_count=None):
+        self.sysfs_root = sysfs_root
+        self.run = run or subprocess.run
+        self.nvml = nvml
+        self.platform = platform or sys.platform
+        self.cpu_count = cpu_count or psutil.cpu_count(logical=True) or 1
+        self.logger = logging.getLogger('gui')
+        self._affinities = None
+
+    def list_gpus(self):
+        """Return [(index, pci_bus_id)] for all visible NVIDIA GPUs"""
+        try:
+            result = self.run([
+                'nvidia-smi',
+                '--query-gpu=index,pci.bus_id',
+                '--format=csv,noheader'
+            ], capture_output=True, text=True, timeout=3,
+               creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0))
+        except (FileNotFoundError, subprocess.TimeoutExpired) as e:
+            self.logger.warning(f"GPU topology: nvidia-smi unavailable: {e}")
+            return []
+
+        gpus = []
+        if result.returncode == 0:
+            for line in result.stdout.strip().split('\n'):
+                parts = [p.strip() for p in line.split(',')]
+                if len(parts) >= 2 and parts[0].isdigit():
+                    gpus.append((int(parts[0]), parts[1]))
+        return gpus
+
+    def _read_sysfs(self, bus_id, name):
+        path = os.path.join(self.sysfs_root, 'bus', 'pci', 'devices', sysfs_bus_id(bus_id), name)
+        try:
+            with open(path, 'r') as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    def _from_sysfs(self, index, bus_id):
+        numa_text = self._read_sysfs(bus_id, 'numa_node')
+        cpu_text = self._read_sysfs(bus_id, 'local_cpulist')
+        if numa_text is None and cpu_text is None:
+            return None
+        numa_node = int(numa_text) if numa_text and numa_text.lstrip('-').isdigit() else -1
+        cpus = parse_cpu_list(cpu_text) if cpu_text else []
+        return GpuAffinity(index, bus_id, numa_node, cpus)
+
+    def _load_nvml(self):
+        if self.nvml is None:
+            try:
+                import pynvml
+                pynvml.nvmlInit()
+                self.nvml = pynvml
+            except Exception:
+                self.nvml = False
+        return self.nvml or None
+
+    def _from_nvml(self, index, bus_id):
+        nvml = self._load_nvml()
+        if not nvml:
+            return None
+        try:
+            handle = nvml.nvmlDeviceGetHandleByIndex(index)
+            words = (self.cpu_count + 63) // 64
+            cpus = parse_cpu_mask(nvml.nvmlDeviceGetCpuAffinity(handle, words))
+            numa_node = -1
+            get_memory_affinity = getattr(nvml, 'nvmlDeviceGetMemoryAffinity', None)
+            if get_memory_affinity is not None:
+                nodes = parse_cpu_mask(get_memory_affinity(handle, 1, 0))
+                if len(nodes) == 1:
+                    numa_node = nodes[0]
+            return GpuAffinity(index, bus_id, numa_node, cpus)
+        except Exception as e:
+            self.logger.warning(f"GPU topology: NVML query failed for GPU {index}: {e}")
+            return None
+
+    def discover(self, refresh=False):
+        """Return {gpu_index: GpuAffinity}, cached after the first call"""
+        if self._affinities is not None and not refresh:
+            return self._affinities
+
+        affinities = {}
+        for index, bus_id in self.list_gpus():
+            affinity = None
+            if self.platform.startswith('linux'):
+                affinity = self._from_sysfs(index, bus_id)
+            if affinity is None:
+                affinity = self._from_nvml(index, bus_id)
+            if affinity is None:
+                affinity = GpuAffinity(index, bus_id, -1, [])
+            affinities[index] = affinity
+            self.logger.info(f"GPU {index} ({bus_id}): NUMA node {affinity.numa_node}, "
+                             f"{len(affinity.cpus) or 'unknown'} local CPUs")
+
+        self._affinities = affinities
+        return affinities
+
+    def affinity_for(self, gpu_index):
+        """Return the GpuAffinity for a GPU, or None if nothing useful is known"""
+        affinity = self.discover().get(gpu_index)
+        if affinity is None or not affinity.cpus:
+            return None
+        # Pinning to every CPU is a no-op; skip it on single-node machines
+        if len(affinity.cpus) >= self.cpu_count:
+            return None
+        return affinity
+
+
+class JobPinner:
+    """Apply GPU-local CPU/memory placement to encode processes"""
+
+    def __init__(self, topology, which=None, process_factory=None):
+        self.topology = topology
+        self.which = which or shutil.which
+        self.process_factory = process_factory or psutil.Process
+        self.logger = logging.getLogger('gui')
+
+    def wrap_command(self, cmd, gpu_index):
+        """Prefix cmd with numactl so memory comes from the GPU's node while it has room (Linux only)"""
+        affinity = self.topology.affinity_for(gpu_index)
+        if affinity is None or affinity.numa_node < 0:
+            return cmd
+        if not self.topology.platform.startswith('linux') or not self.which('numactl'):
+            return cmd
+        # --preferred rather than --membind: a full node spills to another one instead of OOM-killing ffmpeg
+        return ['numactl',
+                f'--cpunodebind={affinity.numa_node}',
+                f'--preferred={affinity.numa_node}'] + list(cmd)
+
+    def pin_process(self, pid, gpu_index):
+        """Restrict a running process to the CPUs local to its GPU"""
+        affinity = self.topology.affinity_for(gpu_index)
+        if affinity is None:
+            return False
+        try:
+            self.process_factory(pid).cpu_affinity(affinity.cpus)
+            self.logger.info(f"Pinned PID {pid} to GPU {gpu_index} local CPUs "
+                             f"(NUMA node {affinity.numa_node})")
+            return True
+        except (psutil.Error, AttributeError, ValueError, OSError) as e:
+            self.logger.warning(f"Could not pin PID {pid} to GPU {gpu_index}: {e}")
+            return False
@@ -0,0 +1,82 @@
+# jobs.py - State of one ffmpeg run for an input file
+import time
+from collections import deque
+
+# Lines of ffmpeg output kept per job to classify a failure
+STDERR_TAIL_LINES = 60
+
+# Reasons a running job can be suspended; the process continues once none is left
+HOLD_USER = 'user'
+HOLD_QUEUE = 'queue'
+HOLD_THERMAL = 'thermal'
+HOLD_PREEMPT = 'preempt'
+
+
+class Job:
+    """One running ffmpeg process; a retry of the same file is a new Job with attempt + 1"""
+
+    __slots__ = ('file_path', 'output_path', 'write_path', 'outputs', 'action', 'gpu', 'attempt',
+                 'software_decode', 'cpu_pool', 'members', 'process', 'progress', 'speed', 'media_time', 'started', 'holds', 'suspended_since',
+                 'suspended_time', 'output_tail')
+
+    def __init__(self, file_path, output_path, write_path, action, gpu=None, attempt=1,
+                 software_decode=False, outputs=None, members=None, cpu_pool=False):
+        self.file_path = file_path
+        self.output_path = output_path
+        self.write_path = write_path  # differs from output_path when staging on scratch
+        # (rendition, output_path, write_path) per output; rendition is None outside ladder mode
+        self.outputs = outputs or [(None, output_path, write_path)]
+        self.action = action
+        self.gpu = gpu
+        self.attempt = attempt
+        self.software_decode = software_decode
+        # Spilled to a CPU encoder while the GPU slots were full; holds no GPU slot or session
+        self.cpu_pool = cpu_pool
+        # Input per output when several short clips share one process
+        self.members = members or [file_path]
+        self.process = None
+        self.progress = 0
+        self.speed = 0.0  # latest x realtime reported by ffmpeg
+        self.media_time = 0.0  # seconds of input encoded so far
+        self.started = time.monotonic()
+        self.holds = set()
+        self.suspended_since = None
+        self.suspended_time = 0.0  # seconds spent suspended, left out of elapsed()
+        self.output_tail = deque(maxlen=STDERR_TAIL_LINES)
+
+    @property
+    def is_ladder(self):
+        return self.outputs[0][0] is not None
+
+    @property
+    def suspended(self):
+        return self.suspended_since is not None
+
+    def mark_suspended(self):
+        self.suspended_since = time.monotonic()
+
+    def mark_resumed(self):
+        if self.suspended_since is not None:
+            self.suspended_time += time.monotonic() - self.suspended_since
+            self.suspended_since = None
+
+    def elapsed(self):
+        """Seconds the process has actually been running"""
+        now = time.monotonic()
+        paused = self.suspended_time + (now - self.suspended_since if self.suspended_since is not None else 0)
+        return now - self.started - paused
+
+    def effective_speed(self, reported):
+        """ffmpeg's speed counts suspended wall time; recompute it from running time once suspended"""
+        if self.suspended_time and self.media_time:
+            elapsed = self.elapsed()
+            return self.media_time / elapsed if elapsed > 0 else reported
+        return reported
+
+    def add_output(self, text):
+        for line in text.splitlines():
+            if line.strip():
+                self.output_tail.append(line.strip())
+
+    def output_text(self):
+        return '\n'.join(self.output_tail)
@@ -0,0 +1,297 @@
+# keyframe_index.py - Keyframe times and byte offsets per input, read from container tables and cached on disk
+import os
+import json
+import struct
+import bisect
+import hashlib
+import logging
+import threading
+import subprocess
+from collections import namedtuple
+
+from containers import (ContainerError, CUES, TRACK_NUMBER, TRACK_TYPE, find_box, iter_boxes, iter_elements,
+                        ebml_uint, mapped, mkv_element, mkv_segment, mkv_timestamp_scale, mkv_tracks,
+                        mp4_tracks, uint32s)
+
+Keyframe = namedtuple('Keyframe', 'time offset')  # presentation time in seconds, byte offset (-1 unknown)
+
+# Matroska Cues element IDs
+CUE_POINT, CUE_TIME, CUE_TRACK_POSITIONS, CUE_TRACK, CUE_CLUSTER_POSITION = 0xBB, 0xB3, 0xB7, 0xF7, 0xF1
+
+INDEX_VERSION = 1
+
+
+class KeyframeIndex:
+    """Sorted keyframes of a file's first video stream, with the lookups cutting it needs"""
+
+    def __init__(self, keyframes, duration=None, source=''):
+        self.keyframes = sorted(keyframes)
+        self.times = [k.time for k in self.keyframes]
+        self.duration = duration
+        self.source = source  # 'mp4', 'mkv' or 'ffprobe'
+
+    def __len__(self):
+        return len(self.keyframes)
+
+    def at_or_before(self, time):
+        """Last keyframe at or before time (where a cut starting at time has to begin decoding), or None"""
+        i = bisect.bisect_right(self.times, time)
+        return self.keyframes[i - 1] if i else None
+
+    def at_or_after(self, time):
+        """First keyframe at or after time, or None"""
+        i = bisect.bisect_left(self.times, time)
+        return self.keyframes[i] if i < len(self.keyframes) else None
+
+    def between(self, start, end):
+        """Keyframes with start <= time < end"""
+        return self.keyframes[bisect.bisect_left(self.times, start):bisect.bisect_left(self.times, end)]
+
+    def split_points(self, segment_seconds):
+        """Keyframe times cutting the file into segments of at least segment_seconds (0.0 first)"""
+        points = [0.0]
+        while True:
+            keyframe = self.at_or_after(points[-1] + segment_seconds)
+            if keyframe is None or (self.duration and keyframe.time >= self.duration):
+                return points
+            points.append(keyframe.time)
+
+    def to_dict(self):
+        return {'keyframes': [list(k) for k in self.keyframes], 'duration': self.duration, 'source': self.source}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls([Keyframe(*k) for k in data['keyframes']], data.get('duration'), data.get('source', ''))
+
+
+def _mp4_edit_shift(buf, trak):
+    """Media time the track's edit list starts presenting from, in track timescale units"""
+    elst = find_box(buf, *trak, 'edts', 'elst')
+    if elst is None:
+        return 0
+    version = buf[elst[0]]
+    count = struct.unpack_from('>I', buf, elst[0] + 4)[0]
+    pos, entry_format = elst[0] + 8, ('>Qq' if version == 1 else '>Ii')
+    for _ in range(count):
+        _, media_time = struct.unpack_from(entry_format, buf, pos)
+        pos += struct.calcsize(entry_format) + 4
+        if media_time != -1:  # -1 is an empty edit
+            return media_time
+    return 0
+
+
+def mp4_keyframes(buf):
+    """KeyframeIndex of the first video track from the stss, stts, ctts, stsc, stsz and stco/co64 tables"""
+    track = next((t for t in mp4_tracks(buf) if t['handler'] == 'vide'), None)
+    if track is None or not track['timescale']:
+        raise ContainerError("no video track")
+    stbl = track['stbl']
+    tables = {kind: (start, end) for kind, start, end in iter_boxes(buf, *stbl)}
+    if 'stts' not in tables or 'stsc' not in tables or 'stsz' not in tables:
+        raise ContainerError("incomplete sample tables")
+
+    sample_size, sample_count = struct.unpack_from('>II', buf, tables['stsz'][0] + 4)
+    sizes = None if sample_size else uint32s(buf, tables['stsz'][0] + 12, sample_count)
+    if 'stss' in tables:
+        count = struct.unpack_from('>I', buf, tables['stss'][0] + 4)[0]
+        sync = [n - 1 for n in uint32s(buf, tables['stss'][0] + 8, count)]
+    else:
+        sync = range(sample_count)  # no stss: every sample is a sync sample
+    if 'stco' in tables:
+        count = struct.unpack_from('>I', buf, tables['stco'][0] + 4)[0]
+        chunk_offsets = uint32s(buf, tables['stco'][0] + 8, count)
+    elif 'co64' in tables:
+        count = struct.unpack_from('>I', buf, tables['co64'][0] + 4)[0]
+        chunk_offsets = struct.unpack_from(f'>{count}Q', buf, tables['co64'][0] + 8)
+    else:
+        raise ContainerError("no chunk offsets")
+
+    count = struct.unpack_from('>I', buf, tables['stts'][0] + 4)[0]
+    stts = uint32s(buf, tables['stts'][0] + 8, count * 2)
+    ctts = None
+    if 'ctts' in tables:
+        count = struct.unpack_from('>I', buf, tables['ctts'][0] + 4)[0]
+        ctts = uint32s(buf, tables['ctts'][0] + 8, count * 2)
+        if buf[tables['ctts'][0]] == 1:  # version 1 offsets are signed
+            ctts = [v - (1 << 32) if i % 2 and v & 0x80000000 else v for i, v in enumerate(ctts)]
+    count = struct.unpack_from('>I', buf, tables['stsc'][0] + 4)[0]
+    stsc = uint32s(buf, tables['stsc'][0] + 8, count * 3)
+    shift = _mp4_edit_shift(buf, track['trak'])
+
+    # Walk every table once alongside the (sorted) sync samples
+    keyframes = []
+    stts_i = stts_first = dts = 0
+    ctts_i = ctts_first = 0
+    stsc_i = 0
+    chunk = stsc[0] - 1 if stsc else 0
+    chunk_first = 0
+    for sample in sync:
+        if sample >= sample_count:
+            break
+        while stts_i < len(stts) and sample >= stts_first + stts[stts_i]:
+            dts += stts[stts_i] * stts[stts_i + 1]
+            stts_first += stts[stts_i]
+            stts_i += 2
+        sample_dts = dts + (sample - stts_first) * (stts[stts_i + 1] if stts_i < len(stts) else 0)
+        offset = 0
+        if ctts:
+            while ctts_i + 2 < len(ctts) and sample >= ctts_first + ctts[ctts_i]:
+                ctts_first += ctts[ctts_i]
+                ctts_i += 2
+            offset = ctts[ctts_i + 1]
+
+        # Chunk holding the sample: stsc runs give samples per chunk from each first chunk on
+        while True:
+            per_chunk = stsc[stsc_i + 1]
+            next_run = stsc[stsc_i + 3] - 1 if stsc_i + 3 < len(stsc) else len(chunk_offsets)
+            if sample < chunk_first + per_chunk:
+                break
+            chunk += 1
+            chunk_first += per_chunk
+            if chunk >= next_run:
+                if stsc_i + 3 >= len(stsc):
+                    raise ContainerError("sample beyond the last chunk")
+                stsc_i += 3
+        if chunk >= len(chunk_offsets):
+            raise ContainerError("chunk offset table too short")
+        in_chunk = sample - chunk_first
+        position = chunk_offsets[chunk] + (sum(sizes[chunk_first:sample]) if sizes else in_chunk * sample_size)
+        time = (sample_dts + offset - shift) / track['timescale']
+        keyframes.append(Keyframe(round(time, 6), position))
+    return KeyframeIndex(keyframes, track['duration'] / track['timescale'], 'mp4')
+
+
+def mkv_keyframes(buf):
+    """KeyframeIndex of the first video track from the Matroska Cues (cluster positions as offsets)"""
+    segment = mkv_segment(buf)
+    cues = mkv_element(buf, segment, CUES)
+    if cues is None:
+        raise ContainerError("no Cues")
+    video = next((t for t in mkv_tracks(buf, segment) if t.get(TRACK_TYPE) == 1), None)
+    if video is None:
+        raise ContainerError("no video track")
+    track_number = video.get(TRACK_NUMBER)
+    seconds_per_tick = mkv_timestamp_scale(buf, segment) / 1e9
+    keyframes = []
+    for element_id, point, point_end in iter_elements(buf, *cues):
+        if element_id != CUE_POINT:
+            continue
+        time, positions = None, []
+        for child_id, child, child_end in iter_elements(buf, point, point_end):
+            if child_id == CUE_TIME:
+                time = ebml_uint(buf, child, child_end)
+            elif child_id == CUE_TRACK_POSITIONS:
+                fields = {i: ebml_uint(buf, s, e) for i, s, e in iter_elements(buf, child, child_end)}
+                positions.append(fields)
+        for fields in positions:
+            if time is not None and fields.get(CUE_TRACK) == track_number:
+                offset = fields.get(CUE_CLUSTER_POSITION)
+                keyframes.append(Keyframe(round(time * seconds_per_tick, 6),
+                                          segment[0] + offset if offset is not None else -1))
+    if not keyframes:
+        raise ContainerError("no Cues for the video track")
+    return KeyframeIndex(keyframes, None, 'mkv')
+
+
+def ffprobe_keyframes(path, timeout=600):
+    """KeyframeIndex from an ffprobe packet scan of the first video stream, or None"""
+    try:
+        result = subprocess.run([
+            'ffprobe', '-v', 'error',
+            '-select_streams', 'v:0',
+            '-show_entries', 'packet=pts_time,pos,flags',
+            '-of', 'csv=p=0',
+            path
+        ], capture_output=True, text=True, timeout=timeout,
+           creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0))
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logging.getLogger('gui').warning(f"ffprobe packet scan failed for {path}: {e}")
+        return None
+    if result.returncode != 0:
+        return None
+    keyframes = []
+    for line in result.stdout.splitlines():
+        parts = line.strip().split(',')
+        if len(parts) < 3 or 'K' not in parts[2]:
+            continue
+        try:
+            time = float(parts[0])
+        except ValueError:
+            continue  # N/A timestamps
+        offset = int(parts[1]) if parts[1].isdigit() else -1
+        keyframes.append(Keyframe(round(time, 6), offset))
+    return KeyframeIndex(keyframes, None, 'ffprobe')
+
+
+def build_index(path, fallback=True):
+    """KeyframeIndex of a file from its container tables, else (when fallback) an ffprobe packet scan"""
+    try:
+        with mapped(path) as buf:
+            if bytes(buf[:4]) == b'\x1a\x45\xdf\xa3':
+                return mkv_keyframes(buf)
+            return mp4_keyframes(buf)
+    except (ContainerError, OSError, ValueError, IndexError, struct.error):
+        return ffprobe_keyframes(path) if fallback else None
+
+
+class KeyframeIndexStore:
+    """Keyframe indexes kept under cache_dir, one JSON file per input, valid while (path, size, mtime) match.
+
+    Indexes are also kept in memory once loaded; get() is safe to call from
+    worker threads. build(path) can be replaced for testing.
+    """
+
+    def __init__(self, cache_dir, build=build_index):
+        self.cache_dir = cache_dir
+        self.build = build
+        self.indexes = {}
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger('gui')
+
+    def _cache_file(self, path):
+        name = hashlib.blake2b(os.path.abspath(path).encode('utf-8'), digest_size=16).hexdigest()
+        return os.path.join(self.cache_dir, name + '.json')
+
+    def _load(self, path, key):
+        try:
+            with open(self._cache_file(path), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('version') != INDEX_VERSION or data.get('key') != key:
+            return None
+        try:
+            return KeyframeIndex.from_dict(data['index'])
+        except (KeyError, TypeError):
+            return None
+
+    def _save(self, path, key, index):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp = self._cache_file(path) + '.tmp'
+            with open(temp, 'w', encoding='utf-8') as f:
+                json.dump({'version': INDEX_VERSION, 'key': key, 'index': index.to_dict()}, f)
+            os.replace(temp, self._cache_file(path))
+        except OSError as e:
+            self.logger.warning(f"Could not write keyframe index for {path}: {e}")
+
+    def get(self, path):
+        """KeyframeIndex of a file, from memory, the disk cache or a fresh build; None if it can't be built"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        key = [os.path.abspath(path), st.st_size, st.st_mtime_ns]
+        with self.lock:
+            cached = self.indexes.get(key[0])
+            if cached is not None and cached[0] == key:
+                return cached[1]
+        index = self._load(path, key)
+        if index is None:
+            index = self.build(path)
+            if index is None:
+                return None
+            self._save(path, key, index)
+        with self.lock:
+            self.indexes[key[0]] = (key, index)
+        return index
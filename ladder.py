@@ -0,0 +1,66 @@
+# ladder.py - Bitrate/resolution ladders encoded from a single decode
+from collections import namedtuple
+from encode_policy import parse_bitrate
+
+Rendition = namedtuple('Rendition', 'height bitrate output_format')
+
+
+def rendition_label(rendition):
+    return f"{rendition.height}p {rendition.bitrate}"
+
+
+def parse_ladder(text, default_format):
+    """Parse '1080:6000k, 720:3000k, 480:1200k:mkv' into Renditions.
+
+    Each entry is height:bitrate[:format]. Outputs are named by bitrate, so two
+    renditions may not share a bitrate and container. Raises ValueError.
+    """
+    renditions = []
+    seen = set()
+    for entry in (text or '').replace(';', ',').split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        parts = [p.strip() for p in entry.split(':')]
+        if len(parts) not in (2, 3):
+            raise ValueError(f"'{entry}' is not height:bitrate[:format]")
+        height = parts[0].lower().rstrip('p')
+        if not height.isdigit() or int(height) <= 0:
+            raise ValueError(f"'{parts[0]}' is not a valid height")
+        if not parse_bitrate(parts[1]):
+            raise ValueError(f"'{parts[1]}' is not a valid bitrate")
+        output_format = parts[2].lower() if len(parts) == 3 else default_format
+        if output_format not in ('mp4', 'mkv'):
+            raise ValueError(f"'{output_format}' is not a supported format")
+        key = (parse_bitrate(parts[1]), output_format)
+        if key in seen:
+            raise ValueError(f"two renditions would both be named {parts[1]}bps.{output_format}")
+        seen.add(key)
+        renditions.append(Rendition(int(height), parts[1], output_format))
+    return renditions
+
+
+def ladder_filter(renditions, fps=None, source_height=None, gpu_frames=True, gpu_format=None, upload=None):
+    """filter_complex that decodes once and splits into one scaled stream per rendition.
+
+    Returns (filter_graph, output_labels). Renditions at or above the source
+    height pass through unscaled. gpu_format converts CUDA frames to that
+    pixel format on the way (e.g. p010 -> nv12 for an 8-bit encoder); upload
+    puts software-decoded frames on the GPU in that format before the split.
+    """
+    if upload:
+        gpu_frames, gpu_format = True, None
+    scaler = 'scale_cuda' if gpu_frames else 'scale'
+    convert = f":format={gpu_format}" if gpu_frames and gpu_format else ""
+    head = "[0:v]" + (f"fps={fps}," if fps else "") + (f"format={upload},hwupload_cuda," if upload else "")
+    split_labels = [f"s{i}" for i in range(len(renditions))]
+    chains = [f"{head}split={len(renditions)}" + ''.join(f"[{label}]" for label in split_labels)]
+    labels = []
+    for i, rendition in enumerate(renditions):
+        label = f"v{i}"
+        if source_height and rendition.height >= source_height:
+            chains.append(f"[s{i}]scale_cuda=format={gpu_format}[{label}]" if convert else f"[s{i}]null[{label}]")
+        else:
+            chains.append(f"[s{i}]{scaler}=-2:{rendition.height}{convert}[{label}]")
+        labels.append(label)
+    return ';'.join(chains), labels
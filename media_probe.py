@@ -0,0 +1,54 @@
+# media_probe.py - Stream/format probing of input files
+import json
+import logging
+import struct
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from containers import ContainerError, read_header
+
+
+def ffprobe_file(path, timeout=30):
+    """Run ffprobe on one file and return its JSON (format + streams), or None"""
+    try:
+        result = subprocess.run([
+            'ffprobe',
+            '-v', 'quiet',
+            '-print_format', 'json',
+            '-show_format',
+            '-show_streams',
+            path
+        ], capture_output=True, text=True, timeout=timeout,
+           creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0))
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logging.getLogger('gui').warning(f"ffprobe failed for {path}: {e}")
+        return None
+    if result.returncode != 0:
+        return None
+    try:
+        return json.loads(result.stdout)
+    except ValueError:
+        return None
+
+
+def probe_file(path, timeout=30):
+    """Probe JSON read from the container headers in-process, falling back to ffprobe.
+
+    MP4/MOV and Matroska files are read through mmap without a process spawn;
+    other containers and the edge cases the header reader skips (fragmented
+    or encrypted files, codecs it has no configuration record for) go to ffprobe.
+    """
+    try:
+        return read_header(path)
+    except (ContainerError, OSError, ValueError, IndexError, struct.error):
+        return ffprobe_file(path, timeout)
+
+
+def probe_files(paths, max_workers=8, probe=probe_file):
+    """Probe many files in parallel; returns {path: probe_json} for those that succeeded"""
+    probes = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for path, data in zip(paths, executor.map(probe, paths)):
+            if data is not None:
+                probes[path] = data
+    return probes
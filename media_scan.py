@@ -0,0 +1,230 @@
+# media_scan.py - Parallel recursive discovery of video files with container sniffing
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Bytes read from the head of each file for magic-number detection
+SNIFF_BYTES = 512
+# Files of one folder sniffed per task, so a huge flat folder is spread over the pool
+CHECK_CHUNK = 256
+
+# Top-level ISO-BMFF / QuickTime atoms that can start an MP4/MOV file
+ISO_BMFF_ATOMS = (b'ftyp', b'moov', b'mdat', b'free', b'wide', b'skip', b'pnot')
+
+# ftyp major brands of ISO-BMFF files that are audio or still images, not video
+NON_VIDEO_BRANDS = (b'M4A ', b'M4B ', b'M4P ', b'F4A ', b'F4B ',
+                    b'heic', b'heix', b'heim', b'heis', b'mif1', b'msf1', b'avif', b'avis')
+# First packet of an Ogg video stream (Theora identification header, VP8 in Ogg)
+OGG_VIDEO_HEADERS = (b'\x80theora', b'OVP80')
+
+TS_PACKET = 188
+M2TS_PACKET = 192
+
+
+def sniff_header(head):
+    """Identify a video container from the first bytes of a file, or return None"""
+    if len(head) < 12:
+        return None
+
+    if head[4:8] in ISO_BMFF_ATOMS:
+        if head[4:8] == b'ftyp' and head[8:12] in NON_VIDEO_BRANDS:
+            return None
+        return 'mp4'
+    if head[:4] == b'\x1a\x45\xdf\xa3':
+        # EBML header - WebM declares its DocType explicitly
+        return 'webm' if b'webm' in head[:64] else 'mkv'
+    if head[:4] == b'RIFF' and head[8:12] in (b'AVI ', b'AVIX'):
+        return 'avi'
+    if head[:3] == b'FLV':
+        return 'flv'
+    if head[:8] == b'\x30\x26\xb2\x75\x8e\x66\xcf\x11':
+        return 'asf'
+    if head[:4] == b'\x00\x00\x01\xba':
+        return 'mpeg'
+    if head[:4] == b'OggS':
+        # Ogg mostly carries Vorbis/Opus audio; only streams starting with a video codec header count
+        return 'ogg' if any(marker in head for marker in OGG_VIDEO_HEADERS) else None
+    # MPEG transport stream: 0x47 sync byte repeating every packet
+    if head[0] == 0x47 and len(head) > 2 * TS_PACKET and \
+            head[TS_PACKET] == 0x47 and head[2 * TS_PACKET] == 0x47:
+        return 'ts'
+    # Blu-ray M2TS: 4-byte timestamp prefix before each sync byte
+    if len(head) > 4 + 2 * M2TS_PACKET and head[4] == 0x47 and \
+            head[4 + M2TS_PACKET] == 0x47 and head[4 + 2 * M2TS_PACKET] == 0x47:
+        return 'ts'
+    return None
+
+
+def sniff_container(path):
+    """Read the head of a file and return its container type, or None if not video"""
+    try:
+        with open(path, 'rb') as f:
+            return sniff_header(f.read(SNIFF_BYTES))
+    except OSError:
+        return None
+
+
+class MediaScanner:
+    """Walk files and folders on a thread pool and stream accepted videos in batches.
+
+    on_batch(list_of_(path, size)) is called from worker threads as results arrive and
+    on_finished(accepted, rejected) once every directory has been visited (not
+    for a cancelled scan), so callers living in the GUI thread should forward
+    both through Qt signals.
+    """
+
+    def __init__(self, on_batch, on_finished=None, max_workers=None,
+                 batch_size=500, batch_interval=0.25, sniff=sniff_container):
+        self.on_batch = on_batch
+        self.on_finished = on_finished
+        self.max_workers = max_workers or min(16, (os.cpu_count() or 1) * 2)
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.sniff = sniff
+        self.logger = logging.getLogger('gui')
+
+        self._executor = None
+        self._lock = threading.Lock()
+        self._generation = 0  # bumped by cancel(); tasks of an older generation do nothing
+        self._scan_generation = 0  # generation of the latest scan() call
+        self._pending_tasks = 0
+        self._batch = []
+        self._last_flush = 0.0
+        self._accepted = 0
+        self._rejected = 0
+
+    def is_running(self):
+        with self._lock:
+            return self._pending_tasks > 0
+
+    def cancel(self):
+        """Stop scanning; already-streamed results are kept, buffered ones are dropped"""
+        with self._lock:
+            self._generation += 1
+            self._batch = []
+            self._accepted = 0
+            self._rejected = 0
+
+    def _cancelled(self, generation):
+        return generation != self._generation
+
+    def scan(self, paths):
+        """Start scanning a mix of file and directory paths; returns immediately"""
+        with self._lock:
+            if self._executor is None:
+                self._accepted = 0
+                self._rejected = 0
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='media-scan')
+            self._last_flush = time.monotonic()
+            generation = self._scan_generation = self._generation
+            # Hold a task slot while submitting so the scan can't finish early
+            self._pending_tasks += 1
+
+        try:
+            files = [(p, None) for p in paths if not os.path.isdir(p)]
+            if files:
+                self._submit(self._check_files, files, generation)
+            for directory in paths:
+                if os.path.isdir(directory):
+                    self._submit(self._scan_dir, directory, generation)
+        finally:
+            self._task_done()
+
+    def _submit(self, fn, arg, generation):
+        # The executor is only torn down once no task is pending, and the caller holds one
+        with self._lock:
+            self._pending_tasks += 1
+            executor = self._executor
+        executor.submit(self._run_task, fn, arg, generation)
+
+    def _run_task(self, fn, arg, generation):
+        try:
+            if not self._cancelled(generation):
+                fn(arg, generation)
+        except Exception as e:
+            self.logger.warning(f"Media scan error on {arg}: {e}")
+        finally:
+            self._task_done()
+
+    def _task_done(self):
+        # The last-task check and the teardown happen in one lock hold, so a scan()
+        # starting meanwhile either keeps this executor alive or creates a new one
+        with self._lock:
+            self._pending_tasks -= 1
+            if self._pending_tasks:
+                return
+            flush, self._batch = self._batch, []
+            executor, self._executor = self._executor, None
+            accepted, rejected = self._accepted, self._rejected
+            cancelled = self._cancelled(self._scan_generation)
+        self._finish(flush, executor, accepted, rejected, cancelled)
+
+    def _scan_dir(self, directory, generation):
+        candidates = []
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if self._cancelled(generation):
+                        return
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            self._submit(self._scan_dir, entry.path, generation)
+                        elif entry.is_file():
+                            candidates.append((entry.path, entry.stat().st_size))
+                            if len(candidates) >= CHECK_CHUNK:
+                                self._submit(self._check_files, candidates, generation)
+                                candidates = []
+                    except OSError:
+                        continue
+        except OSError as e:
+            self.logger.warning(f"Cannot scan folder {directory}: {e}")
+        # The last (or only) chunk is sniffed by the task that listed it
+        self._check_files(candidates, generation)
+
+    def _check_files(self, paths, generation):
+        accepted = []
+        rejected = 0
+        for path, size in paths:
+            if self._cancelled(generation):
+                return
+            if self.sniff(path):
+                if size is None:
+                    try:
+                        size = os.path.getsize(path)
+                    except OSError:
+                        size = None
+                accepted.append((path, size))
+            else:
+                rejected += 1
+        self._add_results(accepted, rejected, generation)
+
+    def _add_results(self, accepted, rejected, generation):
+        flush = None
+        with self._lock:
+            if self._cancelled(generation):
+                return
+            self._accepted += len(accepted)
+            self._rejected += rejected
+            self._batch.extend(accepted)
+            now = time.monotonic()
+            if self._batch and (len(self._batch) >= self.batch_size or
+                                now - self._last_flush >= self.batch_interval):
+                flush, self._batch = self._batch, []
+                self._last_flush = now
+        if flush:
+            self.on_batch(sorted(flush))
+
+    def _finish(self, flush, executor, accepted, rejected, cancelled):
+        if flush:
+            self.on_batch(sorted(flush))
+        if executor is not None:
+            executor.shutdown(wait=False)
+        if cancelled:
+            self.logger.info("Media scan cancelled")
+            return
+        self.logger.info(f"Media scan finished: {accepted} videos accepted, {rejected} files rejected")
+        if self.on_finished:
+            self.on_finished(accepted, rejected)
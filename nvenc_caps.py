@@ -0,0 +1,339 @@
+# nvenc_caps.py - Discover what the NVENC encoders on each GPU can do, cached per driver version
+import os
+import json
+import time
+import logging
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from failures import classify_failure, FAILURE_SESSION_LIMIT
+from gpu_topology import CUDA_ENV
+
+NVENC_CODECS = ('hevc_nvenc', 'h264_nvenc', 'av1_nvenc')
+
+# (profile, pixel format) pairs tried for each codec
+PROFILE_TESTS = {
+    'h264_nvenc': [('main', 'yuv420p'), ('high', 'yuv420p'), ('high444p', 'yuv444p')],
+    'hevc_nvenc': [('main', 'yuv420p'), ('main10', 'p010le'), ('rext', 'yuv444p')],
+    'av1_nvenc': [('main', 'yuv420p'), ('main', 'p010le')],
+}
+PIX_FMT_TESTS = ('yuv420p', 'nv12', 'p010le', 'yuv444p')
+BFRAME_TESTS = (4, 3, 2, 1)
+LOOKAHEAD_TESTS = (32, 16, 8)
+
+# Concurrent sessions tried at most; reaching it means "no practical limit"
+MAX_SESSION_PROBE = 12
+# A test that only failed for want of a free encode session is retried this often, this far apart
+SESSION_RETRIES = 3
+SESSION_RETRY_DELAY = 2
+TEST_SOURCE = 'testsrc2=size=320x240:rate=30'
+
+
+def run_command(cmd, timeout=20):
+    """Run a command and return (returncode, combined output)"""
+    try:
+        # GPU indices are nvidia-smi's, so ffmpeg has to number them the same way
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout, env=dict(os.environ, **CUDA_ENV),
+                                creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0))
+    except (OSError, subprocess.TimeoutExpired) as e:
+        return -1, str(e)
+    return result.returncode, (result.stdout or '') + (result.stderr or '')
+
+
+def test_encode(codec, gpu, extra=(), frames=5, hold_seconds=None):
+    """Tiny lavfi encode to the null muxer; hold_seconds keeps the session open in real time"""
+    cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error']
+    if hold_seconds:
+        cmd.extend(['-re', '-t', str(hold_seconds)])
+    cmd.extend(['-f', 'lavfi', '-i', TEST_SOURCE])
+    if not hold_seconds:
+        cmd.extend(['-frames:v', str(frames)])
+    cmd.extend(['-c:v', codec, '-gpu', str(gpu)])
+    cmd.extend(extra)
+    cmd.extend(['-f', 'null', '-'])
+    return cmd
+
+
+class NvencCapabilities:
+    """Probed encoder capabilities per GPU.
+
+    gpus maps a GPU index (as a string, for JSON) to
+    {'name', 'compute_cap', 'max_sessions', 'codecs': {codec: {'profiles', 'pix_fmts', 'max_bframes', 'max_lookahead'}}}.
+    max_sessions is None when no limit was hit, compute_cap when the driver does not report it.
+    """
+
+    def __init__(self, gpus=None, driver_version=None, compiled_encoders=None):
+        self.gpus = gpus or {}
+        self.driver_version = driver_version
+        self.compiled_encoders = set(compiled_encoders or ())  # every encoder ffmpeg was built with
+
+    def _gpu(self, gpu):
+        return self.gpus.get(str(gpu), {})
+
+    def codecs(self, gpu):
+        return list(self._gpu(gpu).get('codecs', {}))
+
+    def codec_caps(self, codec, gpu):
+        return self._gpu(gpu).get('codecs', {}).get(codec)
+
+    def supports(self, codec, gpu):
+        return self.codec_caps(codec, gpu) is not None
+
+    def max_sessions(self, gpu):
+        return self._gpu(gpu).get('max_sessions')
+
+    def compute_cap(self, gpu):
+        """CUDA compute capability (e.g. 8.6), which tells the NVDEC generation; None if unknown"""
+        return self._gpu(gpu).get('compute_cap')
+
+    def session_limit(self, gpus):
+        """Concurrent NVENC jobs the given GPUs allow together, or None if unlimited"""
+        limits = [self.max_sessions(gpu) for gpu in gpus]
+        if not limits or any(limit is None for limit in limits):
+            return None
+        return sum(limits)
+
+    def max_bframes(self, codec, gpus):
+        values = [(self.codec_caps(codec, gpu) or {}).get('max_bframes', 0) for gpu in gpus]
+        return min(values) if values else 0
+
+    def max_lookahead(self, codec, gpus):
+        values = [(self.codec_caps(codec, gpu) or {}).get('max_lookahead', 0) for gpu in gpus]
+        return min(values) if values else 0
+
+    def validate(self, codec, gpus, bframes, lookahead):
+        """Clamp B-frames/lookahead to what every selected GPU accepts; returns (bframes, lookahead, notes)"""
+        notes = []
+        if not self.gpus:
+            return bframes, lookahead, notes
+        missing = [gpu for gpu in gpus if not self.supports(codec, gpu)]
+        if missing:
+            notes.append(f"{codec} is not supported on GPU {', '.join(str(g) for g in missing)}")
+            return bframes, lookahead, notes
+        max_bf = self.max_bframes(codec, gpus)
+        if bframes > max_bf:
+            notes.append(f"B-frames {bframes} -> {max_bf} ({codec} maximum)")
+            bframes = max_bf
+        max_la = self.max_lookahead(codec, gpus)
+        if lookahead > max_la:
+            notes.append(f"lookahead {lookahead} -> {max_la} ({codec} maximum)")
+            lookahead = max_la
+        return bframes, lookahead, notes
+
+    def describe(self):
+        lines = []
+        for gpu, info in sorted(self.gpus.items()):
+            codecs = ', '.join(f"{codec} (bf {caps['max_bframes']}, {'/'.join(caps['pix_fmts'])})"
+                               for codec, caps in info.get('codecs', {}).items()) or "no NVENC encoders"
+            sessions = info.get('max_sessions')
+            limit = f"{sessions} sessions" if sessions else "no session limit found"
+            lines.append(f"GPU {gpu} ({info.get('name', '?')}): {codecs}; {limit}")
+        return lines
+
+    def to_dict(self):
+        return {'driver_version': self.driver_version, 'gpus': self.gpus,
+                'compiled_encoders': sorted(self.compiled_encoders)}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get('gpus', {}), data.get('driver_version'), data.get('compiled_encoders'))
+
+
+class CapabilityProber:
+    """Run tiny null encodes (in parallel) to find what each GPU's NVENC supports.
+
+    The session limit is found first and the tests of a GPU never run more
+    encodes at once than it allows. A test that still fails with a session
+    error is inconclusive, not unsupported: it is retried, and if it never
+    gets a session the encoder is assumed capable and the result is not cached.
+    Results are cached in cache_path keyed by driver and ffmpeg version, so the
+    probe only runs again after a driver or ffmpeg update. run(cmd, timeout)
+    returns (returncode, output) and can be replaced for testing.
+    """
+
+    def __init__(self, cache_path, run=None, max_workers=8, max_session_probe=MAX_SESSION_PROBE):
+        self.cache_path = cache_path
+        self.run = run or run_command
+        self.max_workers = max_workers
+        self.max_session_probe = max_session_probe
+        self.logger = logging.getLogger('gui')
+
+    def driver_info(self):
+        """(driver version, [(gpu index, name)]) from nvidia-smi"""
+        code, output = self.run(['nvidia-smi', '--query-gpu=index,name,driver_version',
+                                 '--format=csv,noheader'], 5)
+        gpus, driver = [], None
+        if code == 0:
+            for line in output.strip().splitlines():
+                parts = [p.strip() for p in line.split(',')]
+                if len(parts) >= 3 and parts[0].isdigit():
+                    gpus.append((int(parts[0]), parts[1]))
+                    driver = parts[2]
+        return driver, gpus
+
+    def compute_caps(self):
+        """{gpu index: compute capability}; empty on drivers too old to report it"""
+        code, output = self.run(['nvidia-smi', '--query-gpu=index,compute_cap',
+                                 '--format=csv,noheader'], 5)
+        caps = {}
+        if code == 0:
+            for line in output.strip().splitlines():
+                parts = [p.strip() for p in line.split(',')]
+                if len(parts) >= 2 and parts[0].isdigit():
+                    try:
+                        caps[int(parts[0])] = float(parts[1])
+                    except ValueError:
+                        continue
+        return caps
+
+    def ffmpeg_info(self):
+        """(ffmpeg version line, set of encoders compiled in)"""
+        code, output = self.run(['ffmpeg', '-hide_banner', '-version'], 5)
+        version = output.splitlines()[0].strip() if code == 0 and output else None
+        code, output = self.run(['ffmpeg', '-hide_banner', '-encoders'], 5)
+        encoders = set()
+        if code == 0:
+            for line in output.splitlines():
+                # " V....D hevc_nvenc    NVIDIA NVENC hevc encoder"
+                parts = line.split()
+                if len(parts) >= 2 and len(parts[0]) == 6 and parts[0][0] in 'VAS' and parts[1] != '=':
+                    encoders.add(parts[1])
+        return version, encoders
+
+    def _load_cache(self, key):
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return NvencCapabilities.from_dict(data[key]) if key in data else None
+
+    def _save_cache(self, key, caps):
+        try:
+            data = {}
+            if os.path.exists(self.cache_path):
+                with open(self.cache_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            data[key] = caps.to_dict()
+            with open(self.cache_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Could not write NVENC capability cache: {e}")
+
+    def probe(self, refresh=False):
+        """Capabilities for every GPU, from the cache when the driver and ffmpeg are unchanged"""
+        driver, gpus = self.driver_info()
+        ffmpeg_version, encoders = self.ffmpeg_info()
+        key = f"{driver}|{ffmpeg_version}"
+        if not refresh:
+            cached = self._load_cache(key)
+            if cached is not None:
+                # Caches written before compute capabilities were recorded get them filled in
+                if any('compute_cap' not in info for info in cached.gpus.values()):
+                    for gpu, cap in self.compute_caps().items():
+                        if str(gpu) in cached.gpus:
+                            cached.gpus[str(gpu)]['compute_cap'] = cap
+                return cached
+
+        caps = NvencCapabilities({}, driver, encoders)
+        nvenc_encoders = sorted(encoders.intersection(NVENC_CODECS))
+        compute_caps = self.compute_caps()
+        inconclusive = 0
+        # One GPU at a time, so neither the session count nor the tests compete with another GPU's
+        for gpu, name in gpus:
+            codec = self._session_codec(gpu, nvenc_encoders)
+            max_sessions = self._probe_sessions(codec, gpu) if codec else None
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, max_sessions or self.max_workers)) as executor:
+                codecs, unsettled = self._probe_codecs(executor, gpu, nvenc_encoders)
+            inconclusive += unsettled
+            caps.gpus[str(gpu)] = {'name': name, 'compute_cap': compute_caps.get(gpu),
+                                   'codecs': codecs, 'max_sessions': max_sessions if codecs else None}
+        if inconclusive:
+            self.logger.warning(f"{inconclusive} NVENC capability test(s) never got an encode session; "
+                                f"assuming they pass and not caching the result")
+        elif gpus or encoders:
+            self._save_cache(key, caps)
+        return caps
+
+    def _test(self, cmd):
+        """True if cmd encodes, False if it fails, None if it only failed for want of an encode session"""
+        code, output = self.run(cmd, 20)
+        if code == 0:
+            return True
+        failure, _ = classify_failure(output)
+        return None if failure == FAILURE_SESSION_LIMIT else False
+
+    def _retest(self, cmd):
+        """Run an inconclusive test again on its own until it is conclusive; None if it never is"""
+        for _ in range(SESSION_RETRIES):
+            time.sleep(SESSION_RETRY_DELAY)
+            result = self._test(cmd)
+            if result is not None:
+                return result
+        return None
+
+    def _session_codec(self, gpu, encoders):
+        """First encoder (H.264 preferred) that encodes on the GPU, to count sessions with"""
+        for codec in sorted(encoders, key=lambda codec: codec != 'h264_nvenc'):
+            result = self._test(test_encode(codec, gpu))
+            if result is None:
+                result = self._retest(test_encode(codec, gpu))
+            if result is not False:
+                return codec
+        return None
+
+    def _probe_codecs(self, executor, gpu, encoders):
+        """Capabilities per codec on one GPU and the number of tests left inconclusive"""
+        tests = {}
+        for codec in encoders:
+            tests[(codec, 'base')] = test_encode(codec, gpu)
+            for profile, pix_fmt in PROFILE_TESTS.get(codec, []):
+                tests[(codec, 'profile', profile, pix_fmt)] = test_encode(
+                    codec, gpu, ['-profile:v', profile, '-pix_fmt', pix_fmt])
+            for pix_fmt in PIX_FMT_TESTS:
+                tests[(codec, 'pix_fmt', pix_fmt)] = test_encode(codec, gpu, ['-pix_fmt', pix_fmt])
+            for bframes in BFRAME_TESTS:
+                tests[(codec, 'bf', bframes)] = test_encode(codec, gpu, ['-bf', str(bframes)], frames=10)
+            for lookahead in LOOKAHEAD_TESTS:
+                tests[(codec, 'la', lookahead)] = test_encode(codec, gpu, ['-rc-lookahead', str(lookahead)],
+                                                              frames=10)
+        futures = {test: executor.submit(self._test, cmd) for test, cmd in tests.items()}
+
+        results = {test: future.result() for test, future in futures.items()}
+
+        # Retried one at a time once the pool is idle, so they don't compete for sessions again
+        passed, inconclusive = {}, 0
+        for test, result in results.items():
+            if result is None:
+                result = self._retest(tests[test])
+            if result is None:
+                inconclusive += 1
+            passed[test] = result is not False
+
+        codecs = {}
+        for codec in encoders:
+            if not passed[(codec, 'base')]:
+                continue
+            profiles = sorted({profile for profile, pix_fmt in PROFILE_TESTS.get(codec, [])
+                               if passed[(codec, 'profile', profile, pix_fmt)]})
+            pix_fmts = [pix_fmt for pix_fmt in PIX_FMT_TESTS if passed[(codec, 'pix_fmt', pix_fmt)]]
+            bframes = [bf for bf in BFRAME_TESTS if passed[(codec, 'bf', bf)]]
+            lookaheads = [la for la in LOOKAHEAD_TESTS if passed[(codec, 'la', la)]]
+            codecs[codec] = {
+                'profiles': profiles,
+                'pix_fmts': pix_fmts,
+                'max_bframes': max(bframes, default=0),
+                'max_lookahead': max(lookaheads, default=0),
+            }
+        return codecs, inconclusive
+
+    def _probe_sessions(self, codec, gpu):
+        """Open max_session_probe real-time encodes at once and count how many got a session"""
+        cmd = test_encode(codec, gpu, hold_seconds=2)
+        with ThreadPoolExecutor(max_workers=self.max_session_probe) as executor:
+            futures = [executor.submit(self._test, cmd) for _ in range(self.max_session_probe)]
+            opened = sum(1 for future in futures if future.result())
+        if opened >= self.max_session_probe:
+            return None
+        self.logger.info(f"GPU {gpu}: {codec} allows {opened} concurrent sessions")
+        return max(1, opened)
@@ -0,0 +1,197 @@
+# output_cache.py - Content-addressed record of finished outputs: input fingerprint + encode settings -> output file
+import os
+import json
+import time
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from dedup import full_hash
+
+# Sidecar index kept in each output folder, one JSON record per line
+INDEX_NAME = '.ffastgpu_outputs.jsonl'
+# Container tag carrying the cache key in every output
+METADATA_KEY = 'ffastgpu_cache_key'
+# Options whose values say where or how fast a command runs, not what it produces
+PLACEMENT_OPTIONS = ('-gpu', '-hwaccel_device', '-threads', '-filter_threads', '-filter_complex_threads',
+                     '-init_hw_device', '-filter_hw_device')
+
+
+def cache_key(fingerprint, args):
+    """Hash of an input fingerprint and the ffmpeg output options that produce a file from it"""
+    h = hashlib.blake2b(digest_size=20)
+    h.update(fingerprint.encode('utf-8'))
+    args = iter(args)
+    for arg in args:
+        if arg in PLACEMENT_OPTIONS:
+            next(args, None)
+            continue
+        h.update(b'\0' + arg.encode('utf-8'))
+    return h.hexdigest()
+
+
+def tag_args(key, output_format):
+    """ffmpeg options writing the cache key into an output's container metadata"""
+    args = ['-metadata', f'{METADATA_KEY}={key}']
+    if output_format in ('mp4', 'mov'):
+        # The MP4 muxer drops tags it has no atom for unless asked to keep them
+        args.extend(['-movflags', '+use_metadata_tags'])
+    return args
+
+
+class OutputIndex:
+    """Outputs of one folder by cache key, from an append-only sidecar file in that folder.
+
+    Each finished output appends a line and a later line for the same key
+    wins. The file is rewritten without superseded lines when they outnumber
+    the live entries. An entry only counts while its output still has the
+    size it was recorded with.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.path = os.path.join(folder, INDEX_NAME)
+        self.entries = {}
+        self.lines = 0
+        self.logger = logging.getLogger('gui')
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # a line torn by a crash mid-write
+                    self.lines += 1
+                    if record.get('output'):
+                        self.entries[record['key']] = record
+                    else:
+                        self.entries.pop(record.get('key'), None)
+        except OSError:
+            return
+        if self.lines > 2 * len(self.entries) + 100:
+            self._compact()
+
+    def _compact(self):
+        try:
+            temp = self.path + '.tmp'
+            with open(temp, 'w', encoding='utf-8') as f:
+                for record in self.entries.values():
+                    f.write(json.dumps(record) + '\n')
+            os.replace(temp, self.path)
+            self.lines = len(self.entries)
+        except OSError as e:
+            self.logger.warning(f"Could not compact output index {self.path}: {e}")
+
+    def _append(self, record):
+        try:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record) + '\n')
+            self.lines += 1
+        except OSError as e:
+            self.logger.warning(f"Could not update output index {self.path}: {e}")
+
+    def lookup(self, key):
+        """Path of the output recorded for key, or None (also when it was deleted or changed since)"""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        path = os.path.join(self.folder, entry['output'])
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = None
+        if size != entry.get('size'):
+            self.forget(key)
+            return None
+        return path
+
+    def record(self, key, output_path, input_path):
+        record = {'key': key, 'output': os.path.basename(output_path), 'size': os.path.getsize(output_path),
+                  'input': os.path.basename(input_path), 'time': int(time.time())}
+        self.entries[key] = record
+        self._append(record)
+
+    def forget(self, key):
+        if self.entries.pop(key, None) is not None:
+            self._append({'key': key, 'output': None})
+
+
+class OutputCache:
+    """Finished outputs across output folders by cache key, with input fingerprints.
+
+    The fingerprint hashes an input's whole content, so a renamed or copied
+    input keeps its key. A sampled hash is not enough: inputs of the same size
+    that differ outside the samples (CBR re-renders, edited exports) would
+    share outputs. Fingerprints are computed on a worker thread
+    (compute_fingerprints, reading the files), kept in store_path while a
+    file's size and mtime are unchanged, and only looked up when jobs start
+    (fingerprint, no I/O).
+    """
+
+    def __init__(self, store_path=None):
+        self.indexes = {}
+        self.store_path = store_path
+        self.fingerprints = self._load_fingerprints()  # path -> (size, mtime_ns, fingerprint)
+        self.logger = logging.getLogger('gui')
+
+    def _load_fingerprints(self):
+        if not self.store_path:
+            return {}
+        try:
+            with open(self.store_path, 'r', encoding='utf-8') as f:
+                return {path: tuple(known) for path, known in json.load(f).items()}
+        except (OSError, ValueError, TypeError, AttributeError):
+            return {}
+
+    def _save_fingerprints(self):
+        try:
+            # Inputs that are gone are dropped so the store doesn't grow forever
+            data = {path: known for path, known in self.fingerprints.items() if os.path.exists(path)}
+            temp = self.store_path + '.tmp'
+            with open(temp, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(temp, self.store_path)
+        except OSError as e:
+            self.logger.warning(f"Could not write input fingerprints {self.store_path}: {e}")
+
+    def compute_fingerprints(self, paths, max_workers=8):
+        """Fingerprint inputs in parallel, skipping those unchanged since they were last fingerprinted"""
+        def compute(path):
+            try:
+                st = os.stat(path)
+                known = self.fingerprints.get(path)
+                if known is None or known[:2] != (st.st_size, st.st_mtime_ns):
+                    self.fingerprints[path] = (st.st_size, st.st_mtime_ns, full_hash(path))
+                    return True
+            except OSError as e:
+                self.logger.warning(f"Cannot fingerprint {path}: {e}")
+            return False
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            changed = any(list(executor.map(compute, paths)))
+        if changed and self.store_path:
+            self._save_fingerprints()
+
+    def fingerprint(self, path):
+        """Content fingerprint computed for an input, or None if it has none yet"""
+        known = self.fingerprints.get(path)
+        return known[2] if known else None
+
+    def index(self, folder):
+        folder = os.path.abspath(folder)
+        key = os.path.normcase(folder)
+        if key not in self.indexes:
+            self.indexes[key] = OutputIndex(folder)
+        return self.indexes[key]
+
+    def lookup(self, folder, key):
+        return self.index(folder).lookup(key) if key else None
+
+    def record(self, key, output_path, input_path):
+        try:
+            self.index(os.path.dirname(output_path)).record(key, output_path, input_path)
+        except OSError as e:
+            self.logger.warning(f"Could not record output {output_path}: {e}")
@@ -0,0 +1,124 @@
+# prefetch.py - Warm the OS page cache for upcoming inputs while the current job encodes
+import os
+import queue
+import logging
+import threading
+import psutil
+
+READ_CHUNK = 1024 * 1024
+PRESSURE_CHECK_BYTES = 64 * 1024 * 1024  # re-check available memory this often while reading
+MIN_PREFETCH_BYTES = 16 * 1024 * 1024    # not worth warming less than this
+
+
+class ReadaheadPrefetcher:
+    """Issue readahead for the next few inputs, bounded by available RAM.
+
+    Uses posix_fadvise(WILLNEED) where the OS supports it (the kernel reads
+    asynchronously), otherwise reads the file sequentially on a background
+    thread. Prefetching backs off whenever available memory drops below
+    min_available_bytes, so it never competes with running encodes.
+    """
+
+    def __init__(self, lookahead=1, ram_fraction=0.25, min_available_bytes=2 * 1024 ** 3,
+                 virtual_memory=None, fadvise=None):
+        self.lookahead = lookahead
+        self.ram_fraction = ram_fraction
+        self.min_available_bytes = min_available_bytes
+        self.virtual_memory = virtual_memory or psutil.virtual_memory
+        if fadvise is None and hasattr(os, 'posix_fadvise'):
+            fadvise = os.posix_fadvise
+        self.fadvise = fadvise
+        self.logger = logging.getLogger('gui')
+
+        self._lock = threading.Lock()
+        self._warmed = {}  # path -> bytes requested
+        self._queue = queue.Queue()
+        self._generation = 0
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+
+    def reset(self):
+        """Forget what was warmed (start of a new batch) and drop queued work"""
+        with self._lock:
+            self._warmed = {}
+            self._generation += 1
+
+    def under_pressure(self):
+        return self.virtual_memory().available < self.min_available_bytes
+
+    def warm(self, upcoming):
+        """Prefetch the first `lookahead` entries of upcoming (the files after the current one)"""
+        targets = upcoming[:self.lookahead]
+        with self._lock:
+            # Files no longer upcoming are being encoded or done; stop counting them
+            self._warmed = {p: n for p, n in self._warmed.items() if p in targets}
+            available = self.virtual_memory().available
+            if available < self.min_available_bytes:
+                self.logger.info("Readahead: memory pressure, skipping prefetch")
+                return
+            budget = (available - self.min_available_bytes) * self.ram_fraction - sum(self._warmed.values())
+            for path in targets:
+                if path in self._warmed:
+                    continue
+                try:
+                    size = os.path.getsize(path)
+                except OSError:
+                    continue
+                length = int(min(size, budget))
+                if length < min(size, MIN_PREFETCH_BYTES):
+                    break
+                self._warmed[path] = length
+                budget -= length
+                self._queue.put((self._generation, path, length))
+
+    def shutdown(self):
+        self.reset()
+        self._queue.put(None)
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            generation, path, length = item
+            with self._lock:
+                if generation != self._generation:
+                    continue
+            try:
+                if self.fadvise is not None:
+                    self._advise(path, length)
+                else:
+                    self._read(path, length, generation)
+            except OSError as e:
+                self.logger.warning(f"Readahead of {path} failed: {e}")
+
+    def _advise(self, path, length):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            self.fadvise(fd, 0, length, getattr(os, 'POSIX_FADV_WILLNEED', 3))
+        finally:
+            os.close(fd)
+        self.logger.info(f"Readahead: advised {length // (1024 * 1024)} MB of {os.path.basename(path)}")
+
+    def _read(self, path, length, generation):
+        done = 0
+        since_check = 0
+        buffer = bytearray(READ_CHUNK)
+        with open(path, 'rb', buffering=0) as f:
+            while done < length:
+                if since_check >= PRESSURE_CHECK_BYTES:
+                    since_check = 0
+                    with self._lock:
+                        stale = generation != self._generation or path not in self._warmed
+                    if stale:
+                        return
+                    if self.under_pressure():
+                        self.logger.info(f"Readahead: backing off {os.path.basename(path)} "
+                                         f"after {done // (1024 * 1024)} MB, memory is low")
+                        return
+                read = f.readinto(buffer)
+                if not read:
+                    break
+                done += read
+                since_check += read
+        self.logger.info(f"Readahead: warmed {done // (1024 * 1024)} MB of {os.path.basename(path)}")
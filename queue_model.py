@@ -0,0 +1,299 @@
+# queue_model.py - Virtualized table model for the conversion queue
+import os
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QTimer
+
+STATUS_QUEUED = "Queued"
+STATUS_PROBING = "Probing"
+STATUS_WAITING_SPACE = "Waiting for space"
+STATUS_WAITING_RESOURCES = "Waiting for resources"
+STATUS_CONVERTING = "Converting"
+STATUS_REMUXING = "Remuxing"
+STATUS_COPYING = "Copying back"
+STATUS_SUSPENDED = "Suspended"
+STATUS_PAUSED = "Paused"
+STATUS_DONE = "Done"
+STATUS_SKIPPED = "Skipped"
+STATUS_FAILED = "Failed"
+STATUS_STOPPED = "Stopped"
+STATUS_DUPLICATE = "Duplicate"
+
+# Live updates to the sort column re-sort the view at most this often
+RESORT_INTERVAL_MS = 1000
+
+# Lower runs first; an urgent file may suspend a lower-priority running job
+PRIORITY_URGENT = 0
+PRIORITY_HIGH = 1
+PRIORITY_NORMAL = 2
+PRIORITY_LOW = 3
+PRIORITY_NAMES = {
+    PRIORITY_URGENT: "Urgent",
+    PRIORITY_HIGH: "High",
+    PRIORITY_NORMAL: "Normal",
+    PRIORITY_LOW: "Low",
+}
+
+
+def format_size(num_bytes):
+    """Format a byte count as a short human readable string"""
+    if num_bytes is None:
+        return ""
+    size = float(num_bytes)
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.2f} TB"
+
+
+def format_duration(seconds):
+    """Format seconds as HH:MM:SS"""
+    if seconds is None:
+        return ""
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{(seconds % 3600) // 60:02d}:{seconds % 60:02d}"
+
+
+class QueueEntry:
+    """One file in the conversion queue"""
+    __slots__ = ('path', 'name', 'size', 'duration', 'codec', 'resolution',
+                 'status', 'progress', 'speed', 'output_size', 'priority')
+
+    def __init__(self, path, size=None):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.size = size
+        self.duration = None
+        self.codec = None
+        self.resolution = None
+        self.status = STATUS_QUEUED
+        self.progress = 0
+        self.speed = None
+        self.output_size = None
+        self.priority = PRIORITY_NORMAL
+
+
+class QueueModel(QAbstractTableModel):
+    """Table model holding every queued file with its probe info and live status.
+
+    Entries are stored once in insertion order; sorting and filtering only
+    rearrange a list of entry ids (the view), so updates touch single rows.
+    An update that changes whether an entry passes the filter adds or removes
+    its row; one that changes (or adds) values of the sort column re-sorts the
+    view, throttled to RESORT_INTERVAL_MS.
+    """
+
+    # (attribute, header) for each column
+    COLUMNS = [
+        ('name', "Name"),
+        ('size', "Size"),
+        ('duration', "Duration"),
+        ('codec', "Codec"),
+        ('resolution', "Resolution"),
+        ('status', "Status"),
+        ('progress', "Progress"),
+        ('speed', "Speed"),
+        ('output_size', "Output Size"),
+        ('priority', "Priority"),
+    ]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._entries = []       # all entries, by entry id
+        self._ids_by_path = {}   # path -> [entry ids]
+        self._view = []          # entry ids in display order
+        self._row_of = {}        # entry id -> display row
+        self._filter_text = ""
+        self._sort_column = None
+        self._sort_order = Qt.AscendingOrder
+        self._resort_timer = QTimer(self)
+        self._resort_timer.setSingleShot(True)
+        self._resort_timer.setInterval(RESORT_INTERVAL_MS)
+        self._resort_timer.timeout.connect(self._resort)
+
+    # Qt model interface
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._view)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.COLUMNS[section][1]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        entry = self._entries[self._view[index.row()]]
+        attr = self.COLUMNS[index.column()][0]
+
+        if role == Qt.DisplayRole:
+            value = getattr(entry, attr)
+            if attr in ('size', 'output_size'):
+                return format_size(value)
+            if attr == 'duration':
+                return format_duration(value)
+            if attr == 'progress':
+                return f"{value}%"
+            if attr == 'speed':
+                return f"{value:.2f}x" if value is not None else ""
+            if attr == 'priority':
+                return PRIORITY_NAMES.get(value, "")
+            return value or ""
+        if role == Qt.ToolTipRole and attr == 'name':
+            return entry.path
+        if role == Qt.TextAlignmentRole and attr in ('size', 'duration', 'progress', 'speed', 'output_size'):
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        # Column -1 (as Qt passes it) means no sort: back to insertion order
+        self._sort_column = column if column >= 0 else None
+        self._sort_order = order
+        if self._sort_column is None:
+            self._view.sort()
+        self._resort()
+
+    # Queue operations
+
+    def add_entries(self, items):
+        """Append (path, size) items; new rows go to the end of the view until the next re-sort"""
+        if not items:
+            return
+        new_ids = []
+        for path, size in items:
+            entry_id = len(self._entries)
+            self._entries.append(QueueEntry(path, size))
+            self._ids_by_path.setdefault(path, []).append(entry_id)
+            if self._matches(self._entries[entry_id]):
+                new_ids.append(entry_id)
+        if not new_ids:
+            return
+        first_row = len(self._view)
+        self.beginInsertRows(QModelIndex(), first_row, first_row + len(new_ids) - 1)
+        for offset, entry_id in enumerate(new_ids):
+            self._view.append(entry_id)
+            self._row_of[entry_id] = first_row + offset
+        self.endInsertRows()
+        if self._sort_column is not None:
+            self._schedule_resort()
+
+    def clear(self):
+        self.beginResetModel()
+        self._entries = []
+        self._ids_by_path = {}
+        self._view = []
+        self._row_of = {}
+        self.endResetModel()
+
+    def entry_count(self):
+        return len(self._entries)
+
+    def contains_path(self, path):
+        return path in self._ids_by_path
+
+    def path_at(self, row):
+        """Path of the entry shown at a view row"""
+        return self._entries[self._view[row]].path
+
+    def entries_for_path(self, path):
+        return [self._entries[i] for i in self._ids_by_path.get(path, [])]
+
+    def update_path(self, path, **fields):
+        """Update fields of every entry for path and repaint only those rows"""
+        refilter = self._filter_text and 'status' in fields
+        for entry_id in self._ids_by_path.get(path, []):
+            entry = self._entries[entry_id]
+            for attr, value in fields.items():
+                setattr(entry, attr, value)
+            row = self._row_of.get(entry_id)
+            if refilter and (row is not None) != self._matches(entry):
+                if row is None:
+                    self._insert_row(entry_id)
+                else:
+                    self._remove_row(row)
+            elif row is not None:
+                self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.COLUMNS) - 1))
+        if self._sort_column is not None and self.COLUMNS[self._sort_column][0] in fields:
+            self._schedule_resort()
+
+    def reset_status(self, status=STATUS_QUEUED):
+        """Return every entry to the given status with a single repaint"""
+        for entry in self._entries:
+            entry.status = status
+            entry.progress = 0
+            entry.speed = None
+        if self._filter_text or self._sort_column is not None:
+            # Rows may enter or leave the filter and the order may change
+            self.set_filter(self._filter_text)
+        elif self._view:
+            self.dataChanged.emit(self.index(0, 0),
+                                  self.index(len(self._view) - 1, len(self.COLUMNS) - 1))
+
+    def set_filter(self, text):
+        """Show only entries whose name or status contains text (case-insensitive)"""
+        self._filter_text = text.strip().lower()
+        self.beginResetModel()
+        self._view = [i for i, entry in enumerate(self._entries) if self._matches(entry)]
+        self._apply_sort()
+        self._rebuild_rows()
+        self.endResetModel()
+
+    # Helpers
+
+    def _insert_row(self, entry_id):
+        # At the end; a sorted view gets it in place with the next re-sort
+        row = len(self._view)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._view.append(entry_id)
+        self._row_of[entry_id] = row
+        self.endInsertRows()
+        if self._sort_column is not None:
+            self._schedule_resort()
+
+    def _remove_row(self, row):
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self._row_of[self._view.pop(row)]
+        for later in range(row, len(self._view)):
+            self._row_of[self._view[later]] = later
+        self.endRemoveRows()
+
+    def _schedule_resort(self):
+        # Throttled, not debounced: a steady stream of progress updates still re-sorts every interval
+        if not self._resort_timer.isActive():
+            self._resort_timer.start()
+
+    def _resort(self):
+        self._resort_timer.stop()
+        self.layoutAboutToBeChanged.emit()
+        self._apply_sort()
+        self._rebuild_rows()
+        self.layoutChanged.emit()
+
+    def _matches(self, entry):
+        if not self._filter_text:
+            return True
+        return self._filter_text in entry.name.lower() or self._filter_text in entry.status.lower()
+
+    def _apply_sort(self):
+        if self._sort_column is None:
+            return
+        attr = self.COLUMNS[self._sort_column][0]
+        reverse = self._sort_order == Qt.DescendingOrder
+        entries = self._entries
+
+        def key(entry_id):
+            value = getattr(entries[entry_id], attr)
+            # Keep unknown values together at the end of ascending order
+            if value is None:
+                return (1, 0)
+            if isinstance(value, str):
+                return (0, value.lower())
+            return (0, value)
+
+        self._view.sort(key=key, reverse=reverse)
+
+    def _rebuild_rows(self):
+        self._row_of = {entry_id: row for row, entry_id in enumerate(self._view)}
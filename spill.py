@@ -0,0 +1,89 @@
+# spill.py - Send a queued job to a CPU encoder when it would finish sooner than waiting for a GPU slot
+from collections import namedtuple
+
+BACKEND_GPU = 'gpu'
+BACKEND_CPU = 'cpu'
+
+# CPU encoder taking over from each NVENC encoder, with the preset whose quality roughly
+# matches each NVENC preset (NVENC p7 lands near x265 medium, not at the slow end of x265)
+CPU_EQUIVALENTS = {
+    'hevc_nvenc': ('libx265', {'p1': 'superfast', 'p2': 'veryfast', 'p3': 'veryfast', 'p4': 'faster',
+                               'p5': 'fast', 'p6': 'fast', 'p7': 'medium'}),
+    'h264_nvenc': ('libx264', {'p1': 'veryfast', 'p2': 'faster', 'p3': 'fast', 'p4': 'medium',
+                               'p5': 'medium', 'p6': 'slow', 'p7': 'slow'}),
+    'av1_nvenc': ('libsvtav1', {'p1': '12', 'p2': '11', 'p3': '10', 'p4': '9', 'p5': '8', 'p6': '7', 'p7': '6'}),
+}
+
+SpillDecision = namedtuple('SpillDecision', 'spill gpu_finish cpu_finish reason')
+
+
+def cpu_equivalent(encoder, preset):
+    """(CPU encoder name, preset) standing in for an NVENC encoder and preset, or None"""
+    if encoder not in CPU_EQUIVALENTS:
+        return None
+    name, presets = CPU_EQUIVALENTS[encoder]
+    return name, presets.get(preset, preset)
+
+
+class ThroughputHistory:
+    """Smoothed per-job encode rate of each backend, in megapixel-seconds of media per second.
+
+    Rates are normalised by frame size so a 4K file and a 720p clip feed the
+    same history; alpha is the weight of the newest finished job.
+    """
+
+    def __init__(self, alpha=0.3):
+        self.alpha = alpha
+        self.rates = {}
+        self.counts = {}
+
+    def record(self, backend, media_seconds, pixels, elapsed):
+        if elapsed <= 0 or media_seconds <= 0 or pixels <= 0:
+            return
+        rate = media_seconds * pixels / 1e6 / elapsed
+        old = self.rates.get(backend)
+        self.rates[backend] = rate if old is None else old + self.alpha * (rate - old)
+        self.counts[backend] = self.counts.get(backend, 0) + 1
+
+    def rate(self, backend):
+        return self.rates.get(backend)
+
+    def predict(self, backend, media_seconds, pixels):
+        """Seconds one job of this size takes on a backend, or None without history"""
+        rate = self.rates.get(backend)
+        if not rate:
+            return None
+        return media_seconds * pixels / 1e6 / rate
+
+
+class SpillPlanner:
+    """Compare finishing on the CPU now with waiting for a GPU slot.
+
+    A file position-th in line for the GPU gets the slot that frees up
+    position-th soonest (gpu_remaining holds the running GPU jobs' remaining
+    seconds); every further round of slots costs its own GPU encode time.
+    The CPU finish is its encode time starting now. The file is spilled only
+    when the CPU finish beats the GPU finish by margin. Until a CPU job has
+    finished there is no CPU rate, so a single job runs on the CPU to learn it.
+    """
+
+    def __init__(self, history=None, margin=0.1):
+        self.history = history or ThroughputHistory()
+        self.margin = margin
+
+    def decide(self, media_seconds, pixels, position, gpu_remaining, cpu_running):
+        gpu_time = self.history.predict(BACKEND_GPU, media_seconds, pixels)
+        if gpu_time is None or not gpu_remaining:
+            return SpillDecision(False, None, None, "no GPU history yet")
+        slots = sorted(gpu_remaining)
+        gpu_finish = slots[position % len(slots)] + (position // len(slots)) * gpu_time + gpu_time
+
+        cpu_finish = self.history.predict(BACKEND_CPU, media_seconds, pixels)
+        if cpu_finish is None:
+            if cpu_running:
+                return SpillDecision(False, gpu_finish, None, "measuring the CPU encoder")
+            return SpillDecision(True, gpu_finish, None, "measuring the CPU encoder")
+        if cpu_finish < gpu_finish * (1 - self.margin):
+            return SpillDecision(True, gpu_finish, cpu_finish,
+                                 f"CPU ~{cpu_finish:.0f}s vs GPU ~{gpu_finish:.0f}s")
+        return SpillDecision(False, gpu_finish, cpu_finish, f"GPU ~{gpu_finish:.0f}s is sooner")
@@ -0,0 +1,241 @@
+# staging.py - Local scratch staging of inputs/outputs with background copy-back
+import os
+import time
+import queue
+import shutil
+import hashlib
+import logging
+import threading
+
+COPY_CHUNK = 4 * 1024 * 1024
+DEFAULT_MIN_FREE_BYTES = 10 * 1024 ** 3  # always leave this much free on scratch
+
+
+def copy_file(src, dst, rate_limit=None, cancel_event=None):
+    """Copy src to dst in chunks, optionally capped at rate_limit bytes/s; returns the blake2b digest"""
+    h = hashlib.blake2b(digest_size=32)
+    started = time.monotonic()
+    copied = 0
+    with open(src, 'rb') as fin, open(dst, 'wb') as fout:
+        while True:
+            if cancel_event is not None and cancel_event.is_set():
+                raise InterruptedError(f"Copy of {src} cancelled")
+            chunk = fin.read(COPY_CHUNK)
+            if not chunk:
+                break
+            fout.write(chunk)
+            h.update(chunk)
+            copied += len(chunk)
+            if rate_limit:
+                # Sleep until the average rate is back under the cap
+                ahead = copied / rate_limit - (time.monotonic() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+    shutil.copystat(src, dst)
+    return h.hexdigest()
+
+
+def file_digest(path):
+    """blake2b digest of a file, matching copy_file"""
+    h = hashlib.blake2b(digest_size=32)
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(COPY_CHUNK)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def verified_copy(src, dst, rate_limit=None, cancel_event=None, verify=True):
+    """Copy to dst via a .part file, check the written data against the source digest, then rename"""
+    partial = dst + '.part'
+    try:
+        digest = copy_file(src, partial, rate_limit, cancel_event)
+        if verify and file_digest(partial) != digest:
+            raise IOError(f"Checksum mismatch copying {src} to {dst}")
+        os.replace(partial, dst)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+
+
+class StagingPipeline:
+    """Stage upcoming inputs onto a local scratch disk and copy finished outputs back.
+
+    Two worker threads do the I/O: one copies inputs a few jobs ahead, the other
+    moves completed outputs to their real destination. Both share one bandwidth
+    cap and never let scratch free space drop below min_free_bytes.
+    on_committed(input_path, final_path, ok, error) is called from the copy-back
+    thread, so GUI callers should forward it through a Qt signal.
+    """
+
+    def __init__(self, scratch_dir, on_committed, lookahead=2, rate_limit=None,
+                 min_free_bytes=DEFAULT_MIN_FREE_BYTES, verify=True, disk_usage=None):
+        self.scratch_dir = scratch_dir
+        self.input_dir = os.path.join(scratch_dir, 'in')
+        self.output_dir = os.path.join(scratch_dir, 'out')
+        os.makedirs(self.input_dir, exist_ok=True)
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        self.on_committed = on_committed
+        self.lookahead = lookahead
+        self.rate_limit = rate_limit
+        self.min_free_bytes = min_free_bytes
+        self.verify = verify
+        self.disk_usage = disk_usage or shutil.disk_usage
+        self.logger = logging.getLogger('gui')
+
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._staged = {}        # input path -> local copy (ready to use)
+        self._staging = set()    # inputs queued or being copied
+        self._reserved = 0       # bytes promised to in-flight copies and encodes
+        self._outputs = {}       # scratch output path -> bytes reserved for it
+        self._stage_queue = queue.Queue()
+        self._commit_queue = queue.Queue()
+
+        self._stage_thread = threading.Thread(target=self._stage_worker, daemon=True)
+        self._commit_thread = threading.Thread(target=self._commit_worker, daemon=True)
+        self._stage_thread.start()
+        self._commit_thread.start()
+
+    # Space accounting
+
+    def _has_room(self, size):
+        free = self.disk_usage(self.scratch_dir).free
+        return free - self._reserved - size >= self.min_free_bytes
+
+    def _local_name(self, directory, path):
+        # Prefix with a short path hash so equal basenames from different folders don't clash
+        tag = hashlib.blake2b(path.encode('utf-8', 'surrogatepass'), digest_size=4).hexdigest()
+        return os.path.join(directory, f"{tag}_{os.path.basename(path)}")
+
+    # Input staging
+
+    def prefetch(self, upcoming):
+        """Queue the next `lookahead` inputs of `upcoming` for staging"""
+        for path in upcoming[:self.lookahead + 1]:
+            with self._lock:
+                if path in self._staged or path in self._staging:
+                    continue
+                try:
+                    size = os.path.getsize(path)
+                except OSError:
+                    continue
+                if not self._has_room(size):
+                    self.logger.info(f"Staging: not enough scratch space for {os.path.basename(path)}")
+                    break
+                self._reserved += size
+                self._staging.add(path)
+            self._stage_queue.put((path, size))
+
+    def staged_input(self, path):
+        """Local copy of path if it has been staged and verified, else None"""
+        with self._lock:
+            return self._staged.get(path)
+
+    def release_input(self, path):
+        """Delete the staged copy of an input once its job is done"""
+        with self._lock:
+            local = self._staged.pop(path, None)
+        if local:
+            try:
+                os.remove(local)
+            except OSError as e:
+                self.logger.warning(f"Staging: could not remove {local}: {e}")
+
+    def _stage_worker(self):
+        while True:
+            item = self._stage_queue.get()
+            if item is None:
+                return
+            path, size = item
+            local = self._local_name(self.input_dir, path)
+            try:
+                if not self._cancel.is_set():
+                    verified_copy(path, local, self.rate_limit, self._cancel, self.verify)
+                    with self._lock:
+                        cancelled = self._cancel.is_set()
+                        if not cancelled:
+                            self._staged[path] = local
+                    if cancelled:
+                        os.remove(local)
+                    else:
+                        self.logger.info(f"Staging: {os.path.basename(path)} copied to scratch")
+            except Exception as e:
+                self.logger.warning(f"Staging: failed to stage {path}: {e}")
+            finally:
+                with self._lock:
+                    self._staging.discard(path)
+                    self._reserved -= size
+
+    # Output copy-back
+
+    def scratch_output(self, final_path, size=0):
+        """Scratch location to encode final_path (expected to reach size bytes) into, or None if it won't fit.
+
+        The size stays reserved until the output is copied back or discarded.
+        """
+        scratch_path = self._local_name(self.output_dir, final_path)
+        with self._lock:
+            if not self._has_room(size):
+                return None
+            self._reserved += size - self._outputs.pop(scratch_path, 0)
+            self._outputs[scratch_path] = size
+        return scratch_path
+
+    def _release_output(self, scratch_path):
+        with self._lock:
+            self._reserved -= self._outputs.pop(scratch_path, 0)
+
+    def commit_output(self, input_path, scratch_path, final_path):
+        """Move a finished scratch output to final_path in the background"""
+        self._commit_queue.put((input_path, scratch_path, final_path))
+
+    def pending_commits(self):
+        return self._commit_queue.qsize()
+
+    def discard_output(self, scratch_path):
+        self._release_output(scratch_path)
+        if scratch_path and os.path.exists(scratch_path):
+            try:
+                os.remove(scratch_path)
+            except OSError as e:
+                self.logger.warning(f"Staging: could not remove {scratch_path}: {e}")
+
+    def _commit_worker(self):
+        while True:
+            item = self._commit_queue.get()
+            if item is None:
+                return
+            input_path, scratch_path, final_path = item
+            try:
+                # Copy-back is never cancelled; finished work must reach its destination
+                verified_copy(scratch_path, final_path, self.rate_limit, None, self.verify)
+                self.discard_output(scratch_path)
+                self.logger.info(f"Staging: {os.path.basename(final_path)} copied back")
+                self.on_committed(input_path, final_path, True, "")
+            except Exception as e:
+                self.logger.error(f"Staging: copy-back of {scratch_path} failed: {e}")
+                self._release_output(scratch_path)
+                self.on_committed(input_path, final_path, False, str(e))
+
+    # Lifecycle
+
+    def cancel(self):
+        """Stop staging new inputs and drop staged copies; pending copy-backs still complete"""
+        self._cancel.set()
+        with self._lock:
+            staged, self._staged = list(self._staged.values()), {}
+        for local in staged:
+            try:
+                os.remove(local)
+            except OSError:
+                pass
+
+    def shutdown(self):
+        self.cancel()
+        self._stage_queue.put(None)
+        self._commit_queue.put(None)
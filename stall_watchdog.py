@@ -0,0 +1,85 @@
+# stall_watchdog.py - Notice ffmpeg runs that have stopped making progress
+from collections import namedtuple
+
+StallEvent = namedtuple('StallEvent', 'time key reason media_time frames')
+
+
+class _Watch:
+    __slots__ = ('last_advance', 'media_time', 'frames', 'slow_since', 'paused')
+
+    def __init__(self, now):
+        self.last_advance = now
+        self.media_time = 0.0
+        self.frames = 0
+        self.slow_since = None
+        self.paused = False
+
+
+class StallWatchdog:
+    """Per-job progress watchdog.
+
+    progress() is fed every ffmpeg stats line. check() reports jobs whose
+    out_time and frame count have not advanced for timeout seconds, or whose
+    speed stayed below min_speed for slow_window seconds, and stops watching
+    them. Suspended jobs are paused so the time they spend stopped does not
+    count. Every report is kept in events. Times are passed in by the caller.
+    """
+
+    def __init__(self, timeout=120, min_speed=None, slow_window=None):
+        self.timeout = timeout
+        self.min_speed = min_speed
+        self.slow_window = slow_window or 2 * timeout
+        self.watches = {}
+        self.events = []
+
+    def start(self, key, now):
+        self.watches[key] = _Watch(now)
+
+    def stop(self, key):
+        self.watches.pop(key, None)
+
+    def pause(self, key, now):
+        watch = self.watches.get(key)
+        if watch:
+            watch.paused = True
+
+    def resume(self, key, now):
+        watch = self.watches.get(key)
+        if watch:
+            # The clock restarts; a job is not blamed for time it spent suspended
+            watch.paused = False
+            watch.last_advance = now
+            watch.slow_since = None
+
+    def progress(self, key, now, media_time=None, frames=None, speed=None):
+        watch = self.watches.get(key)
+        if watch is None:
+            return
+        if media_time is not None and media_time > watch.media_time:
+            watch.media_time = media_time
+            watch.last_advance = now
+        if frames is not None and frames > watch.frames:
+            watch.frames = frames
+            watch.last_advance = now
+        if self.min_speed and speed is not None:
+            if speed < self.min_speed:
+                watch.slow_since = watch.slow_since if watch.slow_since is not None else now
+            else:
+                watch.slow_since = None
+
+    def check(self, now):
+        """[(key, reason)] for every stalled job; they are no longer watched"""
+        stalled = []
+        for key, watch in list(self.watches.items()):
+            if watch.paused:
+                continue
+            if now - watch.last_advance >= self.timeout:
+                reason = f"no progress for {now - watch.last_advance:.0f}s"
+            elif watch.slow_since is not None and now - watch.slow_since >= self.slow_window:
+                reason = f"below {self.min_speed}x for {now - watch.slow_since:.0f}s"
+            else:
+                continue
+            self.events.append(StallEvent(now, key, reason, watch.media_time, watch.frames))
+            del self.watches[key]
+            stalled.append((key, reason))
+        return stalled
@@ -0,0 +1,103 @@
+# thermal.py - Hold, shrink or suspend the encode queue while a GPU is too hot or at its power limit
+from collections import namedtuple
+
+THERMAL_NORMAL = 0
+THERMAL_HOLD = 1      # start no new jobs
+THERMAL_REDUCE = 2    # also lower the job limit by one until the card cools
+THERMAL_SUSPEND = 3   # suspend the running jobs until the card cools
+
+THERMAL_LEVEL_NAMES = {
+    THERMAL_NORMAL: "normal",
+    THERMAL_HOLD: "admission paused",
+    THERMAL_REDUCE: "concurrency reduced",
+    THERMAL_SUSPEND: "jobs suspended",
+}
+
+# Degrees C / percent of the power limit a reading must fall below a threshold to leave its level
+TEMP_HYSTERESIS = 5
+POWER_HYSTERESIS = 10
+
+GpuReading = namedtuple('GpuReading', 'gpu temperature power_draw power_limit')
+ThrottleEvent = namedtuple('ThrottleEvent', 'time old_level new_level reason')
+
+
+def parse_gpu_readings(text):
+    """Readings from 'nvidia-smi --query-gpu=index,temperature.gpu,power.draw,power.limit --format=csv,noheader,nounits'"""
+    readings = []
+    for line in text.strip().splitlines():
+        parts = [p.strip() for p in line.split(',')]
+        if len(parts) < 4 or not parts[0].isdigit():
+            continue
+        values = []
+        for part in parts[1:4]:
+            try:
+                values.append(float(part))
+            except ValueError:
+                values.append(None)  # "[N/A]" on cards without power readings
+        readings.append(GpuReading(int(parts[0]), *values))
+    return readings
+
+
+class ThermalPolicy:
+    """Throttle level from GPU temperature and power draw, with hysteresis.
+
+    Each level (hold, reduce, suspend) has a temperature threshold and a power
+    threshold in percent of the card's power limit; None disables a threshold.
+    A level is entered when any reading reaches its threshold and left once all
+    readings are TEMP_HYSTERESIS/POWER_HYSTERESIS below it. Time spent at each
+    level is accumulated in throttled_seconds.
+    """
+
+    def __init__(self, temps=(83, 87, 91), powers=(None, None, None)):
+        self.temps = dict(zip((THERMAL_HOLD, THERMAL_REDUCE, THERMAL_SUSPEND), temps))
+        self.powers = dict(zip((THERMAL_HOLD, THERMAL_REDUCE, THERMAL_SUSPEND), powers))
+        self.level = THERMAL_NORMAL
+        self.since = None
+        self.throttled_seconds = {level: 0.0 for level in self.temps}
+        self.events = []
+
+    @classmethod
+    def from_limits(cls, max_temp=None, max_power=None):
+        """Hold at the limits, reduce a little above them, suspend further above"""
+        temps = (max_temp, max_temp + 4, max_temp + 8) if max_temp else (None, None, None)
+        powers = (max_power, max_power + 5, max_power + 15) if max_power else (None, None, None)
+        return cls(temps, powers)
+
+    def _exceeds(self, level, temp, power, margin_temp=0, margin_power=0):
+        temp_limit, power_limit = self.temps.get(level), self.powers.get(level)
+        if temp_limit is not None and temp is not None and temp >= temp_limit - margin_temp:
+            return f"{temp:.0f}°C"
+        if power_limit is not None and power is not None and power >= power_limit - margin_power:
+            return f"power {power:.0f}% of limit"
+        return None
+
+    def update(self, now, readings):
+        """Account time and move between levels; returns a ThrottleEvent on a change, else None"""
+        if self.since is not None and self.level != THERMAL_NORMAL:
+            self.throttled_seconds[self.level] += now - self.since
+        self.since = now
+
+        temp = max((r.temperature for r in readings if r.temperature is not None), default=None)
+        powers = [100 * r.power_draw / r.power_limit for r in readings
+                  if r.power_draw is not None and r.power_limit]
+        power = max(powers, default=None)
+
+        new_level, reason = THERMAL_NORMAL, None
+        for level in (THERMAL_SUSPEND, THERMAL_REDUCE, THERMAL_HOLD):
+            # Staying at (or below) the current level only needs the hysteresis-lowered threshold
+            margins = (TEMP_HYSTERESIS, POWER_HYSTERESIS) if level <= self.level else (0, 0)
+            reason = self._exceeds(level, temp, power, *margins)
+            if reason:
+                new_level = level
+                break
+        if new_level == self.level:
+            return None
+        if reason is None:
+            reason = f"cooled to {temp:.0f}°C" if temp is not None else "readings back to normal"
+        event = ThrottleEvent(now, self.level, new_level, reason)
+        self.events.append(event)
+        self.level = new_level
+        return event
+
+    def throttled_total(self):
+        return sum(self.throttled_seconds.values())
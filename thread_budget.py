@@ -0,0 +1,38 @@
+# thread_budget.py - Share the host's cores between running jobs and each job's decode/filter/encode stages
+from collections import namedtuple
+
+ThreadBudget = namedtuple('ThreadBudget', 'decode filter encode')  # 0 = stage not on the CPU
+
+# Per decode path (see decode_routing), (relative CPU demand, most threads worth giving) for the
+# decode, filter and encode stages. NVDEC jobs only demux and feed the GPU, software decode needs
+# real decoder threads, and a CPU encoder dominates everything else.
+STAGES = {
+    'gpu': ((0.25, 2), (0.25, 2), (0.0, 0)),
+    'cpu-decode': ((1.0, 16), (0.5, 8), (0.0, 0)),
+    'cpu': ((1.0, 16), (0.5, 8), (4.0, 64)),
+}
+# Cores left for the GUI, monitoring, demuxing/muxing and audio stream copy
+RESERVED_CORES = 1
+
+
+def job_weight(path):
+    return sum(weight for weight, _ in STAGES[path])
+
+
+def stage_budget(cores, path, running_paths=(), cap=None):
+    """Threads per stage for a job on a decode path sharing cores with jobs on running_paths.
+
+    Cores are split in proportion to every job's stage demands, each stage
+    gets at least one thread and at most its useful maximum, and cap (the
+    user's Threads value) bounds every stage when given.
+    """
+    total = job_weight(path) + sum(job_weight(p) for p in running_paths)
+    per_weight = max(cores - RESERVED_CORES, 1) / total
+    threads = []
+    for weight, limit in STAGES[path]:
+        if not weight:
+            threads.append(0)
+            continue
+        count = max(1, min(limit, int(weight * per_weight)))
+        threads.append(min(count, cap) if cap else count)
+    return ThreadBudget(*threads)